@@ -20,7 +20,10 @@ import time
 
 from warnings import warn
 
-from pywikibot._wbtypes import WbRepresentation as _WbRepresentation
+from pywikibot._wbtypes import (
+    intern_string as _intern_string,
+    WbRepresentation as _WbRepresentation,
+)
 from pywikibot.bot import (
     input, input_choice, input_yn, inputChoice, handle_args, showHelp, ui,
     calledModuleName, Bot, CurrentPageBot, WikidataBot,
@@ -259,6 +262,9 @@ class Coordinate(_WbRepresentation):
 
     _items = ('lat', 'lon', 'entity')
 
+    __slots__ = ('lat', 'lon', 'alt', '_precision', '_entity', 'type', 'name',
+                 '_dim', 'site', 'globe')
+
     @_deprecate_arg('entity', 'globe_item')
     def __init__(self, lat, lon, alt=None, precision=None, globe=None,
                  typ='', name='', dim=None, site=None, globe_item=None):
@@ -291,14 +297,16 @@ class Coordinate(_WbRepresentation):
         self.lon = lon
         self.alt = alt
         self._precision = precision
-        self._entity = globe_item
+        self._entity = (_intern_string(globe_item)
+                        if isinstance(globe_item, UnicodeType)
+                        else globe_item)
         self.type = typ
         self.name = name
         self._dim = dim
         self.site = site or Site().data_repository()
 
         if globe:
-            globe = globe.lower()
+            globe = _intern_string(globe.lower())
         elif not globe_item:
             globe = self.site.default_globe()
         self.globe = globe
@@ -484,6 +492,8 @@ class WbTime(_WbRepresentation):
     _items = ('year', 'month', 'day', 'hour', 'minute', 'second',
               'precision', 'before', 'after', 'timezone', 'calendarmodel')
 
+    __slots__ = _items
+
     def __init__(self, year=None, month=None, day=None,
                  hour=None, minute=None, second=None,
                  precision=None, before=0, after=0,
@@ -565,7 +575,7 @@ class WbTime(_WbRepresentation):
                 if site is None:
                     raise ValueError('Site %s has no data repository' % Site())
             calendarmodel = site.calendarmodel()
-        self.calendarmodel = calendarmodel
+        self.calendarmodel = _intern_string(calendarmodel)
 
         # if precision is given it overwrites the autodetection above
         if precision is not None:
@@ -718,6 +728,8 @@ class WbQuantity(_WbRepresentation):
 
     _items = ('amount', 'upperBound', 'lowerBound', 'unit')
 
+    __slots__ = ('amount', 'upperBound', 'lowerBound', '_unit', 'site')
+
     @staticmethod
     def _require_errors(site):
         """
@@ -792,9 +804,10 @@ class WbQuantity(_WbRepresentation):
         self.site = site or Site().data_repository()
 
         # also allow entity URIs to be provided via unit parameter
-        if isinstance(unit, UnicodeType) and \
-                unit.partition('://')[0] not in ('http', 'https'):
-            raise ValueError("'unit' must be an ItemPage or entity uri.")
+        if isinstance(unit, UnicodeType):
+            if unit.partition('://')[0] not in ('http', 'https'):
+                raise ValueError("'unit' must be an ItemPage or entity uri.")
+            self._unit = _intern_string(unit)
 
         if error is None and not self._require_errors(site):
             self.upperBound = self.lowerBound = None
@@ -885,6 +898,8 @@ class WbMonolingualText(_WbRepresentation):
 
     _items = ('text', 'language')
 
+    __slots__ = _items
+
     def __init__(self, text, language):
         """
         Create a new WbMonolingualText object.
@@ -897,7 +912,7 @@ class WbMonolingualText(_WbRepresentation):
         if not text or not language:
             raise ValueError('text and language cannot be empty')
         self.text = text
-        self.language = language
+        self.language = _intern_string(language)
 
     def toWikibase(self):
         """
@@ -934,6 +949,8 @@ class _WbDataPage(_WbRepresentation):
 
     _items = ('page', )
 
+    __slots__ = _items
+
     @classmethod
     def _get_data_site(cls, repo_site):
         """
@@ -1055,6 +1072,8 @@ class _WbDataPage(_WbRepresentation):
 class WbGeoShape(_WbDataPage):
     """A Wikibase geo-shape representation."""
 
+    __slots__ = ()
+
     @classmethod
     def _get_data_site(cls, site):
         """
@@ -1086,6 +1105,8 @@ class WbGeoShape(_WbDataPage):
 class WbTabularData(_WbDataPage):
     """A Wikibase tabular-data representation."""
 
+    __slots__ = ()
+
     @classmethod
     def _get_data_site(cls, site):
         """
@@ -1126,6 +1147,8 @@ class WbUnknown(_WbRepresentation):
 
     _items = ('json',)
 
+    __slots__ = _items
+
     def __init__(self, json):
         """
         Create a new WbUnknown object.
@@ -1321,8 +1344,7 @@ def showDiff(oldtext, newtext, context=0):
 def sleep(secs):
     """Suspend execution of the current thread for the given number of seconds.
 
-    Drop this process from the throttle log if wait time is greater than
-    30 seconds.
+    Wait for pending page saves if wait time is greater than 30 seconds.
     """
     if secs >= 30:
         stopme()
@@ -1331,22 +1353,21 @@ def sleep(secs):
 
 def stopme():
     """
-    Drop this process from the throttle log, after pending threads finish.
+    Wait for pending threads to finish.
 
     Can be called manually if desired. Does not clean async_manager.
     This should be run when a bot does not interact with the Wiki, or
-    when it has stopped doing so. After a bot has run stopme() it will
-    not slow down other bots any more.
+    when it has stopped doing so.
     """
     _flush(False)
 
 
 def _flush(stop=True):
     """
-    Drop this process from the throttle log, after pending threads finish.
+    Wait for pending threads to finish.
 
-    Wait for the page-putter to flush its queue. Also drop this process from
-    the throttle log. Called automatically at Python exit.
+    Wait for the page-putter to flush its queue. Called automatically at
+    Python exit.
     """
     _logger = 'wiki'
 
@@ -1384,13 +1405,6 @@ def _flush(stop=True):
                         default=False, automatic_quit=False):
                 return
 
-    # only need one drop() call because all throttles use the same global pid
-    try:
-        list(_sites.values())[0].throttle.drop()
-        log('Dropped throttle(s).')
-    except IndexError:
-        pass
-
 
 atexit.register(_flush)
 
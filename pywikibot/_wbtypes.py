@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Wikibase data type classes."""
 #
-# (C) Pywikibot team, 2013-2018
+# (C) Pywikibot team, 2013-2019
 #
 # Distributed under the terms of the MIT license.
 #
@@ -11,10 +11,37 @@ import json
 
 from pywikibot.tools import StringTypes
 
+_interned = {}
+
+
+def intern_string(value):
+    """
+    Return a shared copy of a string which is used by many values.
+
+    Entity JSON repeats the same property ids, datatypes, entity URIs and
+    language codes in every snak. Interning them keeps one copy of each
+    string instead of one per snak. Only strings of a limited set should be
+    interned as they are never released.
+
+    @param value: the string or None
+    @type value: str or None
+    @rtype: str or None
+    """
+    if value is None:
+        return None
+    return _interned.setdefault(value, value)
+
 
 class WbRepresentation(object):
 
-    """Abstract class for Wikibase representations."""
+    """
+    Abstract class for Wikibase representations.
+
+    Subclasses declare their attributes in __slots__ as many of them are
+    created when claims are loaded.
+    """
+
+    __slots__ = ()
 
     def __init__(self):
         """Constructor."""
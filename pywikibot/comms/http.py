@@ -7,6 +7,7 @@ This module handles communication between the bot and the HTTP threads.
 This module is responsible for
     - Setting up a connection pool
     - Providing a (blocking) interface for HTTP requests
+    - Processing queued (non-blocking) HTTP requests in worker threads
     - Translate site objects with query strings into URLs
     - URL-encoding all data
     - Basic HTTP error handling
@@ -23,6 +24,7 @@ __docformat__ = 'epytext'
 
 import atexit
 import sys
+import threading
 
 from string import Formatter
 from warnings import warn
@@ -42,6 +44,7 @@ from pywikibot.tools import (
     file_mode_checker,
     issue_deprecation_warning,
     PY2,
+    queue,
     StringTypes,
 )
 import pywikibot.version
@@ -114,10 +117,33 @@ else:
 
 session = requests.Session()
 session.cookies = cookie_jar
+# The adapters keep a separate pool of keep-alive connections for each host.
+# Size these pools so that every worker thread and a blocking caller can
+# hold a connection to the same host at once.
+for _prefix in ('http://', 'https://'):
+    session.mount(_prefix, requests.adapters.HTTPAdapter(
+        pool_maxsize=max(10, config.max_http_threads + 1)))
+
+# queue to hold pending requests created by _enqueue
+http_queue = queue.Queue(config.max_queue_size)
+# worker threads processing the requests from http_queue
+_http_threads = []
+_http_threads_lock = threading.Lock()
 
 
 # Prepare flush on quit
 def _flush():
+    with _http_threads_lock:
+        if _http_threads:
+            log('Waiting for {0} queued http requests.'.format(
+                http_queue.qsize()))
+        # None task element leaves _http_worker
+        for thread in _http_threads:
+            http_queue.put(None)
+        for thread in _http_threads:
+            thread.join()
+        del _http_threads[:]
+
     log('Closing network session.')
     session.close()
 
@@ -387,6 +413,44 @@ def _http_process(session, http_request):
         http_request.data = response
 
 
+def _http_worker():
+    """Daemon; take requests from the queue and process them."""
+    while True:
+        request = http_queue.get()
+        if request is None:
+            http_queue.task_done()
+            break
+        try:
+            _http_process(session, request)
+        except Exception as e:
+            # The callbacks run in this thread, where nobody can catch
+            # their exceptions. Make sure that the request is finished.
+            if request._data is None:
+                request._data = e
+                request._finished.set()
+            error('An error occurred processing uri {0}: {1!r}'.format(
+                request.uri, e))
+        finally:
+            http_queue.task_done()
+
+
+def _start_http_threads():
+    """Start worker threads until config.max_http_threads are running."""
+    if len(_http_threads) >= config.max_http_threads:
+        return
+    with _http_threads_lock:
+        _http_threads[:] = [thread for thread in _http_threads
+                            if thread.is_alive()]
+        for i in range(len(_http_threads), config.max_http_threads):
+            thread = threading.Thread(target=_http_worker,
+                                      name='HTTP-Thread-{0}'.format(i))
+            thread.setDaemon(True)
+            thread.start()
+            _http_threads.append(thread)
+        debug('{0} http threads running'.format(len(_http_threads)),
+              _logger)
+
+
 def error_handling_callback(request):
     """
     Raise exceptions and log alerts.
@@ -416,30 +480,13 @@ def error_handling_callback(request):
         warning('Http response status {0}'.format(request.data.status_code))
 
 
-def _enqueue(uri, method='GET', params=None, body=None, headers=None,
-             data=None, **kwargs):
+def _build_request(uri, method='GET', params=None, body=None, headers=None,
+                   data=None, **kwargs):
     """
-    Enqueue non-blocking threaded HTTP request with callback.
+    Create a L{threadedhttp.HttpRequest} with its callbacks and headers.
 
-    Callbacks, including the default error handler if enabled, are run in the
-    HTTP thread, where exceptions are logged but are not able to be caught.
-    The default error handler is called first, then 'callback' (singular),
-    followed by each callback in 'callbacks' (plural). All callbacks are
-    invoked, even if the default error handler detects a problem, so they
-    must check request.exception before using the response data.
-
-    Note: multiple async requests do not automatically run concurrently,
-    as they are limited by the number of http threads in L{numthreads},
-    which is set to 1 by default.
-
-    @see: L{requests.Session.request} for parameters.
+    See L{_enqueue} for parameters.
 
-    @kwarg default_error_handling: Use default error handling
-    @type default_error_handling: bool
-    @kwarg callback: Method to call once data is fetched
-    @type callback: callable
-    @kwarg callbacks: Methods to call once data is fetched
-    @type callbacks: list of callable
     @rtype: L{threadedhttp.HttpRequest}
     """
     # body and data parameters both map to the data parameter of
@@ -465,9 +512,40 @@ def _enqueue(uri, method='GET', params=None, body=None, headers=None,
     if not user_agent_format_string or '{' in user_agent_format_string:
         all_headers['user-agent'] = user_agent(None, user_agent_format_string)
 
-    request = threadedhttp.HttpRequest(
+    return threadedhttp.HttpRequest(
         uri, method, params, body, all_headers, callbacks, **kwargs)
-    _http_process(session, request)
+
+
+def _enqueue(uri, method='GET', params=None, body=None, headers=None,
+             data=None, **kwargs):
+    """
+    Enqueue non-blocking threaded HTTP request with callback.
+
+    Callbacks, including the default error handler if enabled, are run in the
+    HTTP thread, where exceptions are logged but are not able to be caught.
+    The default error handler is called first, then 'callback' (singular),
+    followed by each callback in 'callbacks' (plural). All callbacks are
+    invoked, even if the default error handler detects a problem, so they
+    must check request.exception before using the response data.
+
+    Note: multiple async requests run concurrently, limited by the number
+    of http threads in L{config.max_http_threads}. Accessing the data of
+    the returned request blocks until it has been processed.
+
+    @see: L{requests.Session.request} for parameters.
+
+    @kwarg default_error_handling: Use default error handling
+    @type default_error_handling: bool
+    @kwarg callback: Method to call once data is fetched
+    @type callback: callable
+    @kwarg callbacks: Methods to call once data is fetched
+    @type callbacks: list of callable
+    @rtype: L{threadedhttp.HttpRequest}
+    """
+    request = _build_request(uri, method, params, body, headers, data,
+                             **kwargs)
+    _start_http_threads()
+    http_queue.put(request)
     return request
 
 
@@ -477,8 +555,8 @@ def fetch(uri, method='GET', params=None, body=None, headers=None,
     """
     Blocking HTTP request.
 
-    Note: The callback runs in the HTTP thread, where exceptions are logged
-    but are not able to be caught.
+    The request is processed in the callers thread, so exceptions raised by
+    callbacks may be caught. Use L{_enqueue} to process it in a HTTP thread.
 
     See L{requests.Session.request} for parameters.
 
@@ -511,7 +589,8 @@ def fetch(uri, method='GET', params=None, body=None, headers=None,
         elif use_fake_user_agent is True:
             headers['user-agent'] = fake_user_agent()
 
-    request = _enqueue(uri, method, params, body, headers, **kwargs)
+    request = _build_request(uri, method, params, body, headers, **kwargs)
+    _http_process(session, request)
     # if there's no data in the answer we're in trouble
     assert request._data is not None
     # Run the error handling callback in the callers thread so exceptions
@@ -13,6 +13,7 @@ __docformat__ = 'epytext'
 # standard python libraries
 import codecs
 import re
+import threading
 
 import pywikibot
 from pywikibot.tools import deprecated, PY2, UnicodeMixin
@@ -63,10 +64,26 @@ class HttpRequest(UnicodeMixin):
 
         self._parsed_uri = None
         self._data = None
+        self._finished = threading.Event()
+
+    def _join(self, timeout=None):
+        """
+        Wait until the request has been processed.
+
+        @param timeout: seconds to wait at most, or None to wait forever
+        @type timeout: float or None
+        @return: whether the request has been processed
+        @rtype: bool
+        """
+        if self._data is not None:
+            return True
+        self._finished.wait(timeout)
+        return self._data is not None
 
     @property
     def data(self):
-        """Return the requests response tuple."""
+        """Return the requests response tuple, waiting for it if queued."""
+        self._join()
         assert(self._data is not None)
         return self._data
 
@@ -75,9 +92,12 @@ class HttpRequest(UnicodeMixin):
         """Set the requests response and invoke each callback."""
         self._data = value
 
-        if self.callbacks:
-            for callback in self.callbacks:
-                callback(self)
+        try:
+            if self.callbacks:
+                for callback in self.callbacks:
+                    callback(self)
+        finally:
+            self._finished.set()
 
     @property
     def exception(self):
@@ -183,6 +183,14 @@ fake_user_agent = False
 site_interface = 'APISite'
 # number of days to cache namespaces, api configuration, etc.
 API_config_expiry = 30
+# maximum size of the API response cache in megabytes. When it is exceeded,
+# the least recently used entries are removed. 0 means no limit.
+API_cache_max_size = 100
+# number of API responses and their total size in megabytes which are also
+# kept in memory to avoid reading the API response cache again. 0 entries
+# disables the memory cache.
+API_cache_memory_entries = 500
+API_cache_memory_size = 20
 
 # The maximum number of bytes which uses a GET request, if not positive
 # it'll always use POST requests
@@ -658,8 +666,8 @@ upload_to_commons = False
 
 # Slow down the robot such that it never requests a second page within
 # 'minthrottle' seconds. This can be lengthened if the server is slow,
-# but never more than 'maxthrottle' seconds. However - if you are running
-# more than one bot in parallel the times are lengthened.
+# but never more than 'maxthrottle' seconds. The delays are shared by all
+# bots running in parallel on the same site.
 #
 # 'maxlag' is used to control the rate of server access (see below).
 # Set minthrottle to non-zero to use a throttle on read access.
@@ -670,6 +678,10 @@ maxthrottle = 60
 # 'put_throttle' seconds.
 put_throttle = 10
 
+# Number of requests which can be made at once before the above delays
+# apply. Like the delays, it is shared by all bots on the same site.
+throttle_burst = 1
+
 # Sometimes you want to know when a delay is inserted. If a delay is larger
 # than 'noisysleep' seconds, it is logged on the screen.
 noisysleep = 3.0
@@ -684,6 +696,14 @@ noisysleep = 3.0
 # at least 1 second.
 maxlag = 5
 
+# Adapt the request rate to the load of the server before maxlag errors
+# occur. The estimated replication lag is compared with 'maxlag' and the
+# response time with 'slow_response_time' seconds. When the server is under
+# load, fewer reads are made in parallel and the delays are lengthened up to
+# four times.
+adaptive_throttle = True
+slow_response_time = 5.0
+
 # Maximum of pages which can be retrieved at one time from wiki server.
 # -1 indicates limit by api restriction
 step = -1
@@ -823,6 +843,11 @@ persistent_http = False
 # read timeout, or a single value for both in a tuple (since requests 2.4.0).
 socket_timeout = (6.05, 45)
 
+# Number of threads processing queued (non-blocking) http requests, i.e.
+# the maximum number of such requests which are in flight at the same time.
+# Blocking requests are always processed in the calling thread.
+max_http_threads = 8
+
 
 # ############# COSMETIC CHANGES SETTINGS ##############
 # The bot can make some additional changes to each page it edits, e.g. fix
@@ -910,6 +935,11 @@ line_separator = LS = '\n'
 # if the user has already installed the library.
 use_mwparserfromhell = True
 
+# Parser used by textlib.extract_templates_and_params if mwparserfromhell
+# is not used: 'regex' or 'stack'. The stack based parser scans the text
+# once and returns the templates in the same order as mwparserfromhell.
+template_params_parser = 'regex'
+
 # Pickle protocol version to use for storing dumps.
 # This config variable is not used for loading dumps.
 # Version 2 is common to both Python 2 and 3, and should
@@ -7,6 +7,7 @@
 #
 from __future__ import absolute_import, division, unicode_literals
 
+import atexit
 import datetime
 import hashlib
 import inspect
@@ -14,8 +15,15 @@ import json
 import os
 import pprint
 import re
+import sqlite3
+import threading
 import traceback
 
+try:
+    import asyncio
+except ImportError as e:  # Python 2.7
+    asyncio = e
+
 try:
     from collections.abc import Container, MutableMapping
 except ImportError:  # Python 2.7
@@ -23,22 +31,18 @@ except ImportError:  # Python 2.7
 from email.mime.nonmultipart import MIMENonMultipart
 from warnings import warn
 
-try:
-    import cPickle as pickle  # noqa: N813
-except ImportError:
-    import pickle
-
 import pywikibot
 
 from pywikibot import config, login
 
 from pywikibot.comms import http
+from pywikibot.data.apicache import CacheStore, MemoryCache
 from pywikibot.exceptions import (
     Server504Error, Server414Error, FatalServerError, NoUsername,
     Error, TimeoutError, InvalidTitle, UnsupportedPage
 )
 from pywikibot.tools import (
-    deprecated, itergroup, ip, PY2, PYTHON_VERSION,
+    deprecated, itergroup, ip, PY2, PYTHON_VERSION, queue,
     getargspec, UnicodeType, remove_last_args
 )
 from pywikibot.tools.formatter import color_format
@@ -94,6 +98,20 @@ _logger = 'data.api'
 lagpattern = re.compile(
     r'Waiting for [\w.: ]+: (?P<lag>\d+)(?:\.\d+)? seconds? lagged')
 
+if PYTHON_VERSION < (3, 5):
+    # only used for asynchronous iteration which requires Python 3.5+
+    StopAsyncIteration = StopIteration
+
+# queue to hold background tasks of AsyncRequest and _AsyncIterator
+_background_queue = queue.Queue()
+# threads running the tasks from _background_queue
+_background_threads = []
+_background_lock = threading.Lock()
+
+# CacheStore instances keyed by their directory and file name
+_cache_stores = {}
+_cache_stores_lock = threading.Lock()
+
 
 class APIError(Error):
 
@@ -168,8 +186,18 @@ class ParamInfo(Container):
     Provides cache aware fetching of parameter information.
 
     It does not support the format modules.
+
+    Fetched modules are kept in a snapshot on disk per site, from which
+    they are loaded as long as the MediaWiki version and its git hash
+    are unchanged.
     """
 
+    # file name of the snapshot store in the API cache directory
+    snapshot_filename = 'paraminfo.sqlite3'
+
+    # increase when the normalized format of the modules changes
+    snapshot_format = 1
+
     paraminfo_keys = frozenset(['modules', 'querymodules', 'formatmodules',
                                 'mainmodule', 'pagesetmodule'])
 
@@ -409,6 +437,15 @@ class ParamInfo(Container):
 
         assert 'query' in self._modules or 'paraminfo' not in self._paraminfo
 
+        modules = self._load_snapshot(modules)
+        if self.modules_only_mode and 'query' in self._paraminfo \
+                and 'pageset' in modules:
+            # pageset is never requested but emulated
+            modules.discard('pageset')
+            self._emulate_pageset()
+        if not modules:
+            return
+
         # If something went wrong in a batch it can add each module to the
         # batch and the generator will on the next iteration yield each module
         # separately
@@ -488,12 +525,72 @@ class ParamInfo(Container):
                     del normalized_result[path]
 
             self._paraminfo.update(normalized_result)
+            self._save_snapshot(normalized_result)
             self._generate_submodules(mod['path']
                                       for mod in normalized_result.values())
 
         if 'pageset' in modules and 'pageset' not in self._paraminfo:
             self._emulate_pageset()
 
+    def _snapshot_version(self):
+        """Return the version the modules of the snapshot must match."""
+        siteinfo = self.site.siteinfo
+        git_hash = siteinfo['git-hash'] if 'git-hash' in siteinfo else ''
+        return '{0}:{1}:{2}'.format(self.snapshot_format,
+                                    self.site.mw_version, git_hash)
+
+    def _snapshot_key(self, module):
+        """Return the key of a module in the snapshot store."""
+        return hashlib.sha256(
+            '{0!r}:{1}'.format(self.site, module).encode('utf-8')
+        ).hexdigest()
+
+    def _load_snapshot(self, modules):
+        """
+        Load modules from the snapshot, if they are of the current version.
+
+        @param modules: API modules to load
+        @type modules: set
+        @return: modules which are not available in the snapshot
+        @rtype: set
+        """
+        missing = set()
+        loaded = {}
+        try:
+            store = CachedRequest._get_cache(self.snapshot_filename)
+            version = self._snapshot_version()
+            for module in modules:
+                record = store.get(self._snapshot_key(module), touch=False)
+                if record is None or record.uniquedesc != version:
+                    missing.add(module)
+                else:
+                    loaded[module] = record.data
+        except Exception as e:
+            pywikibot.output('Could not load paraminfo snapshot: %r' % e)
+            return modules
+
+        if loaded:
+            pywikibot.debug('paraminfo snapshot: loaded {0}'
+                            .format(', '.join(sorted(loaded))), _logger)
+            self._paraminfo.update(loaded)
+            self._generate_submodules(loaded)
+        return missing
+
+    def _save_snapshot(self, modules):
+        """
+        Save modules into the snapshot.
+
+        @param modules: paraminfo of the modules keyed by their path
+        @type modules: dict
+        """
+        try:
+            store = CachedRequest._get_cache(self.snapshot_filename)
+            version = self._snapshot_version()
+            for path, module in modules.items():
+                store.set(self._snapshot_key(path), version, module)
+        except Exception as e:
+            pywikibot.output('Could not save paraminfo snapshot: %r' % e)
+
     def _generate_submodules(self, modules):
         """Check and generate submodules for the given modules."""
         for module in modules:
@@ -1739,10 +1836,11 @@ class Request(MutableMapping):
         @rtype: tuple
         """
         try:
-            data = http.request(
-                site=self.site, uri=uri,
-                method='GET' if use_get else 'POST',
-                body=body, headers=headers)
+            with self.site.throttle.slot(write=self.write):
+                data = http.request(
+                    site=self.site, uri=uri,
+                    method='GET' if use_get else 'POST',
+                    body=body, headers=headers)
         except Server504Error:
             pywikibot.log('Caught HTTP 504 error; retrying')
         except Server414Error:
@@ -2095,7 +2193,14 @@ class Request(MutableMapping):
 
 class CachedRequest(Request):
 
-    """Cached request."""
+    """Cached request.
+
+    Entries are looked up in the process wide L{memory_cache} before they
+    are loaded from the cache store.
+    """
+
+    memory_cache = MemoryCache(config.API_cache_memory_entries,
+                               config.API_cache_memory_size * 1024 * 1024)
 
     def __init__(self, expiry, *args, **kwargs):
         """Initialize a CachedRequest object.
@@ -2190,9 +2295,41 @@ class CachedRequest(Request):
         ).hexdigest()
 
     def _cachefile_path(self):
+        """Return the path of the entry in the former file based cache."""
         return os.path.join(CachedRequest._get_cache_dir(),
                             self._create_file_name())
 
+    @classmethod
+    def _get_cache(cls, filename=CacheStore.filename):
+        """
+        Return a store in the cache directory.
+
+        Each store is opened once per directory and process. When the
+        store of the API responses is opened, entries of the former one
+        file per entry cache are imported.
+
+        @param filename: name of the database file
+        @type filename: str
+        @rtype: pywikibot.data.apicache.CacheStore
+        """
+        directory = cls._get_cache_dir()
+        with _cache_stores_lock:
+            store = _cache_stores.get((directory, filename))
+            if store is None:
+                if filename == CacheStore.filename:
+                    store = CacheStore(
+                        directory, config.API_cache_max_size * 1024 * 1024)
+                    try:
+                        store.migrate()
+                    except Exception as e:
+                        pywikibot.output('Could not migrate cache: %r' % e)
+                else:
+                    store = CacheStore(directory, filename=filename)
+                # write the access times which were not written yet
+                atexit.register(store.flush)
+                _cache_stores[directory, filename] = store
+        return store
+
     def _expired(self, dt):
         return dt + self.expiry < datetime.datetime.utcnow()
 
@@ -2204,29 +2341,40 @@ class CachedRequest(Request):
         """
         self._add_defaults()
         try:
-            filename = self._cachefile_path()
-            with open(filename, 'rb') as f:
-                uniquedescr, self._data, self._cachetime = pickle.load(f)
+            key = self._create_file_name()
+            record = self.memory_cache.get(key)
+            if record is None:
+                record = self._get_cache().get(key, raw=True)
+                if record is None:
+                    return False
+                self.memory_cache.set(record)
+                record = record.unpickled()
+            else:
+                # the store evicts by access time, so record the hit there
+                self._get_cache().touch(key)
+            uniquedescr = record.uniquedesc
+            self._data, self._cachetime = record.data, record.cachetime
             assert(uniquedescr == self._uniquedescriptionstr())
             if self._expired(self._cachetime):
                 self._data = None
                 return False
             pywikibot.debug('%s: cache hit (%s) for API request: %s'
-                            % (self.__class__.__name__, filename, uniquedescr),
+                            % (self.__class__.__name__, record.key,
+                               uniquedescr),
                             _logger)
             return True
-        except IOError:
-            # file not found
-            return False
         except Exception as e:
             pywikibot.output('Could not load cache: %r' % e)
             return False
 
     def _write_cache(self, data):
-        """Write data to self._cachefile_path()."""
-        data = (self._uniquedescriptionstr(), data, datetime.datetime.utcnow())
-        with open(self._cachefile_path(), 'wb') as f:
-            pickle.dump(data, f, protocol=config.pickle_protocol)
+        """Write data to the cache store."""
+        try:
+            record = self._get_cache().set(self._create_file_name(),
+                                           self._uniquedescriptionstr(), data)
+            self.memory_cache.set(record)
+        except sqlite3.Error as e:
+            pywikibot.output('Could not write cache: %r' % e)
 
     def submit(self):
         """Submit cached request."""
@@ -2239,10 +2387,219 @@ class CachedRequest(Request):
         return self._data
 
 
+def _background_worker():
+    """Daemon; take tasks from the queue and run them."""
+    while True:
+        task = _background_queue.get()
+        try:
+            task()
+        except Exception:
+            pywikibot.error(traceback.format_exc())
+        finally:
+            _background_queue.task_done()
+
+
+def _run_in_background(task):
+    """
+    Run a callable in a background thread.
+
+    At most config.max_http_threads threads are started; further tasks
+    wait until a thread becomes available.
+
+    @param task: callable without arguments
+    """
+    with _background_lock:
+        if len(_background_threads) < config.max_http_threads:
+            thread = threading.Thread(
+                target=_background_worker,
+                name='API-Thread-{0}'.format(len(_background_threads)))
+            thread.setDaemon(True)
+            thread.start()
+            _background_threads.append(thread)
+    _background_queue.put(task)
+
+
+def _set_future(future, result=None, exception=None):
+    """Set the result or exception of a pending asyncio future."""
+    if future.done():  # e.g. cancelled
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class AsyncRequest(Request):
+
+    """
+    A request which is submitted without blocking the calling thread.
+
+    start() submits the request in a background thread and returns
+    immediately. The request is processed by L{Request.submit}, so the
+    defaults, throttling, maxlag handling and retries are the same as for
+    blocking requests. The response is available using result(), using
+    callbacks registered by add_done_callback() or, on Python 3.5+, by
+    awaiting the request within an asyncio event loop::
+
+        request = AsyncRequest(site=site, parameters={'action': 'query',
+                                                      'meta': 'userinfo'})
+        data = await request
+
+    Requests are mappings and therefore not hashable; wrap them using
+    asyncio.ensure_future() to use them with functions like asyncio.gather().
+    At most config.max_http_threads requests are processed at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initializer. See L{Request} for parameters."""
+        super(AsyncRequest, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._started = False
+        self._callbacks = []
+        self._result = None
+        self._exception = None
+
+    def start(self):
+        """
+        Submit the request in a background thread if not yet started.
+
+        @return: this request
+        @rtype: AsyncRequest
+        """
+        with self._lock:
+            if not self._started:
+                self._started = True
+                _run_in_background(self._process)
+        return self
+
+    def _process(self):
+        """Submit the request and invoke the callbacks."""
+        try:
+            self._result = self.submit()
+        except Exception as e:
+            self._exception = e
+        with self._lock:
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._invoke(callback)
+
+    def _invoke(self, callback):
+        """Invoke a callback and log its errors."""
+        try:
+            callback(self)
+        except Exception:
+            pywikibot.error(traceback.format_exc())
+
+    def done(self):
+        """Return whether the request has been processed.
+
+        @rtype: bool
+        """
+        return self._finished.is_set()
+
+    def add_done_callback(self, callback):
+        """
+        Call callback with this request as argument when it is processed.
+
+        The callback is invoked in the background thread, or immediately
+        if the request is processed already. Exceptions are logged.
+
+        @type callback: callable
+        """
+        with self._lock:
+            if not self._finished.is_set():
+                self._callbacks.append(callback)
+                return
+        self._invoke(callback)
+
+    def result(self, timeout=None):
+        """
+        Return the response, starting the request if necessary.
+
+        @param timeout: seconds to wait at most, or None to wait forever
+        @type timeout: float or None
+        @return: a dict containing data retrieved from api.php
+        @rtype: dict
+        @raises TimeoutError: the request was not processed in time
+        @raises Exception: any exception raised by submit()
+        """
+        self.start()
+        if not self._finished.wait(timeout):
+            raise TimeoutError('Request was not processed within {0} seconds.'
+                               .format(timeout))
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def __await__(self):
+        """Start the request and wait for it within an asyncio event loop."""
+        loop = asyncio.get_event_loop()
+        future = asyncio.Future(loop=loop)
+
+        def callback(request):
+            loop.call_soon_threadsafe(_set_future, future,
+                                      request._result, request._exception)
+
+        self.add_done_callback(callback)
+        self.start()
+        return future.__await__()
+
+
+class _AsyncIterator(object):
+
+    """
+    Asynchronous iterator over a blocking API iterator.
+
+    Each step of the wrapped iterator, which may submit a continuation
+    request, is run in a background thread so that the event loop is not
+    blocked. Results are yielded in the same order.
+    """
+
+    def __init__(self, iterable):
+        """Initializer."""
+        self._iterator = iter(iterable)
+        self._lock = threading.Lock()
+
+    def __aiter__(self):
+        """Return the iterator itself."""
+        return self
+
+    def __anext__(self):
+        """Return an asyncio future for the next result."""
+        loop = asyncio.get_event_loop()
+        future = asyncio.Future(loop=loop)
+
+        def step():
+            with self._lock:
+                try:
+                    result = next(self._iterator)
+                except StopIteration:
+                    loop.call_soon_threadsafe(_set_future, future, None,
+                                              StopAsyncIteration())
+                except Exception as e:
+                    loop.call_soon_threadsafe(_set_future, future, None, e)
+                else:
+                    loop.call_soon_threadsafe(_set_future, future, result)
+
+        _run_in_background(step)
+        return future
+
+
 class _RequestWrapper(object):
 
     """A wrapper class to handle the usage of the C{parameters} parameter."""
 
+    def __aiter__(self):
+        """
+        Return an asynchronous iterator over the results.
+
+        It is iterated using C{async for} within an asyncio event loop
+        (Python 3.5+). Continuation and limits are handled as in __iter__.
+        """
+        return _AsyncIterator(self)
+
     def _clean_kwargs(self, kwargs, **mw_api_args):
         """Clean kwargs, define site and request class."""
         if 'site' not in kwargs:
@@ -2488,6 +2845,7 @@ class QueryGenerator(_RequestWrapper):
             self.prefix = 'g' + self.prefix
 
         self.limit = None
+        self.prefetch = 0
         self.query_limit = self.api_limit
         if 'generator' in parameters:
             # name of the "query" subelement key to look for when iterating
@@ -2594,6 +2952,22 @@ class QueryGenerator(_RequestWrapper):
         if value is not None:
             self.limit = int(value)
 
+    def set_prefetch(self, depth):
+        """Set the number of API responses to be retrieved in advance.
+
+        If set to a positive value, the continuation request is submitted
+        in a background thread as soon as the previous response has been
+        received, while its results are still being processed. At most
+        depth responses are retrieved in advance. The requests are still
+        throttled and are not continued once the maximum number of items
+        set by set_maximum_items has been received.
+
+        @param depth: The number of responses to be retrieved in advance;
+            0 disables prefetching, which is the default.
+        @type depth: int
+        """
+        self.prefetch = int(depth)
+
     def _update_limit(self):
         """Set query limit for self.module based on api response."""
         param = self.site._paraminfo.parameter('query+' + self.limited_module,
@@ -2679,18 +3053,22 @@ class QueryGenerator(_RequestWrapper):
 
         return None
 
-    def _query_continue(self):
-        if all(key not in self.data[self.continue_name]
+    def _query_continue(self, data=None):
+        if data is None:
+            data = self.data
+        if all(key not in data[self.continue_name]
                for key in self.continuekey):
             pywikibot.log(
                 "Missing '%s' key(s) in ['%s'] value."
                 % (self.continuekey, self.continue_name))
             return True
-        for query_continue_pair in self.data['query-continue'].values():
+        for query_continue_pair in data['query-continue'].values():
             self._add_continues(query_continue_pair)
 
-    def _continue(self):
-        self._add_continues(self.data['continue'])
+    def _continue(self, data=None):
+        if data is None:
+            data = self.data
+        self._add_continues(data['continue'])
 
     def _add_continues(self, continue_pair):
         for key, value in continue_pair.items():
@@ -2699,18 +3077,22 @@ class QueryGenerator(_RequestWrapper):
                 value = str(value)
             self.request[key] = value
 
-    def _handle_query_limit(self, prev_limit, new_limit, had_data):
+    def _handle_query_limit(self, prev_limit, new_limit, had_data,
+                            count=None):
         """Handle query limit."""
         if self.query_limit is None:
             return prev_limit, new_limit
 
+        if count is None:
+            count = self._count
+
         prev_limit = new_limit
         if self.limit is None:
             new_limit = self.query_limit
         elif self.limit > 0:
             if had_data:
                 # self.resultkey in data in last request.submit()
-                new_limit = min(self.query_limit, self.limit - self._count)
+                new_limit = min(self.query_limit, self.limit - count)
             else:
                 # only "(query-)continue" returned. See Bug T74209.
                 # increase new_limit to advance faster until new
@@ -2740,7 +3122,7 @@ class QueryGenerator(_RequestWrapper):
                         api=self.api_limit,
                         limit=self.limit,
                         new=new_limit,
-                        count=self._count,
+                        count=count,
                         prefix=self.prefix,
                         value=self.request[self.prefix + 'limit']),
                 _logger)
@@ -2791,12 +3173,143 @@ class QueryGenerator(_RequestWrapper):
                 raise RuntimeError(
                     'QueryGenerator._extract_results reached the limit')
 
+    def _count_results(self, data):
+        """Count the results of an API response like _extract_results."""
+        resultdata = data['query'][self.resultkey]
+        if isinstance(resultdata, dict):
+            resultdata = resultdata.get('results', resultdata.values())
+        count = 0
+        for item in resultdata:
+            keys = (set(self.continuekey) & set(item.keys())
+                    if isinstance(item, dict) else None)
+            if keys:
+                count += sum(len(item[key]) for key in keys)
+            else:
+                count += 1
+        return count
+
+    def _iter_data(self):
+        """Yield the results of self.data.
+
+        @raises RuntimeError: the limit has been reached
+        """
+        resultdata = self._get_resultdata()
+        if 'normalized' in self.data['query']:
+            self.normalized = {
+                item['to']: item['from']
+                for item in self.data['query']['normalized']}
+        else:
+            self.normalized = {}
+        for result in self._extract_results(resultdata):
+            yield result
+
+    def _prefetch_responses(self, responses, stop):
+        """
+        Submit the requests and put the responses into a queue.
+
+        Each response is put as a tuple (data, None) and an exception as
+        (None, exception). None is put when there are no more responses.
+
+        @param responses: the queue to put the responses into
+        @type responses: queue.Queue
+        @param stop: event to stop as the responses are no longer needed
+        @type stop: threading.Event
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    responses.put(item, timeout=0.25)
+                except queue.Full:
+                    continue
+                return True
+            return False
+
+        received = 0
+        had_data = True
+        prev_limit = new_limit = None
+        try:
+            while not stop.is_set():
+                # results may be skipped by the namespace filter, so do not
+                # reduce the request limit by the number of results received
+                prev_limit, new_limit = self._handle_query_limit(
+                    prev_limit, new_limit, had_data,
+                    count=0 if self._namespaces else received)
+                data = self.request.submit()
+                if not put((data, None)):
+                    return
+                if not data or not isinstance(data, dict):
+                    break
+                had_data = 'query' in data and self.resultkey in data['query']
+                if had_data:
+                    received += self._count_results(data)
+                elif self.continue_name not in data:
+                    break
+                if self.modules[0] != 'random':
+                    if (self.continue_name not in data
+                            or self.continue_update(data)):
+                        break
+                if (self.limit and 0 < self.limit <= received
+                        and not self._namespaces):
+                    break
+        except Exception as e:
+            put((None, e))
+        else:
+            put(None)
+
+    def _iter_prefetched(self):
+        """Iterate the responses which are retrieved in advance."""
+        responses = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._prefetch_responses,
+                                  args=(responses, stop),
+                                  name='Prefetch-Thread')
+        thread.setDaemon(True)
+        thread.start()
+
+        self._count = 0
+        try:
+            while True:
+                item = responses.get()
+                if item is None:
+                    return
+                self.data, exception = item
+                if exception is not None:
+                    raise exception
+                if not self.data or not isinstance(self.data, dict):
+                    pywikibot.debug(
+                        '{}: stopped iteration because no dict retrieved '
+                        'from api.'.format(self.__class__.__name__),
+                        _logger)
+                    return
+                if ('query' in self.data
+                        and self.resultkey in self.data['query']):
+                    try:
+                        for result in self._iter_data():
+                            yield result
+                    except RuntimeError:
+                        return
+                elif 'query' not in self.data:
+                    pywikibot.log("%s: 'query' not found in api response." %
+                                  self.__class__.__name__)
+                    pywikibot.log(UnicodeType(self.data))
+        finally:
+            stop.set()
+            if hasattr(self, 'data'):
+                del self.data
+
     def __iter__(self):
         """Submit request and iterate the response based on self.resultkey.
 
         Continues response as needed until limit (if any) is reached.
+        If prefetching is enabled using set_prefetch, the continuation
+        requests are submitted in advance in a background thread.
 
         """
+        if self.prefetch > 0:
+            for result in self._iter_prefetched():
+                yield result
+            return
+
         previous_result_had_data = True
         prev_limit = new_limit = None
 
@@ -2813,15 +3326,8 @@ class QueryGenerator(_RequestWrapper):
                     _logger)
                 return
             if 'query' in self.data and self.resultkey in self.data['query']:
-                resultdata = self._get_resultdata()
-                if 'normalized' in self.data['query']:
-                    self.normalized = {
-                        item['to']: item['from']
-                        for item in self.data['query']['normalized']}
-                else:
-                    self.normalized = {}
                 try:
-                    for result in self._extract_results(resultdata):
+                    for result in self._iter_data():
                         yield result
                 except RuntimeError:
                     return
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""SQLite backed storage for cached API responses."""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import calendar
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from collections import namedtuple, OrderedDict
+
+try:
+    import cPickle as pickle  # noqa: N813
+except ImportError:
+    import pickle
+
+import pywikibot
+
+from pywikibot import config
+
+__all__ = ('CacheRecord', 'CacheStore', 'MemoryCache')
+
+_logger = 'data.apicache'
+
+
+_legacy_name = re.compile('^[0-9a-f]{64}$')
+
+
+def _to_timestamp(dt):
+    """Convert a naive UTC datetime into POSIX seconds."""
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+def _from_timestamp(ts):
+    """Convert POSIX seconds into a naive UTC datetime."""
+    return datetime.datetime.utcfromtimestamp(ts)
+
+
+class CacheRecord(namedtuple('CacheRecord', ['key', 'uniquedesc', 'data',
+                                             'cachetime', 'accesstime',
+                                             'size'])):
+
+    """Entry of a CacheStore."""
+
+    __slots__ = ()
+
+    def unpickled(self):
+        """Return a copy of a raw entry with the data unpickled."""
+        return self._replace(data=pickle.loads(self.data))
+
+
+class CacheStore(object):
+
+    """
+    Cache of API responses in a single SQLite database.
+
+    Each entry is keyed by the hash of the request description and keeps
+    the pickled response together with its creation time, the time it was
+    last read and its size. The database uses write-ahead logging, so
+    several processes can read and write the same cache concurrently.
+
+    When a size limit is given, the least recently accessed entries are
+    removed whenever a new entry pushes the store beyond that limit. The
+    total size is kept up to date by triggers of the database, so it is
+    known without summing up all entries.
+
+    Reading an entry records its access time in memory. The access times
+    are written together every L{touch_interval} seconds or after
+    L{touch_batch} entries were read, before entries are evicted or listed
+    by access time and when the store is closed.
+    """
+
+    filename = 'apicache.sqlite3'
+    touch_interval = 60
+    touch_batch = 100
+
+    def __init__(self, directory, max_size=None, timeout=30, filename=None):
+        """
+        Initializer.
+
+        @param directory: directory holding the database file
+        @type directory: str
+        @param max_size: maximum total size of the entries in bytes;
+            None or 0 means unlimited
+        @type max_size: int or None
+        @param timeout: seconds to wait for a lock held by another
+            process or thread
+        @type timeout: float
+        @param filename: name of the database file; defaults to
+            L{CacheStore.filename}
+        @type filename: str
+        """
+        if filename:
+            self.filename = filename
+        self.directory = directory
+        self.path = os.path.join(directory, self.filename)
+        self.max_size = max_size
+        self.timeout = timeout
+        self._local = threading.local()
+        self._touches = {}
+        self._touch_lock = threading.Lock()
+        self._flushed = time.time()
+
+    def __repr__(self):
+        """Return representation string."""
+        return '{0}({1!r})'.format(self.__class__.__name__, self.path)
+
+    def __len__(self):
+        """Return the number of entries."""
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def __contains__(self, key):
+        """Return whether an entry for the key exists."""
+        return self._connection().execute(
+            'SELECT 1 FROM entries WHERE key = ?', (key, )).fetchone() \
+            is not None
+
+    def _connection(self):
+        """Return the connection of the current thread."""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.DatabaseError:
+                # e.g. network file systems; use the default journal
+                pass
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS entries ('
+                    'key TEXT PRIMARY KEY, uniquedesc TEXT NOT NULL, '
+                    'data BLOB, cachetime REAL NOT NULL, '
+                    'accesstime REAL NOT NULL, size INTEGER NOT NULL)')
+                conn.execute('CREATE INDEX IF NOT EXISTS entries_accesstime '
+                             'ON entries (accesstime)')
+                conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                             'key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+                conn.execute('CREATE TRIGGER IF NOT EXISTS entries_insert '
+                             'AFTER INSERT ON entries BEGIN '
+                             'UPDATE meta SET value = value + NEW.size '
+                             "WHERE key = 'size'; END")
+                conn.execute('CREATE TRIGGER IF NOT EXISTS entries_delete '
+                             'AFTER DELETE ON entries BEGIN '
+                             'UPDATE meta SET value = value - OLD.size '
+                             "WHERE key = 'size'; END")
+                conn.execute('CREATE TRIGGER IF NOT EXISTS entries_update '
+                             'AFTER UPDATE OF size ON entries BEGIN '
+                             'UPDATE meta SET value = value + NEW.size '
+                             "- OLD.size WHERE key = 'size'; END")
+                if conn.execute('SELECT 1 FROM meta '
+                                "WHERE key = 'size'").fetchone() is None:
+                    # a store created without the total size
+                    conn.execute('INSERT OR IGNORE INTO meta (key, value) '
+                                 "SELECT 'size', COALESCE(SUM(size), 0) "
+                                 'FROM entries')
+            self._local.connection = conn
+        return conn
+
+    def close(self):
+        '''Write the access times and close the connection of the thread.'''
+        self.flush()
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+    def get(self, key, touch=True, raw=False):
+        """
+        Return the entry for a key.
+
+        @param key: key of the entry
+        @type key: str
+        @param touch: record an access of the entry, see L{touch}
+        @type touch: bool
+        @param raw: keep the data pickled
+        @type raw: bool
+        @return: the entry or None if there is no entry for the key
+        @rtype: CacheRecord or None
+        """
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT uniquedesc, data, cachetime, accesstime, size '
+            'FROM entries WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            return None
+        uniquedesc, data, cachetime, accesstime, size = row
+        with self._touch_lock:
+            accesstime = max(accesstime, self._touches.get(key, accesstime))
+        if touch:
+            self.touch(key)
+        data = bytes(data)
+        return CacheRecord(key, uniquedesc,
+                           data if raw else pickle.loads(data),
+                           _from_timestamp(cachetime),
+                           _from_timestamp(accesstime), size)
+
+    def set(self, key, uniquedesc, data, cachetime=None, accesstime=None):
+        """
+        Store an entry and evict old entries if the store is too large.
+
+        @param key: key of the entry
+        @type key: str
+        @param uniquedesc: unique description of the request
+        @type uniquedesc: str
+        @param data: the response to be stored
+        @param cachetime: creation time of the entry; defaults to now
+        @type cachetime: datetime.datetime
+        @param accesstime: last access time of the entry; defaults to
+            the creation time
+        @type accesstime: datetime.datetime
+        @return: the stored entry with the data pickled
+        @rtype: CacheRecord
+        """
+        conn = self._connection()
+        with conn:
+            record = self._insert(conn, key, uniquedesc, data, cachetime,
+                                  accesstime)
+        if self.max_size:
+            self.evict(self.max_size)
+        return record
+
+    def _insert(self, conn, key, uniquedesc, data, cachetime, accesstime):
+        """Store an entry within the transaction of the caller."""
+        if cachetime is None:
+            cachetime = datetime.datetime.utcnow()
+        if accesstime is None:
+            accesstime = cachetime
+        blob = pickle.dumps(data, protocol=config.pickle_protocol)
+        with self._touch_lock:
+            self._touches.pop(key, None)
+        # replaced entries are deleted explicitly to run the size trigger
+        conn.execute('DELETE FROM entries WHERE key = ?', (key, ))
+        conn.execute(
+            'INSERT INTO entries '
+            '(key, uniquedesc, data, cachetime, accesstime, size) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, uniquedesc, sqlite3.Binary(blob),
+             _to_timestamp(cachetime), _to_timestamp(accesstime),
+             len(blob)))
+        return CacheRecord(key, uniquedesc, blob, cachetime, accesstime,
+                           len(blob))
+
+    def delete(self, key):
+        """Delete the entry for a key, if it exists."""
+        with self._touch_lock:
+            self._touches.pop(key, None)
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key, ))
+
+    def touch(self, key, accesstime=None):
+        """
+        Record an access of an entry.
+
+        The access time is written with the other recorded access times
+        by L{flush}, which is called when L{touch_batch} entries are
+        recorded or L{touch_interval} seconds passed since the last write.
+
+        @param key: key of the entry
+        @type key: str
+        @param accesstime: time of the access; defaults to now
+        @type accesstime: datetime.datetime
+        """
+        if accesstime is None:
+            accesstime = datetime.datetime.utcnow()
+        with self._touch_lock:
+            self._touches[key] = _to_timestamp(accesstime)
+            due = (len(self._touches) >= self.touch_batch
+                   or time.time() - self._flushed >= self.touch_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the recorded access times in one transaction."""
+        with self._touch_lock:
+            touches, self._touches = self._touches, {}
+            self._flushed = time.time()
+        if not touches:
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    'UPDATE entries SET accesstime = ? '
+                    'WHERE key = ? AND accesstime < ?',
+                    ((accesstime, key, accesstime)
+                     for key, accesstime in touches.items()))
+        except sqlite3.Error as e:
+            pywikibot.debug('{0}: could not write access times: {1!r}'
+                            .format(self.path, e), _logger)
+
+    def keys(self, least_recent_first=False):
+        """
+        Return the keys of all entries.
+
+        @param least_recent_first: order keys by their last access time
+        @type least_recent_first: bool
+        @rtype: list
+        """
+        query = 'SELECT key FROM entries'
+        if least_recent_first:
+            self.flush()
+            query += ' ORDER BY accesstime'
+        return [row[0] for row in self._connection().execute(query)]
+
+    @staticmethod
+    def _total_size(conn):
+        """Return the total size recorded by the triggers."""
+        return conn.execute(
+            "SELECT value FROM meta WHERE key = 'size'").fetchone()[0]
+
+    def total_size(self):
+        """Return the total size of all entries in bytes."""
+        return self._total_size(self._connection())
+
+    def evict(self, max_size):
+        """
+        Delete the least recently accessed entries beyond a size limit.
+
+        @param max_size: size in bytes to which the store is reduced
+        @type max_size: int
+        @return: number of deleted entries
+        @rtype: int
+        """
+        conn = self._connection()
+        if self._total_size(conn) <= max_size:
+            return 0
+        self.flush()
+        with conn:
+            total = self._total_size(conn)
+            if total <= max_size:
+                return 0
+            removed = []
+            for key, size in conn.execute(
+                    'SELECT key, size FROM entries ORDER BY accesstime'):
+                if total <= max_size:
+                    break
+                removed.append((key, ))
+                total -= size
+            conn.executemany('DELETE FROM entries WHERE key = ?', removed)
+        pywikibot.debug('{0}: evicted {1} entries'
+                        .format(self.path, len(removed)), _logger)
+        return len(removed)
+
+    def expire(self, before):
+        """
+        Delete entries created before a given time.
+
+        @param before: entries older than this are deleted
+        @type before: datetime.datetime
+        @return: number of deleted entries
+        @rtype: int
+        """
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM entries WHERE cachetime < ?',
+                                  (_to_timestamp(before), ))
+        return cursor.rowcount
+
+    def migrate(self, directory=None):
+        """
+        Import entries of the former one file per entry cache.
+
+        All entries are imported in one transaction and the store is
+        reduced to its size limit afterwards. Imported files are removed.
+        Files which cannot be read are kept.
+
+        @param directory: directory containing the pickled entries;
+            defaults to the directory of the store
+        @type directory: str
+        @return: number of imported entries
+        @rtype: int
+        """
+        directory = directory or self.directory
+        imported = []
+        conn = self._connection()
+        with conn:
+            for filename in os.listdir(directory):
+                if not _legacy_name.match(filename):
+                    continue
+                filepath = os.path.join(directory, filename)
+                try:
+                    with open(filepath, 'rb') as f:
+                        uniquedesc, data, cachetime = pickle.load(f)
+                    accesstime = _from_timestamp(os.stat(filepath).st_atime)
+                except Exception as e:
+                    pywikibot.debug('Could not migrate cache file {0}: {1!r}'
+                                    .format(filepath, e), _logger)
+                    continue
+                self._insert(conn, filename, uniquedesc, data, cachetime,
+                             max(cachetime, accesstime))
+                imported.append(filepath)
+        for filepath in imported:
+            os.remove(filepath)
+        if imported:
+            if self.max_size:
+                self.evict(self.max_size)
+            pywikibot.log('Migrated {0} entries into {1}'
+                          .format(len(imported), self.path))
+        return len(imported)
+
+
+class MemoryCache(object):
+
+    """
+    Least recently used entries of a CacheStore kept in memory.
+
+    The data of each entry is kept pickled, so every lookup returns a
+    fresh copy which the caller may modify. The cache is bounded by the
+    number of entries and by the total size of the pickled data.
+
+    The number of lookups which found an entry and which did not are
+    counted in L{hits} and L{misses}.
+    """
+
+    def __init__(self, max_entries, max_size):
+        """
+        Initializer.
+
+        @param max_entries: maximum number of entries; 0 disables the cache
+        @type max_entries: int
+        @param max_size: maximum total size of the entries in bytes
+        @type max_size: int
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self._entries)
+
+    @property
+    def size(self):
+        """Return the total size of the entries in bytes."""
+        return self._size
+
+    def get(self, key):
+        """
+        Return the entry for a key and mark it as recently used.
+
+        @param key: key of the entry
+        @type key: str
+        @return: the entry with unpickled data or None
+        @rtype: CacheRecord or None
+        """
+        with self._lock:
+            record = self._entries.pop(key, None)
+            if record is None:
+                self.misses += 1
+                return None
+            self._entries[key] = record
+            self.hits += 1
+        return record.unpickled()
+
+    def set(self, record):
+        """
+        Add an entry and drop the least recently used ones if necessary.
+
+        @param record: entry with pickled data as returned by
+            CacheStore.get with raw=True or by CacheStore.set
+        @type record: CacheRecord
+        """
+        if not self.max_entries or record.size > self.max_size:
+            return
+        with self._lock:
+            self._discard(record.key)
+            self._entries[record.key] = record
+            self._size += record.size
+            while (len(self._entries) > self.max_entries
+                   or self._size > self.max_size):
+                self._size -= self._entries.popitem(last=False)[1].size
+
+    def delete(self, key):
+        """Remove the entry for a key, if it exists."""
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        """Remove an entry; the lock must be held by the caller."""
+        record = self._entries.pop(key, None)
+        if record is not None:
+            self._size -= record.size
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
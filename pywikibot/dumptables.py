@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar tables of the pages and links of an XML dump.
+
+Reading a dump takes minutes or hours. The DumpTables class reads it once
+and keeps the titles, namespaces, redirect targets, used templates,
+categories and outgoing links in arrays stored next to the dump, which can
+be queried in seconds afterwards. If the directory of the dump is not
+writable, the tables are stored in the dumptables directory of the
+pywikibot base directory instead.
+
+Every title, whether of a page in the dump or of a link target, is
+identified by its position in the titles table. The titles are stored as
+one UTF-8 encoded string with the offset of each title and an index of the
+ids in the order of the titles, which is searched to find the id of a
+title. Each further column is an array of integers. Redirects map a title
+id to the id of the target. The other relations are stored by target: the
+ids of the pages referring to a target are found in one array between the
+start of the target and the start of the next one.
+
+Templates, categories and links are found in the wikitext without
+expanding it, so links generated by templates are not included.
+"""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import hashlib
+import json
+import os
+import re
+import sys
+
+from array import array
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.tools import PY2
+from pywikibot.xmlreader import XmlDump
+
+if PY2:
+    from future_builtins import map, zip
+
+__all__ = ('DumpTables', )
+
+_template_regex = re.compile(r'\{\{\s*([^{}|\n#<>\[\]]+?)\s*(?:\||\}\})')
+_template_prefix = re.compile(r'^(?:subst|safesubst|msgnw|msg|raw)\s*:\s*',
+                              re.IGNORECASE)
+_link_regex = re.compile(r'\[\[\s*([^{}|\n<>\[\]]+?)\s*(?:\||\]\])')
+
+# typecodes must be str on Python 2
+_INT = str('i')
+_BYTE = str('b')
+_OFFSET = str('I')
+
+
+def _csr(pages, targets, count):
+    """
+    Group the pages of a relation by target.
+
+    @param pages: the ids of the referring pages
+    @type pages: array
+    @param targets: the ids of the targets, one for each page
+    @type targets: array
+    @param count: the number of titles
+    @type count: int
+    @return: the ids of the pages sorted by target and without duplicates,
+        and the start of the pages of each target followed by the end
+    @rtype: tuple of array
+    """
+    starts = array(_INT, [0]) * (count + 1)
+    for target in targets:
+        starts[target + 1] += 1
+    for title_id in range(count):
+        starts[title_id + 1] += starts[title_id]
+    slots = starts[:-1]
+    grouped = array(_INT, [0]) * len(pages)
+    for page, target in zip(pages, targets):
+        grouped[slots[target]] = page
+        slots[target] += 1
+    result = array(_INT)
+    result_starts = array(_INT, [0])
+    for title_id in range(count):
+        result.extend(sorted(set(
+            grouped[starts[title_id]:starts[title_id + 1]])))
+        result_starts.append(len(result))
+    return result, result_starts
+
+
+class _Titles(object):
+
+    """
+    Titles stored as one UTF-8 encoded string.
+
+    It behaves like a read-only list of the titles and finds the id of a
+    title by a binary search.
+    """
+
+    def __init__(self, data=b'', offsets=None, order=None):
+        """
+        Initializer.
+
+        @param data: the encoded titles
+        @type data: bytes
+        @param offsets: the start of each title followed by the end
+        @type offsets: array
+        @param order: the ids of the titles sorted by the encoded titles
+        @type order: array
+        """
+        self.data = data
+        self.offsets = array(_OFFSET, [0]) if offsets is None else offsets
+        self.order = array(_INT) if order is None else order
+
+    @classmethod
+    def from_list(cls, titles):
+        """Encode a list of titles."""
+        encoded = [title.encode('utf-8') for title in titles]
+        offsets = array(_OFFSET, [0])
+        for title in encoded:
+            offsets.append(offsets[-1] + len(title))
+        order = array(_INT, sorted(range(len(encoded)),
+                                   key=encoded.__getitem__))
+        return cls(b''.join(encoded), offsets, order)
+
+    def __len__(self):
+        """Return the number of titles."""
+        return len(self.offsets) - 1
+
+    def _encoded(self, title_id):
+        """Return the encoded title of an id."""
+        return self.data[self.offsets[title_id]:self.offsets[title_id + 1]]
+
+    def __getitem__(self, title_id):
+        """Return the title of an id."""
+        if not 0 <= title_id < len(self):
+            raise IndexError('title id out of range')
+        return self._encoded(title_id).decode('utf-8')
+
+    def __iter__(self):
+        """Iterate over the titles."""
+        for title_id in range(len(self)):
+            yield self[title_id]
+
+    def id(self, title):
+        """Return the id of a title or None."""
+        encoded = title.encode('utf-8')
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded(self.order[middle]) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if (low < len(self.order)
+                and self._encoded(self.order[low]) == encoded):
+            return self.order[low]
+        return None
+
+
+def _signature(filename):
+    """Return a string identifying the current version of a file."""
+    stat = os.stat(filename)
+    return '{0}:{1}'.format(stat.st_size, int(stat.st_mtime))
+
+
+class DumpTables(object):
+
+    """
+    Titles, redirects, templates, categories and links of an XML dump.
+
+    Use L{DumpTables.load} to read the tables of a dump, which builds them
+    on first use.
+    """
+
+    format_version = 2
+    suffix = '.tables'
+    relations = ('templates', 'categories', 'links')
+    # the number of normalized links remembered while building
+    cache_size = 100000
+
+    def __init__(self, site):
+        """
+        Initializer creating empty tables.
+
+        @param site: the site of the dump
+        @type site: pywikibot.site.BaseSite
+        """
+        self.site = site
+        self.titles = _Titles()
+        self.namespaces = array(_INT)
+        self.exists = array(_BYTE)
+        self.redirects = array(_INT)
+        # the pages referring to each target and the start of the pages
+        # of each target; while building the ids of the pages and targets
+        for relation in self.relations:
+            setattr(self, relation, (array(_INT), array(_INT, [0])))
+        self._ids = None
+        self._normalized = {}
+        self.redirect_notes = {'unknown site': 0, 'other site': 0,
+                               'anchor': 0}
+
+    def __len__(self):
+        """Return the number of titles."""
+        return len(self.titles)
+
+    @classmethod
+    def path(cls, filename):
+        """Return the directory of the tables of a dump."""
+        return filename + cls.suffix
+
+    @classmethod
+    def _paths(cls, filename):
+        """Return the directories the tables of a dump may be stored in."""
+        filename = os.path.abspath(filename)
+        digest = hashlib.md5(filename.encode('utf-8')).hexdigest()[:8]
+        name = '{0}-{1}{2}'.format(os.path.basename(filename), digest,
+                                   cls.suffix)
+        return [cls.path(filename),
+                config.datafilepath('dumptables', name, create=False)]
+
+    @classmethod
+    def load(cls, filename, site, build=True):
+        """
+        Read the tables of a dump.
+
+        @param filename: the dump
+        @type filename: str
+        @param site: the site of the dump
+        @type site: pywikibot.site.BaseSite
+        @param build: build the tables if they do not exist, were built for
+            another site or are outdated
+        @type build: bool
+        @return: the tables or None if they are not available and build is
+            False
+        @rtype: DumpTables or None
+        """
+        for directory in cls._paths(filename):
+            try:
+                with open(os.path.join(directory, 'meta.json')) as f:
+                    meta = json.load(f)
+            except (IOError, OSError, ValueError):
+                continue
+            if (meta.get('format') == cls.format_version
+                    and meta.get('site') == '{0}'.format(site)
+                    and meta.get('dump') == _signature(filename)):
+                break
+        else:
+            if not build:
+                return None
+            return cls.build(filename, site)
+
+        tables = cls(site)
+        tables.redirect_notes.update(meta.get('redirect_notes', {}))
+        with open(os.path.join(directory, 'titles.bin'), 'rb') as f:
+            data = f.read()
+        tables.titles = _Titles(
+            data, tables._read(directory, 'titles.offset', meta, _OFFSET),
+            tables._read(directory, 'titles.order', meta))
+        tables.namespaces = tables._read(directory, 'namespaces', meta)
+        tables.exists = tables._read(directory, 'exists', meta, _BYTE)
+        tables.redirects = tables._read(directory, 'redirects', meta)
+        for relation in cls.relations:
+            setattr(tables, relation,
+                    (tables._read(directory, relation + '.page', meta),
+                     tables._read(directory, relation + '.start', meta)))
+        return tables
+
+    @staticmethod
+    def _read(directory, name, meta, typecode=_INT):
+        """Read a column."""
+        column = array(typecode)
+        path = os.path.join(directory, name + '.bin')
+        with open(path, 'rb') as f:
+            column.fromfile(f, os.path.getsize(path) // column.itemsize)
+        if meta['byteorder'] != sys.byteorder:
+            column.byteswap()
+        return column
+
+    def save(self, filename):
+        """
+        Write the tables next to a dump.
+
+        The tables are written to the pywikibot base directory if the
+        directory of the dump is not writable.
+
+        @param filename: the dump
+        @type filename: str
+        @return: the directory of the tables
+        @rtype: str
+        @raises IOError: the tables cannot be written to either directory
+        """
+        paths = self._paths(filename)
+        for directory in paths:
+            try:
+                self._write(filename, directory)
+            except (IOError, OSError) as e:
+                if directory == paths[-1]:
+                    raise
+                pywikibot.log('Cannot write the tables to {0}: {1}'
+                              .format(directory, e))
+            else:
+                return directory
+
+    def _write(self, filename, directory):
+        """Write the tables to a directory."""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'titles.bin'), 'wb') as f:
+            f.write(self.titles.data)
+        columns = [('titles.offset', self.titles.offsets),
+                   ('titles.order', self.titles.order),
+                   ('namespaces', self.namespaces), ('exists', self.exists),
+                   ('redirects', self.redirects)]
+        for relation in self.relations:
+            pages, starts = getattr(self, relation)
+            columns += [(relation + '.page', pages),
+                        (relation + '.start', starts)]
+        for name, column in columns:
+            with open(os.path.join(directory, name + '.bin'), 'wb') as f:
+                column.tofile(f)
+        # the meta data is written last as it marks the tables as complete
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            f.write(json.dumps({'format': self.format_version,
+                                'site': '{0}'.format(self.site),
+                                'dump': _signature(filename),
+                                'byteorder': sys.byteorder,
+                                'redirect_notes': self.redirect_notes}))
+
+    @classmethod
+    def build(cls, filename, site):
+        """
+        Read a dump and write its tables.
+
+        Only the latest revision of each page is read. Redirects to other
+        or unknown sites are ignored; they are reported and counted in
+        redirect_notes like redirects with a pipelink. The tables are kept in
+        memory only if they cannot be written.
+
+        @param filename: the dump
+        @type filename: str
+        @param site: the site of the dump
+        @type site: pywikibot.site.BaseSite
+        @rtype: DumpTables
+        """
+        pywikibot.output('Building the tables of {0}'.format(filename))
+        tables = cls(site)
+        tables._begin()
+        redirect_regex = site.redirectRegex()
+        dump = XmlDump(filename, fields=('title', 'ns', 'text'))
+        for count, entry in enumerate(dump.parse(), 1):
+            if count % 10000 == 0:
+                pywikibot.output('{0} pages read...'.format(count))
+            if entry.ns is not None:
+                page = tables._add(entry.title, int(entry.ns))
+            else:  # the dump does not give the namespace
+                normalized = tables._normalize(entry.title, 0)
+                if normalized is None:
+                    continue
+                page = tables._add(*normalized)
+            tables.exists[page] = 1
+            text = entry.text
+            match = redirect_regex.match(text)
+            if match:
+                target = tables._redirect_target(entry.title, match.group(1))
+                if target is not None:
+                    tables.redirects[page] = target
+            for name in _template_regex.findall(text):
+                target = tables._target(_template_prefix.sub('', name), 10)
+                if target is not None:
+                    tables.templates[0].append(page)
+                    tables.templates[1].append(target)
+            for link in _link_regex.findall(text):
+                target = tables._target(link, 0)
+                if target is None:
+                    continue
+                if tables.namespaces[target] == 14 and link[0] != ':':
+                    relation = tables.categories
+                else:
+                    relation = tables.links
+                relation[0].append(page)
+                relation[1].append(target)
+        tables._finish()
+        try:
+            tables.save(filename)
+        except (IOError, OSError) as e:
+            pywikibot.warning('Cannot write the tables of {0}, they are '
+                              'kept in memory only: {1}'.format(filename, e))
+        return tables
+
+    def _begin(self):
+        """Prepare empty tables for adding titles and relations."""
+        self.titles = []
+        self._ids = {}
+        for relation in self.relations:
+            setattr(self, relation, (array(_INT), array(_INT)))
+
+    def _finish(self):
+        """Store the titles and the relations for querying them."""
+        self._normalized.clear()
+        self._ids = None
+        for relation in self.relations:
+            setattr(self, relation,
+                    _csr(*getattr(self, relation), count=len(self)))
+        self.titles = _Titles.from_list(self.titles)
+
+    def _add(self, title, namespace):
+        """Return the id of a title, adding it if necessary."""
+        title_id = self._ids.get(title)
+        if title_id is None:
+            title_id = self._ids[title] = len(self.titles)
+            self.titles.append(title)
+            self.namespaces.append(namespace)
+            self.exists.append(0)
+            self.redirects.append(-1)
+        return title_id
+
+    def _normalize(self, text, default_namespace):
+        """
+        Return the title and namespace of a wikitext link.
+
+        @return: the full title and the namespace number or None if the
+            link is invalid, has no title or refers to another site
+        @rtype: tuple or None
+        """
+        key = (text, default_namespace)
+        if key in self._normalized:
+            return self._normalized[key]
+        if len(self._normalized) >= self.cache_size:
+            self._normalized.clear()
+        result = None
+        try:
+            link = pywikibot.Link(text, self.site, default_namespace)
+            link.parse()
+        except pywikibot.Error:
+            pass
+        else:
+            if link.site == self.site and link.title:
+                result = (link.canonical_title(), int(link.namespace))
+        self._normalized[key] = result
+        return result
+
+    def _target(self, text, default_namespace):
+        """Return the id of the title a link refers to or None."""
+        normalized = self._normalize(text, default_namespace)
+        return None if normalized is None else self._add(*normalized)
+
+    def _redirect_target(self, title, text):
+        """Return the id of the target of a redirect or None."""
+        link = pywikibot.Link(text, self.site)
+        try:
+            link.parse()
+        except pywikibot.SiteDefinitionError as e:
+            pywikibot.log(e)
+            pywikibot.output('NOTE: Ignoring {0} which is a redirect ({1}) '
+                             'to an unknown site.'.format(title, text))
+            self.redirect_notes['unknown site'] += 1
+            return None
+        except pywikibot.Error:
+            return None
+        if link.site != self.site:
+            pywikibot.output('NOTE: Ignoring {0} which is a redirect to '
+                             'another site {1}.'.format(title, link.site))
+            self.redirect_notes['other site'] += 1
+            return None
+        if not link.title:
+            return None
+        if link.anchor:
+            pywikibot.output('HINT: {0} is a redirect with a pipelink.'
+                             .format(title))
+            self.redirect_notes['anchor'] += 1
+        return self._add(link.canonical_title(), int(link.namespace))
+
+    def id(self, title):
+        """
+        Return the id of a title.
+
+        @param title: full title as in the dump
+        @type title: str
+        @return: the id or None if the title is neither a page nor a link
+            target of the dump
+        @rtype: int or None
+        """
+        return self.titles.id(title)
+
+    def _ids_of(self, pages):
+        """Return the ids of pages given as Page objects or titles."""
+        ids = set()
+        for page in pages:
+            if isinstance(page, pywikibot.page.BasePage):
+                page = page.title()
+            title_id = self.id(page)
+            if title_id is not None:
+                ids.add(title_id)
+        return ids
+
+    @staticmethod
+    def _namespace_set(namespaces):
+        """Return the namespace numbers as a set or None."""
+        return None if namespaces is None else set(map(int, namespaces))
+
+    def pages(self, namespaces=None):
+        """
+        Yield the titles of the pages in the dump.
+
+        @param namespaces: only yield pages in these namespaces
+        @type namespaces: iterable of int
+        @rtype: generator of str
+        """
+        namespaces = self._namespace_set(namespaces)
+        for title_id, exists in enumerate(self.exists):
+            if exists and (namespaces is None
+                           or self.namespaces[title_id] in namespaces):
+                yield self.titles[title_id]
+
+    def redirect_pairs(self, namespaces=None):
+        """
+        Yield the redirects of the dump.
+
+        @param namespaces: only yield redirects in these namespaces
+        @type namespaces: iterable of int
+        @return: the titles of the redirect and its target
+        @rtype: generator of tuple
+        """
+        namespaces = self._namespace_set(namespaces)
+        for title_id, target in enumerate(self.redirects):
+            if target >= 0 and (namespaces is None
+                                or self.namespaces[title_id] in namespaces):
+                yield self.titles[title_id], self.titles[target]
+
+    def _referring(self, relation, targets, namespaces):
+        """
+        Yield the titles of pages referring to any of the targets.
+
+        The pages are yielded in the order of their ids.
+        """
+        namespaces = self._namespace_set(namespaces)
+        pages, starts = getattr(self, relation)
+        found = set()
+        for target in self._ids_of(targets):
+            found.update(pages[starts[target]:starts[target + 1]])
+        for page in sorted(found):
+            if namespaces is None or self.namespaces[page] in namespaces:
+                yield self.titles[page]
+
+    def transcluding(self, templates, namespaces=None):
+        """
+        Yield the titles of pages using any of the templates.
+
+        @param templates: the templates
+        @type templates: iterable of Page or str
+        @param namespaces: only yield pages in these namespaces
+        @type namespaces: iterable of int
+        @rtype: generator of str
+        """
+        return self._referring('templates', templates, namespaces)
+
+    def category_members(self, categories, namespaces=None):
+        """
+        Yield the titles of pages in any of the categories.
+
+        @param categories: the categories
+        @type categories: iterable of Category or str
+        @param namespaces: only yield pages in these namespaces
+        @type namespaces: iterable of int
+        @rtype: generator of str
+        """
+        return self._referring('categories', categories, namespaces)
+
+    def linking(self, pages, namespaces=None):
+        """
+        Yield the titles of pages linking to any of the pages.
+
+        @param pages: the link targets
+        @type pages: iterable of Page or str
+        @param namespaces: only yield pages in these namespaces
+        @type namespaces: iterable of int
+        @rtype: generator of str
+        """
+        return self._referring('links', pages, namespaces)
@@ -31,6 +31,7 @@ from warnings import warn
 
 import pywikibot
 from pywikibot import config, i18n, textlib
+from pywikibot._wbtypes import intern_string
 from pywikibot.comms import http
 from pywikibot.data.api import APIError
 from pywikibot.exceptions import (
@@ -84,6 +85,7 @@ __all__ = (
     'Link',
     'SiteLink',
     'SiteLinkCollection',
+    'ClaimCollection',
     'html2unicode',
     'UnicodeToAsciiHtml',
     'unicode2html',
@@ -3803,6 +3805,7 @@ class WikibasePage(BasePage, WikibaseEntity):
 
     _cache_attrs = BasePage._cache_attrs + (
         '_content', 'labels', 'descriptions', 'aliases', 'claims',
+        '_diff_base',
     )
 
     def __init__(self, site, title='', **kwargs):
@@ -4017,32 +4020,33 @@ class WikibasePage(BasePage, WikibaseEntity):
             self._pageid = self._content['pageid']
 
         # labels
-        self.labels = {}
+        labels = {}
         for lang in self._content.get('labels', {}):
             if 'removed' not in self._content['labels'][lang]:  # T56767
-                self.labels[lang] = self._content['labels'][lang]['value']
+                labels[lang] = self._content['labels'][lang]['value']
+        self.labels = _ChangeTrackingDict(labels)
 
         # descriptions
-        self.descriptions = {}
+        descriptions = {}
         for lang in self._content.get('descriptions', {}):
-            self.descriptions[lang] = self._content[
+            descriptions[lang] = self._content[
                 'descriptions'][lang]['value']
+        self.descriptions = _ChangeTrackingDict(descriptions)
 
         # aliases
-        self.aliases = {}
+        aliases = {}
         for lang in self._content.get('aliases', {}):
-            self.aliases[lang] = []
+            aliases[lang] = []
             for value in self._content['aliases'][lang]:
-                self.aliases[lang].append(value['value'])
+                aliases[lang].append(value['value'])
+        self.aliases = _AliasesDict(aliases)
 
-        # claims
-        self.claims = {}
-        for pid in self._content.get('claims', {}):
-            self.claims[pid] = []
-            for claim in self._content['claims'][pid]:
-                c = Claim.fromJSON(self.repo, claim)
-                c.on_item = self
-                self.claims[pid].append(c)
+        # claims, created when a property is accessed
+        self.claims = ClaimCollection.fromJSON(
+            self._content.get('claims', {}), self.repo, self)
+
+        # the changes of the values above are recorded from this content
+        self._diff_base = self._content
 
         return {'aliases': self.aliases,
                 'labels': self.labels,
@@ -4050,28 +4054,60 @@ class WikibasePage(BasePage, WikibaseEntity):
                 'claims': self.claims,
                 }
 
+    def _changed_keys(self, values, diffto):
+        """
+        Return the keys of values which may differ from diffto.
+
+        The changes are only known if diffto is the content the values
+        were loaded from. Site keys are replaced by their language code as
+        in L{_normalizeLanguages}.
+
+        @param values: labels, descriptions, aliases, claims or sitelinks
+        @type values: dict
+        @param diffto: JSON containing entity data
+        @type diffto: dict
+        @return: the changed keys or None if all keys must be compared
+        @rtype: set or None
+        """
+        if (not diffto or diffto is not getattr(self, '_diff_base', None)
+                or not isinstance(values, _ChangeTrackingDict)):
+            return None
+        keys = set()
+        for key in list(values._changed):
+            if isinstance(key, pywikibot.site.BaseSite):
+                if key in values:
+                    values[key.lang] = dict.pop(values, key)
+                key = key.lang
+            keys.add(key)
+        return keys
+
     def _diff_to(self, type_key, key_name, value_name, diffto, data):
         assert type_key not in data, 'Key type must be defined in data'
-        source = self._normalizeLanguages(getattr(self, type_key)).copy()
+        source = getattr(self, type_key)
+        keys = self._changed_keys(source, diffto)
         diffto = {} if not diffto else diffto.get(type_key, {})
-        new = set(source.keys())
-        for key in diffto:
-            if key in new:
-                if source[key] == diffto[key][value_name]:
-                    del source[key]
-            else:
-                source[key] = ''
-        for key, value in source.items():
-            source[key] = {key_name: key, value_name: value}
-        if source:
-            data[type_key] = source
+        if keys is None:
+            source = self._normalizeLanguages(source)
+            keys = set(source) | set(diffto)
+        changes = {}
+        for key in keys:
+            if key in source:
+                value = dict.__getitem__(source, key)
+                if key not in diffto or value != diffto[key][value_name]:
+                    changes[key] = {key_name: key, value_name: value}
+            elif key in diffto:
+                changes[key] = {key_name: key, value_name: ''}
+        if changes:
+            data[type_key] = changes
 
     def toJSON(self, diffto=None):
         """
         Create JSON suitable for Wikibase API.
 
         When diffto is provided, JSON representing differences
-        to the provided data is created.
+        to the provided data is created. If diffto is the content the
+        entity was loaded from, only the labels, descriptions, aliases
+        and claims which were changed since are compared.
 
         @param diffto: JSON containing entity data
         @type diffto: dict
@@ -4083,38 +4119,54 @@ class WikibasePage(BasePage, WikibaseEntity):
 
         self._diff_to('descriptions', 'language', 'value', diffto, data)
 
-        aliases = self._normalizeLanguages(self.aliases).copy()
-        if diffto:
-            for lang, strings in diffto.get('aliases', {}).items():
-                if len(aliases.get(lang, [])) > 0:
+        aliases = self.aliases
+        langs = self._changed_keys(aliases, diffto)
+        diffto_aliases = diffto.get('aliases', {}) if diffto else {}
+        if langs is None:
+            aliases = self._normalizeLanguages(aliases)
+            langs = set(aliases) | set(diffto_aliases)
+        changes = {}
+        for lang in langs:
+            values = dict.get(aliases, lang, [])
+            if not diffto:
+                changes[lang] = [{'language': lang, 'value': i}
+                                 for i in values]
+            elif lang in diffto_aliases:
+                strings = diffto_aliases[lang]
+                if len(values) > 0:
                     if tuple(sorted(val['value'] for val in strings)) != tuple(
-                            sorted(aliases[lang])):
-                        aliases[lang] = [{'language': lang, 'value': i}
-                                         for i in aliases[lang]]
-                    else:
-                        del aliases[lang]
+                            sorted(values)):
+                        changes[lang] = [{'language': lang, 'value': i}
+                                         for i in values]
                 else:
-                    aliases[lang] = [
+                    changes[lang] = [
                         {'language': lang, 'value': i['value'], 'remove': ''}
                         for i in strings]
-        else:
-            for lang, values in aliases.items():
-                aliases[lang] = [{'language': lang, 'value': i}
-                                 for i in values]
+            elif lang in aliases:
+                changes[lang] = values
 
-        if aliases:
-            data['aliases'] = aliases
+        if changes:
+            data['aliases'] = changes
 
-        claims = {}
-        for prop in self.claims:
-            if len(self.claims[prop]) > 0:
-                claims[prop] = [claim.toJSON() for claim in self.claims[prop]]
+        properties = self._changed_keys(self.claims, diffto)
+        if isinstance(self.claims, ClaimCollection):
+            claims = self.claims.toJSON(properties)
+        else:
+            claims = {}
+            for prop in self.claims:
+                if len(self.claims[prop]) > 0:
+                    claims[prop] = [claim.toJSON()
+                                    for claim in self.claims[prop]]
 
         if diffto and 'claims' in diffto:
             temp = defaultdict(list)
             claim_ids = set()
 
             diffto_claims = diffto['claims']
+            if properties is not None:
+                diffto_claims = {prop: diffto_claims[prop]
+                                 for prop in properties
+                                 if prop in diffto_claims}
 
             for prop in claims:
                 for claim in claims[prop]:
@@ -4238,6 +4290,11 @@ class WikibasePage(BasePage, WikibaseEntity):
             by bots that need to keep track of which saves were successful.
         @type callback: callable
         """
+        batch = self.repo._edit_batch
+        if data is not None and batch is not None and self in batch:
+            # the content is replaced below, so save the collected changes
+            batch.commit_entity(self)
+
         if hasattr(self, '_revid'):
             baserevid = self.latest_revision_id
         else:
@@ -4597,6 +4654,7 @@ class ItemPage(WikibasePage):
         self.sitelinks = SiteLinkCollection(self.site)
         for dbname in self._content.get('sitelinks', {}):
             self.sitelinks[dbname] = self._content['sitelinks'][dbname]
+        self.sitelinks._changed.clear()
 
         data['sitelinks'] = self.sitelinks
         return data
@@ -4616,7 +4674,8 @@ class ItemPage(WikibasePage):
         Create JSON suitable for Wikibase API.
 
         When diffto is provided, JSON representing differences
-        to the provided data is created.
+        to the provided data is created. If diffto is the content the
+        item was loaded from, only the changed sitelinks are compared.
 
         @param diffto: JSON containing entity data
         @type diffto: dict
@@ -4625,12 +4684,18 @@ class ItemPage(WikibasePage):
         """
         data = super(ItemPage, self).toJSON(diffto=diffto)
 
-        sitelinks = {dbname: sitelink.toJSON()
-                     for (dbname, sitelink) in self.sitelinks.items()}
+        changed = self._changed_keys(self.sitelinks, diffto)
+        dbnames = list(self.sitelinks) if changed is None else changed
+        sitelinks = {dbname: dict.__getitem__(self.sitelinks, dbname).toJSON()
+                     for dbname in dbnames if dbname in self.sitelinks}
 
         if diffto and 'sitelinks' in diffto:
             to_nuke = []
             diffto_sitelinks = diffto['sitelinks']
+            if changed is not None:
+                diffto_sitelinks = {dbname: diffto_sitelinks[dbname]
+                                    for dbname in changed
+                                    if dbname in diffto_sitelinks}
 
             for dbname, sitelink in sitelinks.items():
                 if dbname in diffto_sitelinks:
@@ -4856,6 +4921,8 @@ class Property(object):
                    'tabular-data': 'string',
                    }
 
+    __slots__ = ('repo', 'id', '_type')
+
     def __init__(self, site, id, datatype=None):
         """
         Initializer.
@@ -4869,9 +4936,9 @@ class Property(object):
         @type datatype: basestring
         """
         self.repo = site
-        self.id = id.upper()
+        self.id = intern_string(id.upper())
         if datatype:
-            self._type = datatype
+            self._type = intern_string(datatype)
 
     @property
     def type(self):
@@ -4881,7 +4948,7 @@ class Property(object):
         @rtype: str
         """
         if not hasattr(self, '_type'):
-            self._type = self.repo.getPropertyType(self)
+            self._type = intern_string(self.repo.getPropertyType(self))
         return self._type
 
     @deprecated('Property.type', since='20140607')
@@ -5036,6 +5103,9 @@ class Claim(Property):
 
     SNAK_TYPES = ('value', 'somevalue', 'novalue')
 
+    __slots__ = ('snak', 'hash', 'rank', 'isReference', 'isQualifier',
+                 '_sources', '_qualifiers', 'target', 'snaktype', 'on_item')
+
     @deprecated_args(isReference='is_reference', isQualifier='is_qualifier')
     def __init__(self, site, pid, snak=None, hash=None, is_reference=False,
                  is_qualifier=False, rank='normal', **kwargs):
@@ -5061,8 +5131,9 @@ class Claim(Property):
         self.isQualifier = is_qualifier
         if self.isQualifier and self.isReference:
             raise ValueError('Claim cannot be both a qualifier and reference.')
-        self.sources = []
-        self.qualifiers = OrderedDict()
+        # created on first use as most claims are qualifiers or references
+        self._sources = None
+        self._qualifiers = None
         self.target = None
         self.snaktype = 'value'
         self.on_item = None  # The item it's on
@@ -5072,6 +5143,38 @@ class Claim(Property):
         return '{cls_name}.fromJSON({0}, {1})'.format(
             repr(self.repo), self.toJSON(), cls_name=type(self).__name__)
 
+    @property
+    def sources(self):
+        """
+        Return the sources of the claim.
+
+        @rtype: list of OrderedDict
+        """
+        if self._sources is None:
+            self._sources = []
+        return self._sources
+
+    @sources.setter
+    def sources(self, value):
+        """Set the sources of the claim."""
+        self._sources = value
+
+    @property
+    def qualifiers(self):
+        """
+        Return the qualifiers of the claim by property.
+
+        @rtype: OrderedDict
+        """
+        if self._qualifiers is None:
+            self._qualifiers = OrderedDict()
+        return self._qualifiers
+
+    @qualifiers.setter
+    def qualifiers(self, value):
+        """Set the qualifiers of the claim."""
+        self._qualifiers = value
+
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
             return False
@@ -5080,8 +5183,10 @@ class Claim(Property):
             if getattr(self, attr) != getattr(other, attr):
                 return False
 
-        my_qualifiers = list(chain.from_iterable(self.qualifiers.values()))
-        other_qualifiers = list(chain.from_iterable(other.qualifiers.values()))
+        my_qualifiers = list(chain.from_iterable(
+            (self._qualifiers or {}).values()))
+        other_qualifiers = list(chain.from_iterable(
+            (other._qualifiers or {}).values()))
         if len(my_qualifiers) != len(other_qualifiers):
             return False
         for q in my_qualifiers:
@@ -5129,7 +5234,7 @@ class Claim(Property):
             claim.snak = data['id']
         elif 'hash' in data:
             claim.hash = data['hash']
-        claim.snaktype = data['mainsnak']['snaktype']
+        claim.snaktype = intern_string(data['mainsnak']['snaktype'])
         if claim.getSnakType() == 'value':
             value = data['mainsnak']['datavalue']['value']
             # The default covers string, url types
@@ -5141,7 +5246,7 @@ class Claim(Property):
                     '{0} datatype is not supported yet.'.format(claim.type))
                 claim.target = pywikibot.WbUnknown.fromWikibase(value)
         if 'rank' in data:  # References/Qualifiers don't have ranks
-            claim.rank = data['rank']
+            claim.rank = intern_string(data['rank'])
         if 'references' in data:
             for source in data['references']:
                 claim.sources.append(cls.referenceFromJSON(site, source))
@@ -5223,7 +5328,7 @@ class Claim(Property):
             if hasattr(self, 'hash') and self.hash is not None:
                 data['hash'] = self.hash
         else:
-            if len(self.qualifiers) > 0:
+            if self._qualifiers:
                 data['qualifiers'] = {}
                 data['qualifiers-order'] = list(self.qualifiers.keys())
                 for prop, qualifiers in self.qualifiers.items():
@@ -5231,7 +5336,7 @@ class Claim(Property):
                         assert qualifier.isQualifier is True
                     data['qualifiers'][prop] = [
                         qualifier.toJSON() for qualifier in qualifiers]
-            if len(self.sources) > 0:
+            if self._sources:
                 data['references'] = []
                 for collection in self.sources:
                     reference = {
@@ -6457,9 +6562,110 @@ class SiteLink(BaseLink):
         return json
 
 
-class SiteLinkCollection(dict):
+class _ChangeTrackingDict(dict):
+
+    """
+    A dict recording the keys whose values may have changed.
+
+    Keys are recorded when they are set or removed. If the values are
+    mutable, keys are also recorded when their values are returned, as
+    these may be changed in place.
+    """
+
+    mutable_values = False
+
+    def __init__(self, *args, **kwargs):
+        """Initializer without any recorded changes."""
+        super(_ChangeTrackingDict, self).__init__(*args, **kwargs)
+        self._changed = set()
+
+    def __getitem__(self, key):
+        """Return the value of a key."""
+        value = super(_ChangeTrackingDict, self).__getitem__(key)
+        if self.mutable_values:
+            self._changed.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        """Set the value of a key."""
+        self._changed.add(key)
+        super(_ChangeTrackingDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        """Remove a key."""
+        self._changed.add(key)
+        super(_ChangeTrackingDict, self).__delitem__(key)
+
+    def get(self, key, default=None):
+        """Return the value of a key or default."""
+        return self[key] if key in self else default
+
+    def items(self):
+        """Return the keys and values."""
+        if self.mutable_values:
+            self._changed.update(self)
+        return super(_ChangeTrackingDict, self).items()
+
+    def values(self):
+        """Return the values."""
+        if self.mutable_values:
+            self._changed.update(self)
+        return super(_ChangeTrackingDict, self).values()
+
+    if PY2:
+        def iteritems(self):
+            """Iterate over the keys and values."""
+            return iter(self.items())
+
+        def itervalues(self):
+            """Iterate over the values."""
+            return iter(self.values())
+
+    def copy(self):
+        """Return a shallow copy as a dict."""
+        if self.mutable_values:
+            self._changed.update(self)
+        return dict(super(_ChangeTrackingDict, self).items())
+
+    def pop(self, key, *default):
+        """Remove a key and return its value."""
+        self._changed.add(key)
+        return super(_ChangeTrackingDict, self).pop(key, *default)
+
+    def popitem(self):
+        """Remove any key and return it with its value."""
+        key, value = super(_ChangeTrackingDict, self).popitem()
+        self._changed.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        """Return the value of a key, setting default if it is missing."""
+        self._changed.add(key)
+        return super(_ChangeTrackingDict, self).setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        """Set the values of several keys."""
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        """Remove all keys."""
+        self._changed.update(self)
+        super(_ChangeTrackingDict, self).clear()
+
+
+class _AliasesDict(_ChangeTrackingDict):
+
+    """The lists of aliases of an entity by language."""
+
+    mutable_values = True
+
+
+class SiteLinkCollection(_ChangeTrackingDict):
     """A structure holding SiteLinks for a Wikibase item."""
 
+    mutable_values = True
+
     def __init__(self, repo, *args):
         """
         Initializer.
@@ -6501,6 +6707,148 @@ class SiteLinkCollection(dict):
         return super(SiteLinkCollection, self).__setitem__(key, val)
 
 
+class _RawClaims(list):
+
+    """JSON of the claims of a property which were not created yet."""
+
+    __slots__ = ()
+
+
+class ClaimCollection(_ChangeTrackingDict):
+
+    """
+    A structure holding the claims of a Wikibase entity by property.
+
+    Claims loaded with the entity are kept as JSON and the Claim objects of
+    a property are only created when the property is accessed.
+    """
+
+    mutable_values = True
+
+    def __init__(self, repo, *args):
+        """
+        Initializer.
+
+        @param repo: the Wikibase site of the claims
+        @type repo: pywikibot.site.DataSite
+        """
+        super(ClaimCollection, self).__init__(*args)
+        self.repo = repo
+        self.on_item = None
+
+    @classmethod
+    def fromJSON(cls, data, repo, on_item=None):
+        """
+        Create a collection of claims from the JSON of an entity.
+
+        @param data: JSON containing the claims by property
+        @type data: dict
+        @param repo: the Wikibase site of the claims
+        @type repo: pywikibot.site.DataSite
+        @param on_item: the entity holding the claims
+        @type on_item: WikibasePage
+        @rtype: ClaimCollection
+        """
+        claims = cls(repo)
+        claims.on_item = on_item
+        for pid, claims_json in data.items():
+            dict.__setitem__(claims, pid, _RawClaims(claims_json))
+        return claims
+
+    def __getitem__(self, key):
+        """
+        Get the claims of a property, creating them if necessary.
+
+        @param key: property id
+        @type key: str
+        @rtype: list of Claim
+        """
+        claims = super(ClaimCollection, self).__getitem__(key)
+        if isinstance(claims, _RawClaims):
+            created = []
+            for data in claims:
+                claim = Claim.fromJSON(self.repo, data)
+                claim.on_item = self.on_item
+                created.append(claim)
+            super(ClaimCollection, self).__setitem__(key, created)
+            claims = created
+        return claims
+
+    def __eq__(self, other):
+        """Compare the claims of all properties."""
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        """Compare the claims of all properties."""
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Return a representation of the claims of all properties."""
+        return repr(dict(self.items()))
+
+    def get(self, key, default=None):
+        """Return the claims of a property or default."""
+        return self[key] if key in self else default
+
+    def items(self):
+        """Return a list of property id and claims pairs."""
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        """Return a list of the claims of each property."""
+        return [self[key] for key in self]
+
+    def pop(self, key, *default):
+        """Remove the claims of a property and return them."""
+        if key not in self:
+            return super(ClaimCollection, self).pop(key, *default)
+        claims = self[key]
+        del self[key]
+        return claims
+
+    def popitem(self):
+        """Remove the claims of any property and return them with its id."""
+        key = next(iter(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        """Return the claims of a property, setting default if missing."""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+        """Return a shallow copy holding the same lists of claims."""
+        claims = type(self)(self.repo, self.items())
+        claims.on_item = self.on_item
+        return claims
+
+    def toJSON(self, properties=None):
+        """
+        Return the JSON of the claims of all properties.
+
+        The JSON of claims which were not created is returned unchanged.
+
+        @param properties: only return the claims of these property ids
+        @type properties: iterable of str
+        @rtype: dict
+        """
+        if properties is None:
+            properties = dict.keys(self)
+        data = {}
+        for pid in properties:
+            claims = dict.get(self, pid)
+            if not claims:
+                continue
+            if isinstance(claims, _RawClaims):
+                data[pid] = list(claims)
+            else:
+                data[pid] = [claim.toJSON() for claim in claims]
+        return data
+
+
 # Utility functions for parsing page titles
 
 # This regular expression will match any decimal and hexadecimal entity and
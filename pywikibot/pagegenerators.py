@@ -22,11 +22,13 @@ from __future__ import absolute_import, division, unicode_literals
 
 import calendar
 import codecs
+import collections
 import datetime
 import itertools
 import json
 import re
 import sys
+import threading
 
 from datetime import timedelta
 from functools import partial
@@ -44,6 +46,7 @@ from pywikibot.tools import (
     IteratorNextMixin,
     itergroup,
     ModuleDeprecationWrapper,
+    queue,
     redirect_func,
 )
 
@@ -237,6 +240,11 @@ GENERATOR OPTIONS
                     Argument can be given as "-withoutinterwiki:n" where
                     n is the total to fetch.
 
+-xmltables          Work on all pages of a local XML dump. The titles are
+                    read from the tables of the dump, which are built on
+                    first use. Argument can be given as
+                    "-xmltables:filename".
+
 -mysqlquery         Takes a MySQL query string like
                     "SELECT page_namespace, page_title FROM page
                     WHERE page_namespace = 0" and treats
@@ -889,6 +897,12 @@ class GeneratorFactory(object):
             value = pywikibot.input('Please enter the local file name:')
         return TextfilePageGenerator(value, site=self.site)
 
+    def _handle_xmltables(self, value):
+        """Handle `-xmltables` argument."""
+        if not value:
+            value = pywikibot.input('Please enter the XML dump file name:')
+        return XMLDumpTablesPageGenerator(value, site=self.site)
+
     def _handle_namespaces(self, value):
         """Handle `-namespaces` argument."""
         if isinstance(self._namespaces, frozenset):
@@ -2203,15 +2217,131 @@ def RepeatingGenerator(generator, key_func=lambda x: x, sleep_duration=60,
             yield item
 
 
+class _PreloadGroup(object):
+
+    """A group of pages of one site which is preloaded by a site worker."""
+
+    def __init__(self, site, pages):
+        """Initializer."""
+        self.site = site
+        self.pages = pages
+        self.loaded = None
+        self.done = False
+
+
+def _preload_site_worker(groups, results, groupsize):
+    """Preload the groups of one site and put them into the results queue."""
+    while True:
+        group = groups.get()
+        if group is None:
+            break
+        try:
+            group.loaded = list(group.site.preloadpages(group.pages,
+                                                        groupsize))
+        except Exception as e:
+            results.put((group, e))
+        else:
+            results.put((group, None))
+
+
+def _parallel_preloading_generator(generator, groupsize, keep_order):
+    """
+    Yield pages which are preloaded by a separate worker for each site.
+
+    See L{PreloadingGenerator} for parameters.
+    """
+    sites = {}  # the group being filled for each site
+    workers = {}  # the queue of groups to be preloaded for each site
+    results = queue.Queue()
+    ordered = collections.deque()  # input pages with their group
+    pending = [0]  # number of groups dispatched but not yet received
+
+    def dispatch(group):
+        if group.site not in workers:
+            groups = queue.Queue(2)  # do not read too far ahead
+            thread = threading.Thread(
+                target=_preload_site_worker,
+                args=(groups, results, groupsize),
+                name='Preload-{0}'.format(group.site))
+            thread.setDaemon(True)
+            thread.start()
+            workers[group.site] = groups
+        workers[group.site].put(group)
+        pending[0] += 1
+
+    def received(block):
+        while pending[0]:
+            try:
+                group, error = results.get(block)
+            except queue.Empty:
+                return
+            pending[0] -= 1
+            if error is not None:
+                raise error
+            if not keep_order:
+                for page in group.loaded:
+                    yield page
+                continue
+            group.done = True
+            group.loaded = set(map(id, group.loaded))
+            # yield pages in input order as long as their group is done;
+            # duplicates and invalid titles are skipped like preloadpages
+            while ordered and ordered[0][1].done:
+                page, page_group = ordered.popleft()
+                if id(page) in page_group.loaded:
+                    page_group.loaded.remove(id(page))
+                    yield page
+
+    try:
+        for page in generator:
+            site = page.site
+            if site not in sites:
+                sites[site] = _PreloadGroup(site, [])
+            sites[site].pages.append(page)
+            if keep_order:
+                ordered.append((page, sites[site]))
+            if len(sites[site].pages) >= groupsize:
+                dispatch(sites.pop(site))
+            for loaded_page in received(False):
+                yield loaded_page
+        for group in sites.values():
+            dispatch(group)
+        for loaded_page in received(True):
+            yield loaded_page
+    finally:
+        # discard groups which are not needed anymore and stop the workers
+        for groups in workers.values():
+            while not groups.empty():
+                groups.get_nowait()
+            groups.put(None)
+
+
 @deprecated_args(pageNumber='groupsize', step='groupsize', lookahead=None)
-def PreloadingGenerator(generator, groupsize=50):
+def PreloadingGenerator(generator, groupsize=50, parallel=False,
+                        keep_order=False):
     """
     Yield preloaded pages taken from another generator.
 
+    If parallel is True, the pages of each site are preloaded by a separate
+    worker thread, so that pages of several sites are retrieved at the same
+    time; each site still uses its own throttle. Pages are yielded as soon
+    as their group has been retrieved, unless keep_order is True.
+
     @param generator: pages to iterate over
     @param groupsize: how many pages to preload at once
     @type groupsize: int
-    """
+    @param parallel: preload the pages of different sites concurrently
+    @type parallel: bool
+    @param keep_order: yield the pages in the order of the generator when
+        preloading in parallel
+    @type keep_order: bool
+    """
+    if parallel:
+        for page in _parallel_preloading_generator(generator, groupsize,
+                                                   keep_order):
+            yield page
+        return
+
     # pages may be on more than one site, for example if an interwiki
     # generator is used, so use a separate preloader for each site
     sites = {}
@@ -2819,6 +2949,8 @@ class XMLDumpOldPageGenerator(IteratorNextMixin):
     @ivar parser: holds the xmlreader.XmlDump parse method
     """
 
+    load_text = True
+
     @deprecated_args(xmlFilename='filename', xmlStart='start')
     def __init__(self, filename, start=None, namespaces=None, site=None,
                  text_predicate=None):
@@ -2837,7 +2969,11 @@ class XMLDumpOldPageGenerator(IteratorNextMixin):
         else:
             self.namespaces = self.site.namespaces.resolve(namespaces)
 
-        dump = xmlreader.XmlDump(filename)
+        if text_predicate or self.load_text:
+            fields = ('title', 'text')
+        else:
+            fields = ('title', )
+        dump = xmlreader.XmlDump(filename, fields=fields)
         self.parser = dump.parse()
 
     @property
@@ -2866,7 +3002,8 @@ class XMLDumpOldPageGenerator(IteratorNextMixin):
             if page.namespace() not in self.namespaces:
                 continue
             if not self.text_predicate or self.text_predicate(entry.text):
-                page.text = entry.text
+                if entry.text is not None:
+                    page.text = entry.text
                 return page
 
 
@@ -2874,6 +3011,8 @@ class XMLDumpPageGenerator(XMLDumpOldPageGenerator):
 
     """Xml generator that yields Page objects without text loaded."""
 
+    load_text = False
+
     def __next__(self):
         """Get next Page from dump and remove the text."""
         page = super(XMLDumpPageGenerator, self).__next__()
@@ -2881,6 +3020,37 @@ class XMLDumpPageGenerator(XMLDumpOldPageGenerator):
         return page
 
 
+def XMLDumpTablesPageGenerator(filename, site=None, namespaces=None,
+                               templates=None):
+    """
+    Yield the pages of an XML dump using the tables of the dump.
+
+    The tables are built when they do not exist yet, which takes as long as
+    reading the dump. Afterwards the pages are found without reading it.
+
+    @param filename: filename of XML dump
+    @type filename: str
+    @param site: site of the dump; defaults to the default site
+    @type site: pywikibot.site.BaseSite
+    @param namespaces: only yield pages in these namespaces
+    @type namespaces: iterable of int or Namespace
+    @param templates: only yield pages which use any of these templates
+    @type templates: iterable of Page or str
+    @rtype: generator of Page
+    """
+    from pywikibot.dumptables import DumpTables
+    site = site or pywikibot.Site()
+    if namespaces is not None:
+        namespaces = site.namespaces.resolve(namespaces)
+    tables = DumpTables.load(filename, site)
+    if templates is None:
+        titles = tables.pages(namespaces)
+    else:
+        titles = tables.transcluding(templates, namespaces)
+    for title in titles:
+        yield pywikibot.Page(site, title)
+
+
 def YearPageGenerator(start=1, end=2050, site=None):
     """
     Year page generator.
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Compact graph of the redirects of a wiki.
+
+Each title is interned once and identified by an integer id. The redirect
+targets are kept in an array indexed by these ids, so even the redirects
+of a large wiki need only a few bytes per title beyond the titles
+themselves. Chains and loops are resolved for all redirects at once in
+time linear in the number of titles.
+"""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from array import array
+
+from pywikibot.tools import PY2
+
+if PY2:
+    from future_builtins import map, zip
+
+__all__ = ('RedirectGraph', )
+
+# typecodes must be str on Python 2
+_INT = str('i')
+_BYTE = str('b')
+
+_NONE = -1
+
+# states while resolving the chains
+_UNVISITED = 0
+_VISITING = 1
+_RESOLVED = 2
+
+
+class RedirectGraph(object):
+
+    """
+    Redirects between titles identified by integer ids.
+
+    A title exists if it is a page, whether it is a redirect or not.
+    Titles which are only known as redirect targets do not exist, so a
+    redirect to them is broken.
+    """
+
+    def __init__(self):
+        """Initializer creating an empty graph."""
+        self.titles = []
+        self.exists = array(_BYTE)
+        self.targets = array(_INT)
+        self._ids = {}
+        self._lengths = None
+        self._finals = None
+
+    def __len__(self):
+        """Return the number of titles."""
+        return len(self.titles)
+
+    @classmethod
+    def from_tables(cls, tables, namespaces=None):
+        """
+        Create the graph of the redirects of a dump.
+
+        The ids of the tables are kept, so no title is interned again.
+
+        @param tables: the tables of the dump
+        @type tables: pywikibot.dumptables.DumpTables
+        @param namespaces: only include pages and redirects in these
+            namespaces; pages outside of them are treated as missing
+        @type namespaces: iterable of int
+        @rtype: RedirectGraph
+        """
+        graph = cls()
+        # the titles are searched by the tables until one is added
+        graph.titles = tables.titles
+        graph._ids = None
+        if namespaces is None:
+            graph.exists = array(_BYTE, tables.exists)
+            graph.targets = array(_INT, tables.redirects)
+        else:
+            namespaces = set(map(int, namespaces))
+            for namespace, exists, target in zip(tables.namespaces,
+                                                 tables.exists,
+                                                 tables.redirects):
+                if namespace in namespaces:
+                    graph.exists.append(exists)
+                    graph.targets.append(target)
+                else:
+                    graph.exists.append(0)
+                    graph.targets.append(_NONE)
+        return graph
+
+    def id(self, title):
+        """
+        Return the id of a title.
+
+        @rtype: int or None
+        """
+        if self._ids is None:
+            return self.titles.id(title)
+        return self._ids.get(title)
+
+    def intern(self, title):
+        """
+        Return the id of a title, adding the title if necessary.
+
+        @param title: the title
+        @type title: str
+        @rtype: int
+        """
+        title_id = self.id(title)
+        if title_id is None:
+            if self._ids is None:
+                self.titles = list(self.titles)
+                self._ids = {title: title_id
+                             for title_id, title in enumerate(self.titles)}
+            title_id = self._ids[title] = len(self.titles)
+            self.titles.append(title)
+            self.exists.append(0)
+            self.targets.append(_NONE)
+        return title_id
+
+    def add_page(self, title, target=None):
+        """
+        Add an existing page.
+
+        @param title: title of the page
+        @type title: str
+        @param target: the title the page redirects to or None if it is
+            not a redirect
+        @type target: str or None
+        @return: the id of the page
+        @rtype: int
+        """
+        page = self.intern(title)
+        self.exists[page] = 1
+        if target is not None:
+            self.add_redirect(title, target)
+        return page
+
+    def add_redirect(self, source, target):
+        """
+        Add a redirect without changing whether its pages exist.
+
+        @param source: title of the redirect
+        @type source: str
+        @param target: title of the redirect target
+        @type target: str
+        """
+        self.targets[self.intern(source)] = self.intern(target)
+        self._lengths = self._finals = None
+
+    def is_redirect(self, title_id):
+        """Return whether a title is a redirect."""
+        return self.targets[title_id] != _NONE
+
+    def redirects(self):
+        """
+        Yield the ids of all redirects.
+
+        @rtype: generator of int
+        """
+        for title_id, target in enumerate(self.targets):
+            if target != _NONE:
+                yield title_id
+
+    def broken(self):
+        """
+        Yield the ids of redirects to missing pages.
+
+        @rtype: generator of int
+        """
+        for title_id, target in enumerate(self.targets):
+            if target != _NONE and not self.exists[target]:
+                yield title_id
+
+    def double(self):
+        """
+        Yield the ids of redirects to other redirects.
+
+        @rtype: generator of int
+        """
+        targets = self.targets
+        for title_id, target in enumerate(targets):
+            if target != _NONE and targets[target] != _NONE:
+                yield title_id
+
+    def _resolve(self):
+        """
+        Resolve the chains of all redirects.
+
+        Each title is visited once: the path from a redirect is followed
+        until a title which is not a redirect, which was resolved before or
+        which is on the current path, i.e. part of a loop, and all titles on
+        the path are resolved on the way back.
+        """
+        count = len(self.targets)
+        lengths = array(_INT, [0]) * count
+        finals = array(_INT, range(count))
+        state = array(_BYTE, [_UNVISITED]) * count
+        targets = self.targets
+        for start in range(count):
+            if state[start] != _UNVISITED:
+                continue
+            path = []
+            title_id = start
+            while (state[title_id] == _UNVISITED
+                   and targets[title_id] != _NONE):
+                state[title_id] = _VISITING
+                path.append(title_id)
+                title_id = targets[title_id]
+            if state[title_id] == _VISITING:
+                # a loop; none of its titles has a final target
+                length, final = _NONE, _NONE
+                loop_start = path.index(title_id)
+                for member in path[loop_start:]:
+                    lengths[member], finals[member] = length, final
+                    state[member] = _RESOLVED
+                del path[loop_start:]
+            else:
+                length, final = lengths[title_id], finals[title_id]
+                state[title_id] = _RESOLVED
+            for member in reversed(path):
+                if length != _NONE:
+                    length += 1
+                lengths[member], finals[member] = length, final
+                state[member] = _RESOLVED
+        self._lengths, self._finals = lengths, finals
+
+    def chain(self, title_id):
+        """
+        Return the length and the final target of the chain of a title.
+
+        @param title_id: id of the first title of the chain
+        @type title_id: int
+        @return: the number of redirects followed and the id of the
+            title which is not a redirect, or (-1, -1) if the chain ends
+            in a loop; a title which is not a redirect returns
+            (0, title_id)
+        @rtype: tuple of int
+        """
+        if self._lengths is None:
+            self._resolve()
+        return self._lengths[title_id], self._finals[title_id]
+
+    def loops(self):
+        """
+        Yield the redirects ending in a loop.
+
+        @rtype: generator of int
+        """
+        for title_id in self.redirects():
+            if self.chain(title_id)[1] == _NONE:
+                yield title_id
@@ -15,6 +15,7 @@ from __future__ import absolute_import, division, unicode_literals
 import copy
 import datetime
 import functools
+import hashlib
 import heapq
 import itertools
 import json
@@ -30,7 +31,7 @@ try:
     from collections.abc import Iterable, Container, Mapping
 except ImportError:  # Python 2.7
     from collections import Iterable, Container, Mapping
-from collections import namedtuple
+from collections import deque, namedtuple, OrderedDict
 from warnings import warn
 
 import pywikibot
@@ -1416,8 +1417,15 @@ class Siteinfo(Container):
     requests don't need to query the server.
 
     All values of the siteinfo property 'general' are directly available.
+
+    Retrieved properties are also saved in a store in the API cache
+    directory which is shared by all processes. They are loaded from it
+    as long as they are not expired.
     """
 
+    # file name of the shared store in the API cache directory
+    store_filename = 'siteinfo.sqlite3'
+
     WARNING_REGEX = re.compile(r'Unrecognized values? for parameter '
                                r'["\']siprop["\']: (.+?)\.?$')
 
@@ -1514,6 +1522,81 @@ class Siteinfo(Container):
                         data[p] = False
 
     def _get_siteinfo(self, prop, expiry):
+        """
+        Retrieve siteinfo properties from the shared store or the server.
+
+        @param prop: The property names of the siteinfo.
+        @type prop: str or iterable
+        @param expiry: The expiry date of the cached request.
+        @type expiry: int (days), L{datetime.timedelta}, False (config)
+        @return: A dictionary with the properties of the site. Each entry in
+            the dictionary is a tuple of the value and a boolean to save if it
+            is the default value.
+        @rtype: dict (the values)
+        @see: L{_request_siteinfo}
+        """
+        if isinstance(prop, UnicodeType):
+            props = [prop]
+        else:
+            props = list(prop)
+        if len(props) == 0:
+            raise ValueError('At least one property name must be provided.')
+        result = self._load_stored(props, expiry)
+        missing = [prop for prop in props if prop not in result]
+        if missing:
+            requested = self._request_siteinfo(missing, expiry)
+            self._save_stored(requested)
+            result.update(requested)
+        return result
+
+    def _store_key(self, prop):
+        """Return the key of a property in the shared store."""
+        return hashlib.sha256(
+            '{0!r}:{1}'.format(self._site, prop).encode('utf-8')
+        ).hexdigest()
+
+    def _load_stored(self, props, expiry):
+        """
+        Load the properties from the shared store which are not expired.
+
+        @param props: The property names of the siteinfo.
+        @type props: list
+        @param expiry: The expiry date of the stored values.
+        @type expiry: int (days), L{datetime.timedelta}, False (config)
+        @rtype: dict
+        """
+        if expiry is False:
+            expiry = pywikibot.config.API_config_expiry
+        if isinstance(expiry, (int, float)):
+            expiry = datetime.timedelta(expiry)
+        result = {}
+        if not expiry:
+            return result
+        try:
+            store = api.CachedRequest._get_cache(self.store_filename)
+            for prop in props:
+                record = store.get(self._store_key(prop), touch=False)
+                if (record is not None
+                        and not Siteinfo._is_expired(record.data[1], expiry)):
+                    result[prop] = record.data
+        except Exception as e:
+            pywikibot.output('Could not load siteinfo store: %r' % e)
+        return result
+
+    def _save_stored(self, result):
+        """Save retrieved properties into the shared store."""
+        try:
+            store = api.CachedRequest._get_cache(self.store_filename)
+            for prop, value in result.items():
+                # default values are not stored as they are always expired
+                if isinstance(value[1], datetime.datetime):
+                    store.set(self._store_key(prop),
+                              '{0!r}:{1}'.format(self._site, prop),
+                              value, value[1])
+        except Exception as e:
+            pywikibot.output('Could not save siteinfo store: %r' % e)
+
+    def _request_siteinfo(self, props, expiry):
         """
         Retrieve a siteinfo property.
 
@@ -1522,8 +1605,8 @@ class Siteinfo(Container):
         returned when a property doesn't exists, it queries each property
         independetly if a property is invalid.
 
-        @param prop: The property names of the siteinfo.
-        @type prop: str or iterable
+        @param props: The property names of the siteinfo.
+        @type props: list
         @param expiry: The expiry date of the cached request.
         @type expiry: int (days), L{datetime.timedelta}, False (config)
         @return: A dictionary with the properties of the site. Each entry in
@@ -1542,12 +1625,6 @@ class Siteinfo(Container):
             else:
                 return False
 
-        if isinstance(prop, UnicodeType):
-            props = [prop]
-        else:
-            props = prop
-        if len(props) == 0:
-            raise ValueError('At least one property name must be provided.')
         invalid_properties = []
         request = self._site._request(
             expiry=pywikibot.config.API_config_expiry
@@ -1575,7 +1652,7 @@ class Siteinfo(Container):
                                       "', '".join(props)))
                     results = {}
                     for prop in props:
-                        results.update(self._get_siteinfo(prop, expiry))
+                        results.update(self._request_siteinfo([prop], expiry))
                     return results
             else:
                 raise
@@ -1653,6 +1730,29 @@ class Siteinfo(Container):
         """Return a siteinfo property, caching and not forcing it."""
         return self.get(key, False)  # caches and doesn't force it
 
+    def preload(self, props, expiry=False):
+        """
+        Load several siteinfo properties at once.
+
+        All properties which are neither cached nor stored in the shared
+        store, or which are expired, are retrieved with one request. Scripts
+        can use it to warm up the properties they need for each site.
+
+        @param props: The siteinfo property names, e.g. 'general',
+            'namespaces' or 'interwikimap'.
+        @type props: iterable of str
+        @param expiry: If the cache is older than the expiry it ignores the
+            cache and queries the server to get the newest value.
+        @type expiry: int/float (days), L{datetime.timedelta}, False (never)
+        """
+        if expiry is not False and isinstance(expiry, (int, float)):
+            expiry = datetime.timedelta(expiry)
+        props = [prop for prop in props
+                 if prop not in self._cache
+                 or Siteinfo._is_expired(self._cache[prop][1], expiry)]
+        if props:
+            self._cache.update(self._get_siteinfo(props, expiry))
+
     def get(self, key, get_default=True, cache=True, expiry=False):
         """
         Return a siteinfo property.
@@ -7677,6 +7777,253 @@ class ClosedSite(APISite):
         self._closed_error('No new images can be returned.')
 
 
+class EntityEditBatch(object):
+
+    """
+    Changes to Wikibase entities which are saved with one edit per entity.
+
+    While a batch is active on a DataSite, the DataSite methods changing
+    claims, references and qualifiers only change the local entities.
+    The changes of each entity are saved by L{commit} with one
+    wbeditentity request, which contains the difference of the entity to
+    its loaded content as returned by L{WikibasePage.toJSON}. Use it as a
+    context manager, which commits when it is left without an exception::
+
+        with repo.edit_batch(summary='Add population') as batch:
+            for item in items:
+                item.addClaim(claim)
+        revisions = batch.revisions
+
+    When an entity was changed by someone else in the meantime, it is
+    reloaded and the changed labels, descriptions, aliases, sitelinks and
+    claims are applied to the new content and saved again. The claims of
+    a reloaded entity are new Claim objects.
+    """
+
+    def __init__(self, repo, summary=None, bot=True, retries=3,
+                 callback=None):
+        """
+        Initializer.
+
+        @param repo: the Wikibase site of the entities
+        @type repo: DataSite
+        @param summary: the summary of all edits
+        @type summary: str
+        @param bot: whether to mark the edits as bot edits
+        @type bot: bool
+        @param retries: how often an entity is reloaded on edit conflicts
+        @type retries: int
+        @param callback: a callable object that is called after each entity
+            has been saved. It must take two arguments: (1) a WikibasePage
+            object, and (2) an exception instance, which will be None if the
+            entity was saved successfully. If it is not given, the first
+            exception is raised after all entities have been saved.
+        @type callback: callable
+        """
+        self.repo = repo
+        self.summary = summary
+        self.bot = bot
+        self.retries = retries
+        self.callback = callback
+        self.revisions = OrderedDict()
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Start collecting the changes of the DataSite."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop collecting changes and save them if there was no error."""
+        self.stop()
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def start(self):
+        """Start collecting the changes of the DataSite."""
+        if self.repo._edit_batch is not None:
+            raise pywikibot.Error('Another edit batch is active on {0}'
+                                  .format(self.repo))
+        self.repo._edit_batch = self
+
+    def stop(self):
+        """Stop collecting changes; changes are saved immediately again."""
+        if self.repo._edit_batch is self:
+            self.repo._edit_batch = None
+
+    def __len__(self):
+        """Return the number of changed entities."""
+        return len(self._pending)
+
+    def __contains__(self, entity):
+        """Return whether an entity has unsaved changes."""
+        return id(entity) in self._pending
+
+    def _record(self, entity):
+        """
+        Add an entity to the changed entities.
+
+        @return: a response like the one of the API
+        @rtype: dict
+        """
+        if not hasattr(entity, '_content') and entity._defined_by():
+            entity.get()
+        with self._lock:
+            self._pending.setdefault(id(entity), entity)
+        return {'pageinfo': {'lastrevid': getattr(entity, '_revid', None)}}
+
+    def add_claim(self, entity, claim):
+        """Add a claim to an entity locally."""
+        data = self._record(entity)
+        claim.snak = entity.getID() + '$' + str(uuid.uuid4())
+        entity.claims.setdefault(claim.getID(), []).append(claim)
+        return data
+
+    def change_claim(self, claim, snaktype=None):
+        """Record that a claim was changed locally."""
+        if claim.isReference or claim.isQualifier:
+            raise NotImplementedError
+        if not claim.snak:
+            raise NoPage(claim)
+        if snaktype is not None:
+            claim.setSnakType(snaktype)
+        data = self._record(claim.on_item)
+        data['claim'] = {'id': claim.snak}
+        return data
+
+    def change_snaks(self, claim):
+        """Record that references or qualifiers of a claim changed."""
+        data = self._record(claim.on_item)
+        # the hash of a new reference is only known after saving it
+        data['reference'] = {'hash': None}
+        return data
+
+    def remove_claims(self, claims):
+        """Remove claims from their entity locally."""
+        entities = {id(claim.on_item): claim.on_item for claim in claims}
+        assert len(entities) == 1
+        entity = claims[0].on_item
+        data = self._record(entity)
+        for claim in claims:
+            prop_claims = entity.claims.get(claim.getID(), [])
+            for index, prop_claim in enumerate(prop_claims):
+                if prop_claim is claim:
+                    del prop_claims[index]
+                    break
+        return data
+
+    def discard(self):
+        """Forget all changes which were not saved yet."""
+        with self._lock:
+            self._pending.clear()
+
+    def commit_entity(self, entity):
+        """
+        Save the changes of an entity now.
+
+        @param entity: the changed entity
+        @type entity: WikibasePage
+        @return: the latest revision id of the entity
+        @rtype: int
+        """
+        with self._lock:
+            self._pending.pop(id(entity), None)
+        self._save(entity)
+        self.revisions[entity.getID()] = entity.latest_revision_id
+        return entity.latest_revision_id
+
+    def commit(self):
+        """
+        Save the changes of each entity with one edit.
+
+        @return: the latest revision id of each saved entity by entity id
+        @rtype: OrderedDict
+        """
+        error = None
+        while self._pending:
+            with self._lock:
+                entity = self._pending.popitem(last=False)[1]
+            try:
+                self.commit_entity(entity)
+            except Exception as e:
+                if self.callback is None:
+                    error = error or e
+                else:
+                    self.callback(entity, e)
+            else:
+                if self.callback is not None:
+                    self.callback(entity, None)
+        if error is not None:
+            raise error
+        return self.revisions
+
+    def _save(self, entity):
+        """Save an entity, reapplying its changes on edit conflicts."""
+        for retry in range(self.retries + 1):
+            data = entity.toJSON(diffto=getattr(entity, '_content', None))
+            if not data:
+                return
+            try:
+                entity.editEntity(data, summary=self.summary, bot=self.bot)
+            except pywikibot.OtherPageSaveError as e:
+                if (not isinstance(e.reason, api.APIError)
+                        or e.reason.code != 'editconflict'
+                        or retry == self.retries):
+                    raise
+                pywikibot.warning('Edit conflict on {0}, reapplying the '
+                                  'changes'.format(entity.getID()))
+                self._reload(entity, data)
+            else:
+                return
+
+    def _reload(self, entity, data):
+        """Load the current content and reapply the changed parts."""
+        current = list(self.repo.loadcontent(
+            entity._defined_by()).values())[0]
+        content = copy.deepcopy(current)
+        for key in ('labels', 'descriptions'):
+            values = getattr(entity, key)
+            for lang in data.get(key, {}):
+                if lang in values:
+                    content.setdefault(key, {})[lang] = {
+                        'language': lang, 'value': values[lang]}
+                else:
+                    content.get(key, {}).pop(lang, None)
+        for lang in data.get('aliases', {}):
+            if entity.aliases.get(lang):
+                content.setdefault('aliases', {})[lang] = [
+                    {'language': lang, 'value': value}
+                    for value in entity.aliases[lang]]
+            else:
+                content.get('aliases', {}).pop(lang, None)
+        for dbname in data.get('sitelinks', {}):
+            if dbname in entity.sitelinks:
+                content.setdefault('sitelinks', {})[dbname] = \
+                    entity.sitelinks[dbname].toJSON()
+            else:
+                content.get('sitelinks', {}).pop(dbname, None)
+        claims = content.setdefault('claims', {})
+        for prop, prop_claims in data.get('claims', {}).items():
+            for claim in prop_claims:
+                old = claims.get(prop, [])
+                index = next((i for i, old_claim in enumerate(old)
+                              if old_claim.get('id') == claim['id']), None)
+                if 'remove' in claim:
+                    if index is not None:
+                        del old[index]
+                elif index is None:
+                    claims.setdefault(prop, []).append(claim)
+                else:
+                    old[index] = claim
+        entity._content = content
+        entity.get()
+        entity._content = current
+        entity.latest_revision_id = current['lastrevid']
+
+
 class DataSite(APISite):
 
     """Wikibase data capable site."""
@@ -7690,6 +8037,7 @@ class DataSite(APISite):
             'item': pywikibot.ItemPage,
             'property': pywikibot.PropertyPage,
         }
+        self._edit_batch = None
 
     def _cache_entity_namespaces(self):
         """Find namespaces for each known wikibase entity type."""
@@ -7977,6 +8325,173 @@ class DataSite(APISite):
         """DEPRECATED."""
         return self.preload_entities(pagelist, groupsize)
 
+    def _wbgetentities_limit(self):
+        """Return how many entities can be requested at a time."""
+        parameter = self._paraminfo.parameter('wbgetentities', 'ids')
+        if self.logged_in() and self.has_right('apihighlimits'):
+            return int(parameter['highlimit'])
+        return int(parameter['limit'])
+
+    def _entity_batches(self, pagelist, groupsize):
+        """
+        Yield the wbgetentities parameters identifying groups of entities.
+
+        Entities are identified by their ids, or by the title of a page
+        linked to them. The titles of a batch are always of the same site.
+        """
+        ids = []
+        titles = {}
+        for p in pagelist:
+            if isinstance(p, pywikibot.page.WikibasePage):
+                ident = p._defined_by()
+                if 'ids' in ident:
+                    ids.append(ident['ids'])
+                    group = ids
+                elif ident:
+                    dbname = ident['sites']
+                    group = titles.setdefault(dbname, [])
+                    group.append(ident['titles'])
+                else:
+                    continue
+            elif p.site == self and p.namespace() in (
+                    self.item_namespace, self.property_namespace):
+                ids.append(p.title(with_ns=False))
+                group = ids
+            else:
+                assert p.site.has_data_repository, \
+                    'Site must have a data repository'
+                dbname = p.site.dbName()
+                group = titles.setdefault(dbname, [])
+                group.append(p._link._text)
+            if len(group) >= groupsize:
+                if group is ids:
+                    yield {'ids': ids}
+                    ids = []
+                else:
+                    yield {'sites': dbname, 'titles': titles.pop(dbname)}
+        if ids:
+            yield {'ids': ids}
+        for dbname, group in titles.items():
+            yield {'sites': dbname, 'titles': group}
+
+    def _entities_from_data(self, data, properties, batch):
+        """
+        Yield the entities of a wbgetentities response.
+
+        The entities are yielded in the order of the ids or titles of the
+        request. Entities found by title whose sitelink was not retrieved
+        are yielded last.
+        """
+        if 'success' not in data:
+            raise api.APIError(data['errors'])
+        entities = data['entities']
+        if 'ids' in batch:
+            order = {entity_id.upper(): i
+                     for i, entity_id in enumerate(batch['ids'])}
+
+            def position(entity_id):
+                return order.get(entity_id.upper(), len(order))
+        else:
+            order = {title: i for i, title in enumerate(batch['titles'])}
+
+            def position(entity_id):
+                sitelink = entities[entity_id].get(
+                    'sitelinks', {}).get(batch['sites'], {})
+                return order.get(sitelink.get('title'), len(order))
+
+        for entity_id in sorted(entities, key=position):
+            content = entities[entity_id]
+            if 'missing' in content:
+                continue
+            if properties is not None and 'claims' in content:
+                content['claims'] = {
+                    prop: claims for prop, claims in content['claims'].items()
+                    if prop in properties}
+            page = self._type_to_class[content['type']](self, entity_id)
+            # No api call is made because page._content is given
+            page._content = content
+            try:
+                page.get()  # cannot provide get_redirect=True (T145971)
+            except pywikibot.IsRedirectPage:
+                pass
+            yield page
+
+    def load_entities(self, pagelist, props=None, languages=None,
+                      properties=None, sitefilter=None, groupsize=None,
+                      parallel=4):
+        """
+        Yield subclasses of WikibasePage with the requested content loaded.
+
+        Unlike L{preload_entities}, the number of entities requested at a
+        time is the maximum allowed for the user, which is higher for bots,
+        and only the requested parts of each entity are retrieved. Several
+        requests are made at the same time; each of them is throttled.
+
+        Entities which have only partial content can still be edited; the
+        changes are computed against the retrieved content, so parts which
+        were not retrieved are left unchanged.
+
+        The entities of each request are yielded in the order of the
+        requested ids or titles and the requests in the order they are
+        made, so entities given by id keep the order of the pages. Missing
+        entities are skipped.
+
+        @param pagelist: an iterable that yields either WikibasePage objects,
+            or Page objects linked to an ItemPage.
+        @param props: the parts of each entity to retrieve, a subset of
+            'info', 'sitelinks', 'sitelinks/urls', 'aliases', 'labels',
+            'descriptions', 'claims' and 'datatype'; 'info' is always
+            included. All parts are retrieved if None.
+        @type props: iterable of str
+        @param languages: only retrieve labels, descriptions and aliases in
+            these languages
+        @type languages: iterable of str
+        @param properties: only keep the claims of these property ids; the
+            API returns all claims, so this saves memory but not bandwidth.
+            Claims are retrieved even if they are not in props.
+        @type properties: iterable of str
+        @param sitefilter: only retrieve the sitelinks of these site ids,
+            like 'enwiki'
+        @type sitefilter: iterable of str
+        @param groupsize: how many entities to request at a time, at most
+            the maximum allowed
+        @type groupsize: int
+        @param parallel: how many requests are made at the same time
+        @type parallel: int
+        @rtype: generator of WikibasePage
+        """
+        params = {'action': 'wbgetentities'}
+        if props is not None:
+            props = set(props) | {'info'}
+            if properties is not None:
+                props.add('claims')
+            params['props'] = sorted(props)
+        if languages is not None:
+            params['languages'] = list(languages)
+        if sitefilter is not None:
+            params['sitefilter'] = list(sitefilter)
+        if properties is not None:
+            properties = {prop.upper() for prop in properties}
+
+        limit = self._wbgetentities_limit()
+        groupsize = min(groupsize, limit) if groupsize else limit
+        requests = deque()
+        for batch in self._entity_batches(pagelist, groupsize):
+            parameters = dict(batch)
+            parameters.update(params)
+            request = api.AsyncRequest(site=self, parameters=parameters)
+            requests.append((request.start(), batch))
+            if len(requests) >= parallel:
+                request, batch = requests.popleft()
+                for page in self._entities_from_data(
+                        request.result(), properties, batch):
+                    yield page
+        while requests:
+            request, batch = requests.popleft()
+            for page in self._entities_from_data(
+                    request.result(), properties, batch):
+                yield page
+
     def getPropertyType(self, prop):
         """
         Obtain the type of a property.
@@ -8000,6 +8515,16 @@ class DataSite(APISite):
 
         return dtype
 
+    def edit_batch(self, **kwargs):
+        """
+        Return a batch saving the changes of each entity with one edit.
+
+        See L{EntityEditBatch} for the parameters.
+
+        @rtype: EntityEditBatch
+        """
+        return EntityEditBatch(self, **kwargs)
+
     @deprecated_args(identification='entity')
     @must_be(group='user')
     def editEntity(self, entity, data, bot=True, **kwargs):
@@ -8069,6 +8594,8 @@ class DataSite(APISite):
         @param summary: Edit summary
         @type summary: str
         """
+        if self._edit_batch is not None:
+            return self._edit_batch.add_claim(entity, claim)
         claim.snak = entity.getID() + '$' + str(uuid.uuid4())
         params = {'action': 'wbsetclaim',
                   'claim': json.dumps(claim.toJSON()),
@@ -8101,6 +8628,8 @@ class DataSite(APISite):
         @param summary: Edit summary
         @type summary: str
         """
+        if self._edit_batch is not None:
+            return self._edit_batch.change_claim(claim, snaktype)
         if claim.isReference or claim.isQualifier:
             raise NotImplementedError
         if not claim.snak:
@@ -8130,6 +8659,8 @@ class DataSite(APISite):
         @param summary: Edit summary
         @type summary: str
         """
+        if self._edit_batch is not None:
+            return self._edit_batch.change_claim(claim)
         if claim.isReference or claim.isQualifier:
             raise NotImplementedError
         if not claim.snak:
@@ -8170,6 +8701,8 @@ class DataSite(APISite):
         """
         if claim.isReference or claim.isQualifier:
             raise ValueError('The claim cannot have a source.')
+        if self._edit_batch is not None:
+            return self._edit_batch.change_snaks(claim)
         params = {'action': 'wbsetreference', 'statement': claim.snak,
                   'baserevid': self._get_baserevid(claim, baserevid),
                   'summary': summary, 'bot': bot, 'token': self.tokens['edit']}
@@ -8223,6 +8756,8 @@ class DataSite(APISite):
         """
         if claim.isReference or claim.isQualifier:
             raise ValueError('The claim cannot have a qualifier.')
+        if self._edit_batch is not None:
+            return self._edit_batch.change_snaks(claim)
         params = {'action': 'wbsetqualifier', 'claim': claim.snak,
                   'baserevid': self._get_baserevid(claim, baserevid),
                   'summary': summary, 'bot': bot}
@@ -8256,6 +8791,8 @@ class DataSite(APISite):
             When omitted, revision of claim.on_item is used. DEPRECATED.
         @type baserevid: long
         """
+        if self._edit_batch is not None:
+            return self._edit_batch.remove_claims(claims)
         # Check on_item vs baserevid for all additional claims
         for claim in claims:
             baserevid = self._get_baserevid(claim, baserevid)
@@ -8293,6 +8830,8 @@ class DataSite(APISite):
             When omitted, revision of claim.on_item is used. DEPRECATED.
         @type baserevid: long
         """
+        if self._edit_batch is not None:
+            return self._edit_batch.change_snaks(claim)
         params = {
             'action': 'wbremovereferences',
             'baserevid': self._get_baserevid(claim, baserevid),
@@ -8324,6 +8863,8 @@ class DataSite(APISite):
             When omitted, revision of claim.on_item is used. DEPRECATED.
         @type baserevid: long
         """
+        if self._edit_batch is not None:
+            return self._edit_batch.change_snaks(claim)
         params = {
             'action': 'wbremovequalifiers',
             'claim': claim.snak,
@@ -20,6 +20,9 @@ except ImportError:  # Python 2.7
     from collections import Sequence
 import datetime
 import re
+import threading
+
+from bisect import bisect_left
 
 import pywikibot
 from pywikibot import config2 as config
@@ -50,6 +53,22 @@ except ImportError as e:
 # cache for replaceExcept to avoid recompile or regexes each call
 _regex_cache = {}
 
+# compiled exception sets of replaceExcept per exceptions and site
+_exception_cache = {}
+_exception_cache_size = 256
+
+# combined regexes of removeDisabledParts per exception regexes
+_disabled_regex_cache = {}
+
+# parsed texts, see _tokens
+_tokens_cache = OrderedDict()
+_tokens_cache_size = 16
+_tokens_lock = threading.Lock()
+
+# regexes of _regex_cache which need a site
+_site_regexes = frozenset(('category', 'file', 'interwiki', 'invoke',
+                           'property'))
+
 # This regex is only for use by extract_templates_and_params_regex.
 # It does not support template variables consisting of nested templates,
 # system variables like {{CURRENTYEAR}}, or template variables like {{{1}}}.
@@ -256,6 +275,7 @@ def _tag_regex(tag_name):
 
 def _create_default_regexes():
     """Fill (and possibly overwrite) _regex_cache with default regexes."""
+    _exception_cache.clear()
     _regex_cache.update({
         # categories
         'category': (r'\[\[ *(?:%s)\s*:.*?\]\]',
@@ -351,6 +371,73 @@ def _get_regexes(keys, site):
     return result
 
 
+def _get_exception_regexes(exceptions, site):
+    """
+    Fetch the compiled regexes of an exception set.
+
+    The regexes are cached per exceptions and site, so the keys are only
+    resolved the first time an exception set is used with a site.
+
+    @rtype: tuple
+    """
+    if site is None and any(exc in _site_regexes for exc in exceptions
+                            if isinstance(exc, UnicodeType)):
+        # the default site may change between calls
+        return tuple(_get_regexes(exceptions, site))
+    try:
+        key = (tuple(exceptions), site)
+        regexes = _exception_cache.get(key)
+    except TypeError:  # unhashable exceptions
+        return tuple(_get_regexes(exceptions, site))
+    if regexes is None:
+        if len(_exception_cache) >= _exception_cache_size:
+            _exception_cache.clear()
+        regexes = _exception_cache[key] = tuple(
+            _get_regexes(exceptions, site))
+    return regexes
+
+
+class _ExceptionFinder(object):
+
+    """
+    Find the exceptions of replaceExcept in a text.
+
+    The first match of each regex at or after a position is remembered
+    until the text changes, so skipping an exception or a match only
+    searches again with the regexes whose match was passed. The result is
+    the same as searching with every regex from each position.
+    """
+
+    def __init__(self, regexes):
+        """Initializer."""
+        self.regexes = regexes
+        self.text = None
+        self._matches = []
+
+    def next(self, text, index):
+        """
+        Return the first exception match starting at or after index.
+
+        If several exceptions start at the same position, the first of
+        the exceptions wins.
+
+        @rtype: re match object or None
+        """
+        if text is not self.text:
+            self.text = text
+            self._matches = [(len(text) + 1, None)] * len(self.regexes)
+        nearest = None
+        for i, regex in enumerate(self.regexes):
+            pos, match = self._matches[i]
+            if pos > index or match is not None and match.start() < index:
+                match = regex.search(text, index)
+                self._matches[i] = (index, match)
+            if match is not None and (nearest is None
+                                      or match.start() < nearest.start()):
+                nearest = match
+        return nearest
+
+
 def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                   allowoverlap=False, marker='', site=None, count=0):
     """
@@ -384,10 +471,11 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
             old = re.compile(old)
 
     # early termination if not relevant
-    if not old.search(text):
+    match = old.search(text)
+    if not match:
         return text + marker
 
-    dontTouchRegexes = _get_regexes(exceptions, site)
+    finder = _ExceptionFinder(_get_exception_regexes(exceptions, site))
 
     index = 0
     replaced = 0
@@ -395,19 +483,15 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
     while not count or replaced < count:
         if index > len(text):
             break
-        match = old.search(text, index)
+        # a match after a skipped exception is still the next one
+        if match is None or match.start() < index:
+            match = old.search(text, index)
         if not match:
             # nothing left to replace
             break
 
         # check which exception will occur next.
-        nextExceptionMatch = None
-        for dontTouchR in dontTouchRegexes:
-            excMatch = dontTouchR.search(text, index)
-            if excMatch and (
-                    nextExceptionMatch is None
-                    or excMatch.start() < nextExceptionMatch.start()):
-                nextExceptionMatch = excMatch
+        nextExceptionMatch = finder.next(text, index)
 
         if nextExceptionMatch is not None \
                 and nextExceptionMatch.start() <= match.start():
@@ -464,10 +548,159 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                 index += 1
             markerpos = match.start() + len(replacement)
             replaced += 1
+            match = None
     text = text[:markerpos] + marker + text[markerpos:]
     return text
 
 
+def _disabled_regex(tags, site):
+    """Return the regex matching any of the disabled parts."""
+    try:
+        tags = tuple(sorted(tags))
+    except TypeError:
+        tags = tuple(tags)
+    regexes = _get_exception_regexes(tags, site)
+    regex = _disabled_regex_cache.get(regexes)
+    if regex is None:
+        if len(_disabled_regex_cache) >= _exception_cache_size:
+            _disabled_regex_cache.clear()
+        regex = _disabled_regex_cache[regexes] = re.compile(
+            '|'.join(x.pattern for x in regexes), re.IGNORECASE | re.DOTALL)
+    return regex
+
+
+class _Tokens(object):
+
+    """
+    Parts of a wikitext shared by the functions of this module.
+
+    A text is parsed into disabled parts, headings and the matches of
+    other regexes only once, when a function first needs them. Use
+    L{_tokens} to get the instance of a text, which is kept as long as the
+    same text object is used.
+    """
+
+    def __init__(self, text):
+        """Initializer."""
+        self.text = text
+        self._spans = {}
+        self._stripped = {}
+        self._matches = {}
+        self._headings = {}
+
+    def disabled(self, regex):
+        """
+        Return the disabled parts found by a regex of L{_disabled_regex}.
+
+        @return: the starts and the ends of the disabled parts
+        @rtype: tuple of lists
+        """
+        spans = self._spans.get(regex)
+        if spans is None:
+            starts, ends = [], []
+            for match in regex.finditer(self.text):
+                starts.append(match.start())
+                ends.append(match.end())
+            spans = self._spans[regex] = (starts, ends)
+        return spans
+
+    def stripped(self, regex):
+        """Return the text without the disabled parts of a regex."""
+        text = self._stripped.get(regex)
+        if text is None:
+            starts, ends = self.disabled(regex)
+            parts = []
+            last = 0
+            for start, end in zip(starts, ends):
+                parts.append(self.text[last:start])
+                last = end
+            parts.append(self.text[last:])
+            text = self._stripped[regex] = ''.join(parts)
+        return text
+
+    def is_disabled(self, regex, index):
+        """
+        Return whether index is within a disabled part of a regex.
+
+        The result is the same as of removing the disabled parts from the
+        text with a marker inserted at index, so a position within tags or
+        comment delimiters is not disabled unless the part still ends at a
+        later delimiter.
+        """
+        starts, ends = self.disabled(regex)
+        i = bisect_left(starts, index) - 1
+        if i < 0 or ends[i] <= index:
+            return False
+        # the parts before are the same after inserting the marker
+        marker = findmarker(self.text)
+        text = self.text[:index] + marker + self.text[index:]
+        for match in regex.finditer(text, starts[i]):
+            if match.start() > index:
+                break
+            if match.end() >= index + len(marker):
+                return True
+        return False
+
+    def matches(self, regex):
+        """Return all matches of a regex in the text."""
+        matches = self._matches.get(regex)
+        if matches is None:
+            matches = self._matches[regex] = (
+                list(regex.finditer(self.text)), [])
+            matches[1].extend(match.start() for match in matches[0])
+        return matches[0]
+
+    def search(self, regex, pos=0):
+        """
+        Return the first match of a regex at or after pos.
+
+        The result is the same as of regex.search(text, pos).
+        """
+        matches = self.matches(regex)
+        i = bisect_left(self._matches[regex][1], pos)
+        if i and (matches[i - 1].end() > pos
+                  or matches[i - 1].start() == matches[i - 1].end()):
+            # the previous match overlaps pos or is empty
+            return regex.search(self.text, pos)
+        return matches[i] if i < len(matches) else None
+
+    def headings(self, site):
+        """Return the headings which are not disabled."""
+        headings = self._headings.get(site)
+        if headings is None:
+            heading_regex = _get_regexes(['header'], site)[0]
+            disabled = _disabled_regex(_default_disabled, None)
+            headings = self._headings[site] = [
+                _Heading(match.group(), match.start(), match.end())
+                for match in heading_regex.finditer(self.text)
+                if not self.is_disabled(disabled, match.start())
+                and not self.is_disabled(disabled, match.end())]
+        return headings
+
+
+def _tokens(text):
+    """
+    Return the tokens of a text.
+
+    The tokens of the most recently used texts are kept, so the
+    functions of this module parse a text passed to several of them only
+    once. They are keyed by the identity of the text.
+
+    @rtype: _Tokens
+    """
+    with _tokens_lock:
+        tokens = _tokens_cache.pop(id(text), None)
+        if tokens is None or tokens.text is not text:
+            tokens = _Tokens(text)
+        _tokens_cache[id(text)] = tokens
+        if len(_tokens_cache) > _tokens_cache_size:
+            _tokens_cache.popitem(last=False)
+    return tokens
+
+
+_default_disabled = ('comment', 'includeonly', 'nowiki', 'pre', 'source')
+
+
 def removeDisabledParts(text, tags=None, include=[], site=None):
     """
     Return text without portions where wiki markup is disabled.
@@ -495,12 +728,9 @@ def removeDisabledParts(text, tags=None, include=[], site=None):
     @rtype: str
     """
     if not tags:
-        tags = ('comment', 'includeonly', 'nowiki', 'pre', 'source')
+        tags = _default_disabled
     tags = set(tags) - set(include)
-    regexes = _get_regexes(tags, site)
-    toRemoveR = re.compile('|'.join(x.pattern for x in regexes),
-                           re.IGNORECASE | re.DOTALL)
-    return toRemoveR.sub('', text)
+    return _tokens(text).stripped(_disabled_regex(tags, site))
 
 
 def removeHTMLParts(text, keeptags=['tt', 'nowiki', 'small', 'sup']):
@@ -547,11 +777,8 @@ def isDisabled(text, index, tags=None):
 
     For the tags parameter, see L{removeDisabledParts}.
     """
-    # Find a marker that is not already in the text.
-    marker = findmarker(text)
-    text = text[:index] + marker + text[index:]
-    text = removeDisabledParts(text, tags)
-    return (marker not in text)
+    return _tokens(text).is_disabled(
+        _disabled_regex(tags or _default_disabled, None), index)
 
 
 def findmarker(text, startwith='@@', append=None):
@@ -701,10 +928,14 @@ def replace_links(text, replace, site=None):
         r'(?P<linktrail>%s)' % linktrail)
     extended_label_pattern = re.compile(r'(.*?\]\])({0})'.format(linktrail))
     linktrail = re.compile(linktrail)
+    tokens = _tokens(text)
     curpos = 0
     # This loop will run until we have finished the current page
     while True:
-        m = link_pattern.search(text, pos=curpos)
+        if text is tokens.text:
+            m = tokens.search(link_pattern, curpos)
+        else:
+            m = link_pattern.search(text, pos=curpos)
         if not m:
             break
         # Ignore links to sections of the same page
@@ -847,13 +1078,7 @@ _Section = namedtuple('_Section', ('title', 'content'))
 
 def _extract_headings(text, site):
     """Return _Heading objects."""
-    headings = []
-    heading_regex = _get_regexes(['header'], site)[0]
-    for match in heading_regex.finditer(text):
-        start, end = match.span()
-        if not isDisabled(text, start) and not isDisabled(text, end):
-            headings.append(_Heading(match.group(), start, end))
-    return headings
+    return list(_tokens(text).headings(site))
 
 
 def _extract_sections(text, headings):
@@ -981,7 +1206,8 @@ def getLanguageLinks(text, insite=None, template_subpage=False):
     # TODO: There is no semantic difference between hyphens and
     #       underscores -> fold them.
     interwikiR = re.compile(r'\[\[([a-zA-Z\-]+)\s?:([^\[\]\n]*)\]\]')
-    for lang, pagetitle in interwikiR.findall(text):
+    for match in _tokens(text).matches(interwikiR):
+        lang, pagetitle = match.groups()
         lang = lang.lower()
         # Check if it really is in fact an interwiki link to a known
         # language, or if it's e.g. a category tag or an internal link
@@ -1281,7 +1507,7 @@ def getCategoryLinks(text, site=None, include=[], expand_text=False):
     catNamespace = '|'.join(site.namespaces.CATEGORY)
     R = re.compile(r'\[\[\s*(?P<namespace>%s)\s*:\s*(?P<rest>.+?)\]\]'
                    % catNamespace, re.I)
-    for match in R.finditer(text):
+    for match in _tokens(text).matches(R):
         if expand_text and '{{' in match.group('rest'):
             rest = site.expand_text(match.group('rest'))
         else:
@@ -1660,6 +1886,8 @@ def extract_templates_and_params(text, remove_disabled_parts=None, strip=None):
 
     if use_mwparserfromhell:
         return extract_templates_and_params_mwpfh(text, strip)
+    elif config.template_params_parser == 'stack':
+        return extract_templates_and_params_stack(text, strip)
     else:
         return extract_templates_and_params_regex(text, False, strip)
 
@@ -1858,6 +2086,137 @@ def extract_templates_and_params_regex(text, remove_disabled_parts=True,
     return result
 
 
+# Tokens of extract_templates_and_params_stack: brace runs, links,
+# separators and parts whose content is not parsed. Outside of templates
+# only the start of a template needs to be found.
+_STACK_SKIPPED = (r'<!--[\s\S]*?(?:-->|\Z)'
+                  r'|<(?P<tag>nowiki|pre|math|source|syntaxhighlight)\b'
+                  r'[^>]*?(?:/>|>[\s\S]*?(?:</(?P=tag)\s*>|\Z))')
+# The lookahead lets the regex engine skip other characters quickly.
+_STACK_TOKEN_REGEX = re.compile(
+    r'(?=[{}\[\]|=<])(?:(?P<open>\{\{+)|(?P<close>\}\}+)|(?P<link>\[\[)'
+    r'|(?P<unlink>\]\])|(?P<sep>[|=])|' + _STACK_SKIPPED + ')',
+    re.IGNORECASE)
+_STACK_START_REGEX = re.compile(
+    r'(?=[{<])(?:(?P<open>\{\{+)|' + _STACK_SKIPPED + ')', re.IGNORECASE)
+
+
+class _StackElement(object):
+
+    """Open brace run or link of extract_templates_and_params_stack."""
+
+    __slots__ = ('start', 'end', 'count', 'separators')
+
+    def __init__(self, start, end, count):
+        """Initializer."""
+        self.start = start
+        self.end = end
+        self.count = count  # number of open braces, 0 for links
+        self.separators = []
+
+
+def _stack_template(text, start, end, separators, strip):
+    """Return the name and the parameters of a template."""
+    params = OrderedDict()
+    pipes = [pos for pos, char in separators if char == '|']
+    name = text[start:pipes[0] if pipes else end].strip()
+    numbered_param = 1
+    equals = {}
+    for pos, char in separators:
+        if char == '|':
+            last_pipe = pos
+        elif pipes and pos > pipes[0] and last_pipe not in equals:
+            equals[last_pipe] = pos
+    for i, pipe in enumerate(pipes):
+        param_end = pipes[i + 1] if i + 1 < len(pipes) else end
+        if pipe in equals:
+            param_name = text[pipe + 1:equals[pipe]]
+            param_val = text[equals[pipe] + 1:param_end]
+            if strip:
+                param_name = param_name.strip()
+                param_val = param_val.strip()
+        else:
+            param_name = UnicodeType(numbered_param)
+            param_val = text[pipe + 1:param_end]
+            numbered_param += 1
+        params[param_name] = param_val
+    return name, params
+
+
+def extract_templates_and_params_stack(text, strip=False):
+    """
+    Extract templates with params using a stack based scanner.
+
+    This function should not be called directly.
+
+    Use extract_templates_and_params, which will select this
+    implementation if mwparserfromhell is not used and
+    config.template_params_parser is 'stack'.
+
+    The text is scanned once and braces are matched like the MediaWiki
+    preprocessor does, so the time is linear in the length of the text.
+    The templates are returned in the order of their start, i.e. the same
+    order as mwparserfromhell, and the parameters are split like
+    mwparserfromhell splits them. Template parameters like {{{1}}} are
+    not returned, but templates inside them are.
+
+    @param text: The wikitext from which templates are extracted
+    @type text: str
+    @param strip: if enabled, strip arguments and values of templates
+    @type strip: bool
+    @return: list of template name and params
+    @rtype: list of tuple
+    """
+    found = []
+    stack = []
+    pos = 0
+    while True:
+        regex = _STACK_TOKEN_REGEX if stack else _STACK_START_REGEX
+        match = regex.search(text, pos)
+        if match is None:
+            break
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'open':
+            stack.append(_StackElement(match.start(), match.end(),
+                                       len(match.group())))
+        elif kind == 'link':
+            stack.append(_StackElement(match.start(), match.end(), 0))
+        elif kind == 'unlink':
+            if stack and not stack[-1].count:
+                # separators within a link do not split the parameters
+                stack.pop()
+        elif kind == 'sep':
+            if stack:
+                stack[-1].separators.append((match.start(), match.group()))
+        elif kind == 'close':
+            remaining = len(match.group())
+            end = match.start()
+            while remaining >= 2 and stack:
+                # unclosed links within braces are text
+                while stack and not stack[-1].count:
+                    link = stack.pop()
+                    if stack:
+                        stack[-1].separators.extend(link.separators)
+                if not stack:
+                    break
+                element = stack[-1]
+                count = 3 if element.count >= 3 and remaining >= 3 else 2
+                start = element.end - count
+                if count == 2:
+                    found.append((start, _stack_template(
+                        text, element.end, end, element.separators, strip)))
+                remaining -= count
+                end += count
+                element.count -= count
+                element.end = start
+                element.separators = []
+                if element.count < 2:
+                    stack.pop()
+    found.sort(key=lambda item: item[0])
+    return [template for start, template in found if template[0]]
+
+
 def extract_templates_and_params_regex_simple(text):
     """
     Extract top-level templates with params using only a simple regex.
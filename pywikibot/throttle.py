@@ -8,29 +8,346 @@
 from __future__ import absolute_import, division, unicode_literals
 
 import math
+import sqlite3
 import threading
 import time
 
+from contextlib import contextmanager
+
 import pywikibot
 from pywikibot import config
 from pywikibot.tools import deprecated
 
 _logger = 'wiki.throttle'
 
-# global process identifier
-#
-# When the first Throttle is instantiated, it will set this variable to a
-# positive integer, which will apply to all throttle objects created by this
-# process.
-pid = False
+# TokenStore instances keyed by their path
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _refill(tokens, updated, now, rate, capacity):
+    """Return the tokens of a bucket after refilling it until now."""
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class LocalTokenStore(object):
+
+    """Token buckets which are only used by this process."""
+
+    def __init__(self):
+        """Initializer."""
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, now, rate, capacity):
+        """Return the refilled state of a bucket; the lock must be held."""
+        tokens, updated, blocked = self._buckets.get(key, (capacity, now, 0))
+        if rate:
+            tokens = _refill(tokens, updated, now, rate, capacity)
+        else:
+            tokens = capacity
+        return tokens, blocked
+
+    def reserve(self, key, cost, rate, capacity):
+        """
+        Take tokens from a bucket and return how long to wait for them.
+
+        The tokens are taken immediately, even when the bucket does not
+        contain enough of them. The returned time is needed to refill the
+        missing tokens, or until the bucket is no longer blocked.
+
+        @param key: name of the bucket
+        @type key: str
+        @param cost: number of tokens to take
+        @type cost: float
+        @param rate: tokens added per second; 0 means unlimited
+        @type rate: float
+        @param capacity: maximum number of tokens in the bucket
+        @type capacity: float
+        @return: seconds to wait
+        @rtype: float
+        """
+        with self._lock:
+            now = time.time()
+            tokens, blocked = self._bucket(key, now, rate, capacity)
+            if rate:
+                tokens -= cost
+                self._buckets[key] = (tokens, now, blocked)
+        wait = -tokens / rate if rate and tokens < 0 else 0.0
+        return max(wait, blocked - now)
+
+    def block(self, key, until, capacity):
+        """Block a bucket until the given time; it can only be extended."""
+        with self._lock:
+            now = time.time()
+            tokens, updated, blocked = self._buckets.get(key,
+                                                         (capacity, now, 0))
+            self._buckets[key] = (tokens, updated, max(blocked, until))
+
+    def state(self, key, rate, capacity):
+        """
+        Return the current tokens of a bucket and until when it is blocked.
+
+        @rtype: tuple of float
+        """
+        with self._lock:
+            return self._bucket(key, time.time(), rate, capacity)
+
+    def close(self):
+        """Nothing to close."""
+
+
+class TokenStore(object):
+
+    """
+    Token buckets shared by all processes through a SQLite database.
+
+    Each reservation is a single short transaction which reads and
+    updates the bucket, so no process needs to know about the others.
+    """
+
+    filename = 'throttle.sqlite3'
+
+    def __init__(self, path, timeout=30):
+        """
+        Initializer.
+
+        @param path: path of the database file
+        @type path: str
+        @param timeout: seconds to wait for a lock held by another process
+        @type timeout: float
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return the connection of the current thread."""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.DatabaseError:
+                pass
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets ('
+                         'key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                         'updated REAL NOT NULL, blocked REAL NOT NULL)')
+            self._local.connection = conn
+        return conn
+
+    def _update(self, key, func):
+        """Update a bucket within one transaction and return the result."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated, blocked '
+                               'FROM buckets WHERE key = ?',
+                               (key, )).fetchone()
+            now = time.time()
+            row, result = func(row, now)
+            conn.execute('INSERT OR REPLACE INTO buckets '
+                         '(key, tokens, updated, blocked) '
+                         'VALUES (?, ?, ?, ?)', (key, ) + row)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def reserve(self, key, cost, rate, capacity):
+        """
+        Take tokens from a bucket and return how long to wait for them.
+
+        @see: L{LocalTokenStore.reserve}
+        """
+        def take(row, now):
+            tokens, updated, blocked = row or (capacity, now, 0)
+            tokens = _refill(tokens, updated, now, rate, capacity) - cost
+            wait = -tokens / rate if tokens < 0 else 0.0
+            return (tokens, now, blocked), max(wait, blocked - now)
+
+        if not rate:
+            # unlimited; only the time the bucket is blocked matters
+            return max(0.0, self.state(key, rate, capacity)[1] - time.time())
+        return self._update(key, take)
+
+    def block(self, key, until, capacity):
+        """Block a bucket until the given time; it can only be extended."""
+        def extend(row, now):
+            tokens, updated, blocked = row or (capacity, now, 0)
+            return (tokens, updated, max(blocked, until)), None
+
+        self._update(key, extend)
+
+    def state(self, key, rate, capacity):
+        """
+        Return the current tokens of a bucket and until when it is blocked.
+
+        @rtype: tuple of float
+        """
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT tokens, updated, blocked FROM buckets WHERE key = ?',
+            (key, )).fetchone()
+        tokens, updated, blocked = row or (capacity, now, 0)
+        if rate:
+            tokens = _refill(tokens, updated, now, rate, capacity)
+        else:
+            tokens = capacity
+        return tokens, blocked
+
+    def close(self):
+        """Close the connection of the current thread."""
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+
+def get_token_store(path=None):
+    """
+    Return the shared token store, opening it once per process.
+
+    @param path: path of the database file; defaults to
+        L{TokenStore.filename} in the data directory
+    @type path: str
+    @rtype: TokenStore
+    """
+    if path is None:
+        path = config.datafilepath(TokenStore.filename)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = TokenStore(path)
+        return _stores[path]
+
+
+class LagScheduler(object):
+
+    """
+    Adapt the request rate of a site to its load.
+
+    It keeps moving estimates of the replication lag, reported by maxlag
+    errors, and of the response time of the server. Their ratio to
+    config.maxlag and config.slow_response_time respectively is the
+    pressure on the server, which lowers the number of parallel reads
+    and lengthens the delays ahead of the next maxlag error.
+
+    The lag estimate decays with the given half-life as no new lag is
+    reported while requests succeed.
+    """
+
+    def __init__(self, concurrency=None, halflife=60, alpha=0.3):
+        """
+        Initializer.
+
+        @param concurrency: maximum number of parallel reads; defaults to
+            config.max_http_threads
+        @type concurrency: int
+        @param halflife: seconds in which the lag estimate halves
+        @type halflife: float
+        @param alpha: weight of a new value in the moving estimates
+        @type alpha: float
+        """
+        self.max_concurrency = concurrency or config.max_http_threads
+        self.halflife = halflife
+        self.alpha = alpha
+        self.response_time = 0.0
+        self._lag = 0.0
+        self._lag_time = time.time()
+        self.active = 0
+        self._condition = threading.Condition()
+
+    @property
+    def lag(self):
+        """Return the current lag estimate in seconds."""
+        elapsed = time.time() - self._lag_time
+        return self._lag * 0.5 ** (elapsed / self.halflife)
+
+    def record_lag(self, lag):
+        """Update the lag estimate with a reported lag in seconds."""
+        with self._condition:
+            current = self.lag
+            self._lag = current + self.alpha * (lag - current)
+            self._lag_time = time.time()
+
+    def record_response(self, seconds):
+        """Update the response time estimate with a request duration."""
+        with self._condition:
+            self.response_time += self.alpha * (seconds - self.response_time)
+            self._condition.notify_all()
+
+    @property
+    def pressure(self):
+        """
+        Return the load of the server between 0 (none) and 1 (overloaded).
+
+        Responses are considered slow from config.slow_response_time on and
+        the pressure is at its maximum at twice that time.
+
+        @rtype: float
+        """
+        pressure = 0.0
+        if config.maxlag:
+            pressure = self.lag / config.maxlag
+        if config.slow_response_time:
+            pressure = max(pressure, self.response_time
+                           / config.slow_response_time - 1)
+        return min(1.0, max(0.0, pressure))
+
+    @property
+    def concurrency(self):
+        """Return the number of reads which may run in parallel."""
+        return max(1, int(round(self.max_concurrency
+                                * (1 - self.pressure))))
+
+    @property
+    def delay_factor(self):
+        """Return the factor for the nominal delays, up to 4."""
+        return 1 + 3 * self.pressure
+
+    @contextmanager
+    def slot(self, write=False):
+        """
+        Context of a single request to the server.
+
+        A read waits until fewer reads than the current concurrency are
+        running. The duration of every request updates the response time
+        estimate.
+        """
+        if not write:
+            with self._condition:
+                while self.active >= self.concurrency:
+                    self._condition.wait(1)
+                self.active += 1
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.record_response(time.time() - started)
+            if not write:
+                with self._condition:
+                    self.active -= 1
+                    self._condition.notify_all()
 
 
 class Throttle(object):
 
     """Control rate of access to wiki server.
 
-    Calling this object blocks the calling thread until at least 'delay'
-    seconds have passed since the previous call.
+    Calling this object blocks the calling thread until the request may be
+    made. Each site has a token bucket for reads and one for writes which
+    are refilled with one token every 'delay' or 'writedelay' seconds. A
+    request takes a token; a request for several pages takes a token for
+    each factor of two of their number.
+
+    The buckets are shared by all processes which use the same site, so
+    the delays apply to all of them together. A server lag or a
+    Retry-After header blocks both buckets for all processes.
+
+    If config.adaptive_throttle is enabled, a L{LagScheduler} lengthens
+    the delays and limits parallel reads while the server is under load.
 
     Each Site initiates one Throttle object (site.throttle) to control the
     rate of access.
@@ -39,12 +356,14 @@ class Throttle(object):
 
     def __init__(self, site, mindelay=None, maxdelay=None, writedelay=None,
                  multiplydelay=True):
-        """Initializer."""
+        """
+        Initializer.
+
+        @param multiplydelay: share the buckets with other processes
+        @type multiplydelay: bool
+        """
         self.lock = threading.RLock()
-        self.lock_write = threading.RLock()
-        self.lock_read = threading.RLock()
         self.mysite = str(site)
-        self.ctrlfilename = config.datafilepath('throttle.ctrl')
         self.mindelay = mindelay
         if self.mindelay is None:
             self.mindelay = config.minthrottle
@@ -54,25 +373,17 @@ class Throttle(object):
         self.writedelay = writedelay
         if self.writedelay is None:
             self.writedelay = config.put_throttle
-        self.last_read = 0
-        self.last_write = 0
-        self.next_multiplicity = 1.0
-
-        # Check logfile again after this many seconds:
-        self.checkdelay = 300
+        self.burst = config.throttle_burst
 
-        # Ignore processes that have not made a check in this many seconds:
-        self.dropdelay = 600
-
-        # Free the process id after this many seconds:
-        self.releasepid = 1200
-
-        self.retry_after = 0  # set by http.request
+        self._retry_after = 0
         self.delay = 0
-        self.checktime = 0
         self.multiplydelay = multiplydelay
         if self.multiplydelay:
-            self.checkMultiplicity()
+            self.store = get_token_store()
+        else:
+            self.store = LocalTokenStore()
+        self.waiting = {'read': 0, 'write': 0}
+        self.scheduler = LagScheduler() if config.adaptive_throttle else None
         self.setDelays()
 
     @property
@@ -81,67 +392,46 @@ class Throttle(object):
         """DEPRECATED property."""
         return 0.0
 
+    @property
+    @deprecated(since='20190801')
+    def process_multiplicity(self):
+        """DEPRECATED property; the buckets are shared instead."""
+        return 1
+
+    @property
+    def retry_after(self):
+        """Return the last Retry-After value in seconds, set by http."""
+        return self._retry_after
+
+    @retry_after.setter
+    def retry_after(self, value):
+        """Set the Retry-After value and block the buckets if positive."""
+        self._retry_after = value
+        if value > 0:
+            self._block(min(value, config.retry_max))
+
+    @deprecated(since='20190801')
     def checkMultiplicity(self):
-        """Count running processes for site and set process_multiplicity."""
-        global pid
-        mysite = self.mysite
-        pywikibot.debug('Checking multiplicity: pid = %(pid)s' % globals(),
-                        _logger)
-        with self.lock:
-            processes = []
-            my_pid = pid or 1  # start at 1 if global pid not yet set
-            count = 1
-            # open throttle.log
-            try:
-                f = open(self.ctrlfilename, 'r')
-            except IOError:
-                if pid:
-                    raise
-            else:
-                now = time.time()
-                for line in f.readlines():
-                    # parse line; format is "pid timestamp site"
-                    try:
-                        line = line.split(' ')
-                        this_pid = int(line[0])
-                        ptime = int(line[1].split('.')[0])
-                        this_site = line[2].rstrip()
-                    except (IndexError, ValueError):
-                        # Sometimes the file gets corrupted ignore that line
-                        continue
-                    if now - ptime > self.releasepid:
-                        continue    # process has expired, drop from file
-                    if now - ptime <= self.dropdelay \
-                       and this_site == mysite \
-                       and this_pid != pid:
-                        count += 1
-                    if this_site != self.mysite or this_pid != pid:
-                        processes.append({'pid': this_pid,
-                                          'time': ptime,
-                                          'site': this_site})
-                    if not pid and this_pid >= my_pid:
-                        my_pid = this_pid + 1  # next unused process id
-                f.close()
-
-            if not pid:
-                pid = my_pid
-            self.checktime = time.time()
-            processes.append({'pid': pid,
-                              'time': self.checktime,
-                              'site': mysite})
-            processes.sort(key=lambda p: (p['pid'], p['site']))
-            try:
-                f = open(self.ctrlfilename, 'w')
-                for p in processes:
-                    f.write('%(pid)s %(time)s %(site)s\n' % p)
-            except IOError:
-                pass
-            else:
-                f.close()
-            self.process_multiplicity = count
-            pywikibot.log(
-                'Found {0} {1} processes running, including this one.'.format(
-                    count, mysite))
+        """DEPRECATED: processes are not counted anymore."""
+
+    @deprecated(since='20190801')
+    def drop(self):
+        """DEPRECATED: processes are not registered anymore."""
+
+    def _key(self, write):
+        """Return the bucket name."""
+        return '{0}:{1}'.format(self.mysite, 'write' if write else 'read')
+
+    def _rate(self, write):
+        """Return the tokens added per second; 0 means unlimited."""
+        delay = self.getDelay(write=write)
+        return 1 / delay if delay > 0 else 0
+
+    def _block(self, seconds):
+        """Block both buckets for the given number of seconds."""
+        until = time.time() + seconds
+        for write in (False, True):
+            self.store.block(self._key(write), until, self.burst)
 
     def setDelays(self, delay=None, writedelay=None, absolute=False):
         """Set the nominal delays in seconds. Defaults to config values."""
@@ -156,83 +446,81 @@ class Throttle(object):
             self.delay = delay
             self.writedelay = min(max(self.mindelay, writedelay),
                                   self.maxdelay)
-            # Start the delay count now, not at the next check
-            self.last_read = self.last_write = time.time()
 
     def getDelay(self, write=False):
-        """Return the actual delay, accounting for multiple processes.
-
-        This value is the maximum wait between reads/writes, not taking
-        account of how much time has elapsed since the last access.
+        """Return the delay between reads/writes in seconds.
 
+        The nominal delay is lengthened according to the load of the
+        server if there is a scheduler.
         """
         if write:
             thisdelay = self.writedelay
         else:
             thisdelay = self.delay
-        if self.multiplydelay:  # We're checking for multiple processes
-            if time.time() > self.checktime + self.checkdelay:
-                self.checkMultiplicity()
-            if thisdelay < (self.mindelay * self.next_multiplicity):
-                thisdelay = self.mindelay * self.next_multiplicity
-            elif thisdelay > self.maxdelay:
-                thisdelay = self.maxdelay
-            thisdelay *= self.process_multiplicity
-        return thisdelay
+        if self.scheduler:
+            thisdelay *= self.scheduler.delay_factor
+        return min(thisdelay, self.maxdelay)
+
+    @contextmanager
+    def slot(self, write=False):
+        """
+        Context of a single request to the server.
+
+        Without a scheduler, it does nothing.
+        @see: L{LagScheduler.slot}
+        """
+        if self.scheduler:
+            with self.scheduler.slot(write):
+                yield
+        else:
+            yield
 
     def waittime(self, write=False):
         """Return waiting time in seconds.
 
         The result is for a query that would be made right now.
         """
-        # Take the previous requestsize in account calculating the desired
-        # delay this time
-        thisdelay = self.getDelay(write=write)
+        rate = self._rate(write)
+        tokens, blocked = self.store.state(self._key(write), rate, self.burst)
         now = time.time()
-        if write:
-            ago = now - self.last_write
-        else:
-            ago = now - self.last_read
-        if ago < thisdelay:
-            delta = thisdelay - ago
-            return delta
-        else:
-            return 0.0
+        wait = (1 - tokens) / rate if rate and tokens < 1 else 0.0
+        return max(wait, blocked - now, 0.0)
 
-    def drop(self):
-        """Remove me from the list of running bot processes."""
-        # drop all throttles with this process's pid, regardless of site
-        self.checktime = 0
-        processes = []
-        try:
-            with open(self.ctrlfilename, 'r') as f:
-                lines = f.readlines()
-        except IOError:
-            return
+    def status(self):
+        """
+        Return the state of both buckets for monitoring.
+
+        For each of 'read' and 'write' it contains the current 'tokens',
+        which are negative when callers of any process already reserved
+        future tokens, the number of 'waiting' callers of this process, the
+        seconds the bucket is still 'blocked' and the chosen 'rate' in
+        requests per second, 0 meaning unlimited.
+
+        With a scheduler, 'scheduler' contains the estimated 'lag' and
+        'response_time', the resulting 'pressure' and the 'concurrency'
+        and number of 'active' reads.
 
+        @rtype: dict
+        """
         now = time.time()
-        for line in lines:
-            try:
-                line = line.split(' ')
-                this_pid = int(line[0])
-                ptime = int(line[1].split('.')[0])
-                this_site = line[2].rstrip()
-            except (IndexError, ValueError):
-                # Sometimes the file gets corrupted ignore that line
-                continue
-            if now - ptime <= self.releasepid \
-               and this_pid != pid:
-                processes.append({'pid': this_pid,
-                                  'time': ptime,
-                                  'site': this_site})
-
-        processes.sort(key=lambda p: p['pid'])
-        try:
-            with open(self.ctrlfilename, 'w') as f:
-                for p in processes:
-                    f.write('%(pid)s %(time)s %(site)s\n' % p)
-        except IOError:
-            return
+        result = {}
+        for write, kind in ((False, 'read'), (True, 'write')):
+            rate = self._rate(write)
+            tokens, blocked = self.store.state(self._key(write), rate,
+                                               self.burst)
+            result[kind] = {'tokens': tokens,
+                            'waiting': self.waiting[kind],
+                            'blocked': max(0.0, blocked - now),
+                            'rate': rate}
+        if self.scheduler:
+            result['scheduler'] = {
+                'lag': self.scheduler.lag,
+                'response_time': self.scheduler.response_time,
+                'pressure': self.scheduler.pressure,
+                'concurrency': self.scheduler.concurrency,
+                'active': self.scheduler.active,
+            }
+        return result
 
     def wait(self, seconds):
         """Wait for seconds seconds.
@@ -256,34 +544,30 @@ class Throttle(object):
         time.sleep(seconds)
 
     def __call__(self, requestsize=1, write=False):
-        """Block the calling program if the throttle time has not expired.
+        """Block the calling program until a token is available.
 
         Parameter requestsize is the number of Pages to be read/written;
-        multiply delay time by an appropriate factor.
+        one token is taken for each factor of two in the size of the
+        request. Getting 64 pages at once takes 6 tokens.
 
-        Because this seizes the throttle lock, it will prevent any other
-        thread from writing to the same site until the wait expires.
+        Other threads are not blocked while this one waits; their tokens
+        are reserved after the tokens of this request.
 
         """
-        lock = self.lock_write if write else self.lock_read
-        with lock:
-            wait = self.waittime(write=write)
-            # Calculate the multiplicity of the next delay based on how
-            # big the request is that is being posted now.
-            # We want to add "one delay" for each factor of two in the
-            # size of the request. Getting 64 pages at once allows 6 times
-            # the delay time for the server.
-            self.next_multiplicity = math.log(1 + requestsize) / math.log(2.0)
-
+        kind = 'write' if write else 'read'
+        cost = max(1.0, math.log(1 + requestsize) / math.log(2.0))
+        with self.lock:
+            self.waiting[kind] += 1
+        try:
+            wait = self.store.reserve(self._key(write), cost,
+                                      self._rate(write), self.burst)
             self.wait(wait)
-
-            if write:
-                self.last_write = time.time()
-            else:
-                self.last_read = time.time()
+        finally:
+            with self.lock:
+                self.waiting[kind] -= 1
 
     def lag(self, lagtime=None):
-        """Seize the throttle lock due to server lag.
+        """Block the buckets of the site due to server lag.
 
         Usually the self.retry-after value from response_header of the last
         request if available which will be used for wait time. Otherwise
@@ -293,21 +577,20 @@ class Throttle(object):
         If the lagtime is disproportionately high compared to retry-after
         value, the wait time will be increased.
 
-        This method is used by api.request. It will prevent any thread from
-        accessing this site.
+        This method is used by api.request. It will prevent any thread and
+        any other process from accessing this site until the time passed.
 
         @param lagtime: The time to wait for the next request which is the
             last maxlag time from api warning. This is only used as a fallback
             if self.retry-after isn't set.
         @type lagtime: int
         """
-        started = time.time()
-        with self.lock:
-            waittime = lagtime or config.retry_wait
-            if self.retry_after:
-                waittime = max(self.retry_after, waittime / 5)
-            # wait not more than retry_max seconds
-            delay = min(waittime, config.retry_max)
-            # account for any time we waited while acquiring the lock
-            wait = delay - (time.time() - started)
-            self.wait(wait)
+        if lagtime and self.scheduler:
+            self.scheduler.record_lag(lagtime)
+        waittime = lagtime or config.retry_wait
+        if self.retry_after:
+            waittime = max(self.retry_after, waittime / 5)
+        # wait not more than retry_max seconds
+        delay = min(waittime, config.retry_max)
+        self._block(delay)
+        self.wait(delay)
@@ -8,7 +8,6 @@
 from __future__ import absolute_import, division, unicode_literals
 
 import collections
-import gzip
 import hashlib
 from importlib import import_module
 import inspect
@@ -16,7 +15,6 @@ import itertools
 import os
 import re
 import stat
-import subprocess
 import sys
 import threading
 import time
@@ -1251,107 +1249,8 @@ class DequeGenerator(IteratorNextMixin, collections.deque):
             raise StopIteration
 
 
-def open_archive(filename, mode='rb', use_extension=True):
-    """
-    Open a file and uncompress it if needed.
-
-    This function supports bzip2, gzip, 7zip, lzma, and xz as compression
-    containers. It uses the packages available in the standard library for
-    bzip2, gzip, lzma, and xz so they are always available. 7zip is only
-    available when a 7za program is available and only supports reading
-    from it.
-
-    The compression is either selected via the magic number or file ending.
-
-    @param filename: The filename.
-    @type filename: str
-    @param use_extension: Use the file extension instead of the magic number
-        to determine the type of compression (default True). Must be True when
-        writing or appending.
-    @type use_extension: bool
-    @param mode: The mode in which the file should be opened. It may either be
-        'r', 'rb', 'a', 'ab', 'w' or 'wb'. All modes open the file in binary
-        mode. It defaults to 'rb'.
-    @type mode: str
-    @raises ValueError: When 7za is not available or the opening mode is
-        unknown or it tries to write a 7z archive.
-    @raises FileNotFoundError: When the filename doesn't exist and it tries
-        to read from it or it tries to determine the compression algorithm (or
-        IOError on Python 2).
-    @raises OSError: When it's not a 7z archive but the file extension is 7z.
-        It is also raised by bz2 when its content is invalid. gzip does not
-        immediately raise that error but only on reading it.
-    @raises lzma.LZMAError: When error occurs during compression or
-        decompression or when initializing the state with lzma or xz.
-    @raises ImportError: When file is compressed with bz2 but neither bz2 nor
-        bz2file is importable, or when file is compressed with lzma or xz but
-        lzma is not importable.
-    @return: A file-like object returning the uncompressed data in binary mode.
-    @rtype: file-like object
-    """
-    if mode in ('r', 'a', 'w'):
-        mode += 'b'
-    elif mode not in ('rb', 'ab', 'wb'):
-        raise ValueError('Invalid mode: "{0}"'.format(mode))
-
-    if use_extension:
-        # if '.' not in filename, it'll be 1 character long but otherwise
-        # contain the period
-        extension = filename[filename.rfind('.'):][1:]
-    else:
-        if mode != 'rb':
-            raise ValueError('Magic number detection only when reading')
-        with open(filename, 'rb') as f:
-            magic_number = f.read(8)
-        if magic_number.startswith(b'BZh'):
-            extension = 'bz2'
-        elif magic_number.startswith(b'\x1F\x8B\x08'):
-            extension = 'gz'
-        elif magic_number.startswith(b"7z\xBC\xAF'\x1C"):
-            extension = '7z'
-        # Unfortunately, legacy LZMA container format has no magic number
-        elif magic_number.startswith(b'\xFD7zXZ\x00'):
-            extension = 'xz'
-        else:
-            extension = ''
-
-    if extension == 'bz2':
-        if isinstance(bz2, ImportError):
-            raise bz2
-        return bz2.BZ2File(filename, mode)
-    if extension == 'gz':
-        return gzip.open(filename, mode)
-    if extension == '7z':
-        if mode != 'rb':
-            raise NotImplementedError('It is not possible to write a 7z file.')
-
-        try:
-            process = subprocess.Popen(['7za', 'e', '-bd', '-so', filename],
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       bufsize=65535)
-        except OSError:
-            raise ValueError('7za is not installed or cannot '
-                             'uncompress "{0}"'.format(filename))
-        else:
-            stderr = process.stderr.read()
-            process.stderr.close()
-            if stderr != b'':
-                process.stdout.close()
-                raise OSError(
-                    'Unexpected STDERR output from 7za {0}'.format(stderr))
-            else:
-                return process.stdout
-    if extension == 'lzma':
-        if isinstance(lzma, ImportError):
-            raise lzma
-        return lzma.open(filename, mode, format=lzma.FORMAT_ALONE)
-    if extension == 'xz':
-        if isinstance(lzma, ImportError):
-            raise lzma
-        return lzma.open(filename, mode, format=lzma.FORMAT_XZ)
-    # assume it's an uncompressed file
-    return open(filename, 'rb')
+# The archive readers depend on bz2 and lzma above.
+from pywikibot.tools.archive import open_archive  # noqa: E402
 
 
 def merge_unique_dicts(*args, **kwargs):
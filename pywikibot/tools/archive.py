@@ -0,0 +1,723 @@
+# -*- coding: utf-8 -*-
+"""Readers and writers of compressed files."""
+#
+# (C) Pywikibot team, 2008-2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import collections
+import gzip
+import multiprocessing
+import re
+import struct
+import subprocess
+import threading
+import time
+
+from pywikibot.logging import debug
+from pywikibot.tools import bz2, lzma
+
+try:
+    import zstandard
+except ImportError as zstandard_import_error:
+    zstandard = zstandard_import_error
+
+
+class _StreamReader(object):
+
+    """Read-only file-like object over an iterator of byte strings."""
+
+    mode = 'rb'
+
+    def __init__(self, chunks, close=None):
+        """
+        Initializer.
+
+        @param chunks: the data
+        @type chunks: iterable of bytes
+        @param close: called when the reader is closed
+        @type close: callable
+        """
+        self._chunks = iter(chunks)
+        self._close = close
+        # the current chunk and the position within it; the chunks are not
+        # joined so that reading small pieces does not copy the remainder
+        self._chunk = b''
+        self._pos = 0
+        self.closed = False
+
+    def _fill(self):
+        """Ensure unread data in the current chunk; return False at the end."""
+        while self._pos >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._chunk = chunk
+            self._pos = 0
+        return True
+
+    def read(self, size=-1):
+        """Read at most size bytes; all remaining bytes if size < 0."""
+        parts = []
+        while size != 0 and self._fill():
+            end = len(self._chunk)
+            if size > 0:
+                end = min(end, self._pos + size)
+                size -= end - self._pos
+            parts.append(self._chunk[self._pos:end])
+            self._pos = end
+        return b''.join(parts)
+
+    def readline(self, size=-1):
+        """Read a line of at most size bytes."""
+        parts = []
+        while size != 0 and self._fill():
+            end = len(self._chunk)
+            if size > 0:
+                end = min(end, self._pos + size)
+            newline = self._chunk.find(b'\n', self._pos, end)
+            if newline >= 0:
+                end = newline + 1
+            if size > 0:
+                size -= end - self._pos
+            parts.append(self._chunk[self._pos:end])
+            self._pos = end
+            if newline >= 0:
+                break
+        return b''.join(parts)
+
+    def __iter__(self):
+        """Iterate over the lines."""
+        return iter(self.readline, b'')
+
+    def close(self):
+        """Close the reader."""
+        if not self.closed:
+            self.closed = True
+            if hasattr(self._chunks, 'close'):
+                self._chunks.close()
+            if self._close:
+                self._close()
+
+    def __enter__(self):
+        """Enter a with-statement."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the reader when leaving a with-statement."""
+        self.close()
+
+
+class ArchiveReader(object):
+
+    """
+    Uncompressed data of a file opened by open_archive for reading.
+
+    It counts the bytes read and the time spent reading them, which
+    includes the time spent decompressing them. The throughput is logged
+    when the file is closed. All other attributes are those of the wrapped
+    file-like object.
+    """
+
+    _logger = 'tools.archive'
+
+    def __init__(self, fileobj, filename, backend):
+        """
+        Initializer.
+
+        @param fileobj: the file-like object returned by the backend
+        @param filename: name of the file
+        @type filename: str
+        @param backend: name of the decompressor
+        @type backend: str
+        """
+        self.fileobj = fileobj
+        self.filename = filename
+        self.backend = backend
+        self.bytes_read = 0
+        self.elapsed = 0.0
+
+    def __getattr__(self, name):
+        """Get the attribute from the file-like object."""
+        return getattr(self.fileobj, name)
+
+    @property
+    def throughput(self):
+        """Return the uncompressed bytes read per second."""
+        return self.bytes_read / self.elapsed if self.elapsed else 0.0
+
+    def _timed(self, method, size):
+        """Call a read method and update the counters."""
+        start = time.time()
+        data = method(size)
+        self.elapsed += time.time() - start
+        self.bytes_read += len(data)
+        return data
+
+    def read(self, size=-1):
+        """Read at most size bytes; all remaining bytes if size < 0."""
+        return self._timed(self.fileobj.read, size)
+
+    def readline(self, size=-1):
+        """Read a line of at most size bytes."""
+        return self._timed(self.fileobj.readline, size)
+
+    def __iter__(self):
+        """Iterate over the lines."""
+        return iter(self.readline, b'')
+
+    def close(self):
+        """Close the file and log the throughput."""
+        self.fileobj.close()
+        if self.bytes_read:
+            debug('{0}: read {1} bytes in {2:.3f} s using {3} '
+                  '({4:.1f} MiB/s)'.format(
+                      self.filename, self.bytes_read, self.elapsed,
+                      self.backend, self.throughput / (1 << 20)),
+                  self._logger)
+
+    def __enter__(self):
+        """Enter a with-statement."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the file when leaving a with-statement."""
+        self.close()
+
+
+_archive_backends = collections.defaultdict(list)
+
+
+def register_archive_backend(extension, name, opener):
+    """
+    Register a decompressor used by open_archive for reading.
+
+    The backends registered for an extension are tried before the built-in
+    decompressor, those registered last first. A backend is called with the
+    filename and returns a file-like object or None if it cannot read that
+    file, in which case the next one is tried.
+
+    @param extension: file extension without the period, e.g. 'bz2'
+    @type extension: str
+    @param name: name of the backend used when reporting the throughput
+    @type name: str
+    @param opener: callable opening a file
+    @type opener: callable
+    """
+    _archive_backends[extension].insert(0, (name, opener))
+
+
+_bz2_stream_start = re.compile(b'BZh[1-9]1AY&SY')
+
+
+def _bz2_ranges(filename, size):
+    """
+    Split a multistream bz2 file into ranges of whole streams.
+
+    A range ends at the first stream start at least size bytes after its
+    own start. The last range ends with the file which is marked by None.
+    A stream start is recognized by its magic number; should compressed
+    data contain it by chance, the reader notices and falls back.
+    """
+    start = pos = 0
+    tail = b''
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(size), b''):
+            data = tail + block
+            base = pos - len(tail)
+            for match in _bz2_stream_start.finditer(data):
+                offset = base + match.start()
+                if offset - start >= size:
+                    yield start, offset
+                    start = offset
+            pos += len(block)
+            # a stream start may be split between two blocks
+            tail = data[-9:]
+    yield start, None
+
+
+def _bz2_at_end(decompressor):
+    """Return whether a BZ2Decompressor reached the end of its stream."""
+    if hasattr(decompressor, 'eof'):
+        return decompressor.eof
+    try:  # Python 2
+        decompressor.decompress(b'')
+    except EOFError:
+        return True
+    return False
+
+
+def _bz2_chunks(f, size):
+    """Decompress all bz2 streams of a file sequentially."""
+    decompressor = bz2.BZ2Decompressor()
+    for data in iter(lambda: f.read(size), b''):
+        while data:
+            if _bz2_at_end(decompressor):
+                decompressor = bz2.BZ2Decompressor()
+            yield decompressor.decompress(data)
+            data = decompressor.unused_data
+
+
+def _bz2_decompress_range(filename, start, end):
+    """
+    Decompress the streams within a range of a bz2 file.
+
+    @return: the uncompressed data and whether the last stream ended
+        within the range
+    @rtype: tuple of bytes and bool
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read() if end is None else f.read(end - start)
+    result = []
+    while data:
+        decompressor = bz2.BZ2Decompressor()
+        result.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(result), _bz2_at_end(decompressor)
+
+
+class _ThreadedBZ2(object):
+
+    """
+    Decompress a multistream bz2 file in a pool of threads.
+
+    bz2 releases the GIL while decompressing, so the streams are
+    decompressed in parallel. At most two ranges per thread are kept
+    in memory ahead of the reader.
+    """
+
+    chunk_size = 1 << 20
+
+    def __init__(self, filename, threads):
+        """Initializer."""
+        from multiprocessing.pool import ThreadPool
+        self.filename = filename
+        self.threads = threads
+        self.pool = ThreadPool(threads)
+
+    def chunks(self):
+        """Yield the uncompressed data in order."""
+        pending = collections.deque()
+        ranges = _bz2_ranges(self.filename, self.chunk_size)
+        while True:
+            for start, end in ranges:
+                pending.append((start, self.pool.apply_async(
+                    _bz2_decompress_range, (self.filename, start, end))))
+                if len(pending) >= 2 * self.threads:
+                    break
+            if not pending:
+                return
+            start, result = pending.popleft()
+            data, complete = result.get()
+            yield data
+            if not complete:
+                break
+        # a range ended within a stream; continue sequentially
+        skip = len(data)
+        with open(self.filename, 'rb') as f:
+            f.seek(start)
+            for data in _bz2_chunks(f, self.chunk_size):
+                cut = min(skip, len(data))
+                skip -= cut
+                if data[cut:]:
+                    yield data[cut:]
+
+    def close(self):
+        """Stop the threads."""
+        self.pool.terminate()
+        self.pool.join()
+
+
+def _open_bz2_threaded(filename):
+    """Open a multistream bz2 file decompressed by several threads."""
+    threads = multiprocessing.cpu_count()
+    if isinstance(bz2, ImportError) or threads < 2:
+        return None
+    with open(filename, 'rb') as f:
+        head = f.read(4 * _ThreadedBZ2.chunk_size)
+    if _bz2_stream_start.search(head, 1) is None:
+        # a single stream cannot be split
+        return None
+    reader = _ThreadedBZ2(filename, threads)
+    return _StreamReader(reader.chunks(), reader.close)
+
+
+_7z_signature = b"7z\xBC\xAF'\x1C"
+
+
+def _7z_number(buf, pos):
+    """Read a variable length number of a 7z header."""
+    first = buf[pos]
+    pos += 1
+    mask = 0x80
+    value = 0
+    for i in range(8):
+        if not first & mask:
+            return value | ((first & (mask - 1)) << (8 * i)), pos
+        value |= buf[pos] << (8 * i)
+        pos += 1
+        mask >>= 1
+    return value, pos
+
+
+def _7z_skip_digests(buf, pos, count):
+    """Skip the CRC digests of count streams."""
+    if buf[pos]:
+        defined = count
+        pos += 1
+    else:
+        bits = buf[pos + 1:pos + 1 + (count + 7) // 8]
+        defined = sum(bin(byte).count('1') for byte in bits)
+        pos += 1 + len(bits)
+    return pos + 4 * defined
+
+
+def _7z_folder(buf, pos):
+    """Read the coders of a folder of a 7z header."""
+    count, pos = _7z_number(buf, pos)
+    coders = []
+    inputs = outputs = 0
+    for _ in range(count):
+        flags = buf[pos]
+        pos += 1
+        if flags & 0x80:
+            raise ValueError('Alternative coders are not supported')
+        coder_id = bytes(buf[pos:pos + (flags & 0x0F)])
+        pos += flags & 0x0F
+        if flags & 0x10:
+            coder_inputs, pos = _7z_number(buf, pos)
+            coder_outputs, pos = _7z_number(buf, pos)
+        else:
+            coder_inputs = coder_outputs = 1
+        props = b''
+        if flags & 0x20:
+            size, pos = _7z_number(buf, pos)
+            props = bytes(buf[pos:pos + size])
+            pos += size
+        inputs += coder_inputs
+        outputs += coder_outputs
+        coders.append((coder_id, props))
+    for _ in range(2 * (outputs - 1)):  # bind pairs
+        _, pos = _7z_number(buf, pos)
+    packed = inputs - outputs + 1
+    if packed > 1:
+        for _ in range(packed):
+            _, pos = _7z_number(buf, pos)
+    return coders, outputs, pos
+
+
+def _7z_streams_info(buf, pos):
+    """
+    Read the streams info of a 7z header.
+
+    @return: offset of the packed streams relative to the end of the
+        signature header, their sizes and the folders as tuples of the
+        coders and the unpacked sizes
+    @rtype: tuple
+    """
+    pack_pos = 0
+    pack_sizes = []
+    folders = []
+    while True:
+        prop = buf[pos]
+        pos += 1
+        if prop == 0x00:  # end
+            break
+        if prop == 0x06:  # pack info
+            pack_pos, pos = _7z_number(buf, pos)
+            count, pos = _7z_number(buf, pos)
+            while buf[pos] != 0x00:
+                if buf[pos] == 0x09:  # sizes
+                    pos += 1
+                    for _ in range(count):
+                        size, pos = _7z_number(buf, pos)
+                        pack_sizes.append(size)
+                elif buf[pos] == 0x0A:  # digests
+                    pos = _7z_skip_digests(buf, pos + 1, count)
+                else:
+                    raise ValueError('Unknown pack info property')
+            pos += 1
+        elif prop == 0x07:  # coders info
+            if buf[pos] != 0x0B or buf[pos + 2] != 0x00:
+                raise ValueError('External folders are not supported')
+            count, pos = _7z_number(buf, pos + 1)
+            pos += 1
+            coders = []
+            for _ in range(count):
+                folder_coders, outputs, pos = _7z_folder(buf, pos)
+                coders.append((folder_coders, outputs))
+            if buf[pos] != 0x0C:
+                raise ValueError('Unpacked sizes are missing')
+            pos += 1
+            for folder_coders, outputs in coders:
+                sizes = []
+                for _ in range(outputs):
+                    size, pos = _7z_number(buf, pos)
+                    sizes.append(size)
+                folders.append((folder_coders, sizes))
+            while buf[pos] != 0x00:
+                if buf[pos] != 0x0A:
+                    raise ValueError('Unknown coders info property')
+                pos = _7z_skip_digests(buf, pos + 1, count)
+            pos += 1
+        elif prop == 0x08:  # substreams info
+            if buf[pos] == 0x0D:
+                pos += 1
+                for _ in folders:
+                    streams, pos = _7z_number(buf, pos)
+                    if streams != 1:
+                        raise ValueError('Archives with several files are '
+                                         'not supported')
+            # the remaining properties are not needed
+            break
+        else:
+            raise ValueError('Unknown streams info property')
+    return pack_pos, pack_sizes, folders
+
+
+def _7z_filters(coders):
+    """Return the lzma filter chain of a folder with a single coder."""
+    if len(coders) != 1:
+        raise ValueError('Only archives with a single coder are supported')
+    coder_id, props = coders[0]
+    props = bytearray(props)
+    if coder_id == b'\x21':
+        dict_size = (0xFFFFFFFF if props[0] == 40
+                     else (2 | (props[0] & 1)) << (props[0] // 2 + 11))
+        return [{'id': lzma.FILTER_LZMA2, 'dict_size': dict_size}]
+    if coder_id == b'\x03\x01\x01':
+        lclppb = props[0]
+        return [{'id': lzma.FILTER_LZMA1, 'lc': lclppb % 9,
+                 'lp': lclppb // 9 % 5, 'pb': lclppb // 45,
+                 'dict_size': struct.unpack('<I', bytes(props[1:5]))[0]}]
+    raise ValueError('Only LZMA and LZMA2 compressed archives are supported')
+
+
+def _7z_chunks(filename, offset, size, unpack_size, filters,
+               chunk_size=1 << 16):
+    """Yield the uncompressed data of a packed stream of a 7z archive."""
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=filters)
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        while size > 0 and unpack_size > 0:
+            data = f.read(min(size, chunk_size))
+            if not data:
+                raise EOFError('Compressed file ended before the end of '
+                               'the packed stream')
+            size -= len(data)
+            data = decompressor.decompress(data)[:unpack_size]
+            unpack_size -= len(data)
+            if data:
+                yield data
+
+
+def _7z_archive(filename):
+    """
+    Locate the data of a 7z archive with a single LZMA or LZMA2 stream.
+
+    @return: offset and size of the packed stream, the uncompressed size
+        and the lzma filter chain
+    @rtype: tuple
+    @raises ValueError: the archive is not supported
+    """
+    with open(filename, 'rb') as f:
+        start = f.read(32)
+        if len(start) < 32 or not start.startswith(_7z_signature):
+            raise ValueError('Not a 7z archive')
+        offset, size = struct.unpack('<QQ', start[12:28])
+        f.seek(32 + offset)
+        buf = bytearray(f.read(size))
+    if buf and buf[0] == 0x17:  # encoded header
+        pack_pos, pack_sizes, folders = _7z_streams_info(buf, 1)
+        buf = bytearray(b''.join(_7z_chunks(
+            filename, 32 + pack_pos, pack_sizes[0], folders[0][1][-1],
+            _7z_filters(folders[0][0]))))
+    if not buf or buf[0] != 0x01:
+        raise ValueError('Unknown 7z header')
+    pos = 1
+    if buf[pos] == 0x02:  # archive properties
+        pos += 1
+        while buf[pos] != 0x00:
+            size, pos = _7z_number(buf, pos + 1)
+            pos += size
+        pos += 1
+    if buf[pos] != 0x04:
+        raise ValueError('Only archives with a single stream are supported')
+    pack_pos, pack_sizes, folders = _7z_streams_info(buf, pos + 1)
+    if len(folders) != 1 or len(pack_sizes) != 1:
+        raise ValueError('Only archives with a single stream are supported')
+    return (32 + pack_pos, pack_sizes[0], folders[0][1][-1],
+            _7z_filters(folders[0][0]))
+
+
+def _open_7z_lzma(filename):
+    """Open a 7z archive using the lzma module."""
+    if isinstance(lzma, ImportError):
+        return None
+    try:
+        archive = _7z_archive(filename)
+    except (ValueError, IndexError, EOFError, struct.error) as e:
+        debug('Cannot read {0} using lzma: {1}'.format(filename, e),
+              ArchiveReader._logger)
+        return None
+    return _StreamReader(_7z_chunks(filename, *archive))
+
+
+def _open_7za(filename):
+    """Open a 7z archive by reading the output of 7za."""
+    try:
+        process = subprocess.Popen(['7za', 'e', '-bd', '-so', filename],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   bufsize=65535)
+    except OSError:
+        raise ValueError('7za is not installed or cannot '
+                         'uncompress "{0}"'.format(filename))
+    stderr = []
+    # drain STDERR so that 7za never blocks on a full pipe
+    thread = threading.Thread(target=lambda: stderr.append(
+        process.stderr.read()))
+    thread.daemon = True
+    thread.start()
+
+    def chunks():
+        for data in iter(lambda: process.stdout.read(65535), b''):
+            yield data
+        process.wait()
+        thread.join()
+        if stderr[0] != b'':
+            raise OSError(
+                'Unexpected STDERR output from 7za {0}'.format(stderr[0]))
+
+    def close():
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        thread.join()
+        process.stderr.close()
+
+    return _StreamReader(chunks(), close)
+
+
+def _open_zstd(filename):
+    """Open a zstd compressed file."""
+    if isinstance(zstandard, ImportError):
+        raise zstandard
+    f = open(filename, 'rb')
+    return _StreamReader(zstandard.ZstdDecompressor().read_to_iter(f),
+                         f.close)
+
+
+register_archive_backend('7z', '7za', _open_7za)
+register_archive_backend('7z', 'lzma', _open_7z_lzma)
+register_archive_backend('bz2', 'bz2 threads', _open_bz2_threaded)
+register_archive_backend('zst', 'zstandard', _open_zstd)
+
+
+def open_archive(filename, mode='rb', use_extension=True):
+    """
+    Open a file and uncompress it if needed.
+
+    This function supports bzip2, gzip, 7zip, lzma, xz and zstd as
+    compression containers. It uses the packages available in the standard
+    library for bzip2, gzip, lzma, and xz so they are always available. 7zip
+    and zstd only support reading. 7zip archives containing a single LZMA or
+    LZMA2 stream are read using lzma, others only when a 7za program is
+    available. zstd requires the zstandard package.
+
+    Multistream bzip2 files are decompressed by several threads. Further
+    decompressors for reading can be added with register_archive_backend.
+
+    The compression is either selected via the magic number or file ending.
+
+    @param filename: The filename.
+    @type filename: str
+    @param use_extension: Use the file extension instead of the magic number
+        to determine the type of compression (default True). Must be True when
+        writing or appending.
+    @type use_extension: bool
+    @param mode: The mode in which the file should be opened. It may either be
+        'r', 'rb', 'a', 'ab', 'w' or 'wb'. All modes open the file in binary
+        mode. It defaults to 'rb'.
+    @type mode: str
+    @raises ValueError: When 7za is not available or the opening mode is
+        unknown or it tries to write a 7z archive.
+    @raises FileNotFoundError: When the filename doesn't exist and it tries
+        to read from it or it tries to determine the compression algorithm (or
+        IOError on Python 2).
+    @raises OSError: When it's not a 7z archive but the file extension is 7z.
+        It is also raised by bz2 when its content is invalid. gzip does not
+        immediately raise that error but only on reading it.
+    @raises lzma.LZMAError: When error occurs during compression or
+        decompression or when initializing the state with lzma or xz.
+    @raises ImportError: When file is compressed with bz2 but neither bz2 nor
+        bz2file is importable, or when file is compressed with lzma or xz but
+        lzma is not importable, or when file is compressed with zstd but
+        zstandard is not importable.
+    @return: A file-like object returning the uncompressed data in binary mode.
+        When reading it is an ArchiveReader reporting the throughput.
+    @rtype: file-like object
+    """
+    if mode in ('r', 'a', 'w'):
+        mode += 'b'
+    elif mode not in ('rb', 'ab', 'wb'):
+        raise ValueError('Invalid mode: "{0}"'.format(mode))
+
+    if use_extension:
+        # if '.' not in filename, it'll be 1 character long but otherwise
+        # contain the period
+        extension = filename[filename.rfind('.'):][1:]
+    else:
+        if mode != 'rb':
+            raise ValueError('Magic number detection only when reading')
+        with open(filename, 'rb') as f:
+            magic_number = f.read(8)
+        if magic_number.startswith(b'BZh'):
+            extension = 'bz2'
+        elif magic_number.startswith(b'\x1F\x8B\x08'):
+            extension = 'gz'
+        elif magic_number.startswith(b"7z\xBC\xAF'\x1C"):
+            extension = '7z'
+        # Unfortunately, legacy LZMA container format has no magic number
+        elif magic_number.startswith(b'\xFD7zXZ\x00'):
+            extension = 'xz'
+        elif magic_number.startswith(b'\x28\xB5\x2F\xFD'):
+            extension = 'zst'
+        else:
+            extension = ''
+
+    if mode == 'rb':
+        for name, opener in _archive_backends.get(extension, ()):
+            fileobj = opener(filename)
+            if fileobj is not None:
+                return ArchiveReader(fileobj, filename, name)
+        return ArchiveReader(_open_archive(filename, mode, extension),
+                             filename, extension or 'uncompressed')
+    return _open_archive(filename, mode, extension)
+
+
+def _open_archive(filename, mode, extension):
+    """Open a file using the decompressors of the standard library."""
+    if extension == 'bz2':
+        if isinstance(bz2, ImportError):
+            raise bz2
+        return bz2.BZ2File(filename, mode)
+    if extension == 'gz':
+        return gzip.open(filename, mode)
+    if extension in ('7z', 'zst'):
+        raise NotImplementedError(
+            'It is not possible to write a {0} file.'.format(extension))
+    if extension == 'lzma':
+        if isinstance(lzma, ImportError):
+            raise lzma
+        return lzma.open(filename, mode, format=lzma.FORMAT_ALONE)
+    if extension == 'xz':
+        if isinstance(lzma, ImportError):
+            raise lzma
+        return lzma.open(filename, mode, format=lzma.FORMAT_XZ)
+    # assume it's an uncompressed file
+    return open(filename, 'rb')
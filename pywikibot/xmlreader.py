@@ -7,22 +7,36 @@ Each XmlEntry object represents a page, as read from an XML source
 The XmlDump class reads a pages_current XML dump (like the ones offered on
 https://dumps.wikimedia.org/backup-index.html) and offers a generator over
 XmlEntry objects which can be used by other bots.
+
+Multistream dumps together with their index can be parsed by several
+processes in parallel. The XmlDumpIndex class keeps the offsets of the pages
+of a dump, so that parsing can start at a given page.
 """
 #
-# (C) Pywikibot team, 2005-2018
+# (C) Pywikibot team, 2005-2019
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, division, unicode_literals
 
+import multiprocessing
+import os
 import re
+import sqlite3
 import threading
 
+from io import BytesIO
+from itertools import chain
 from xml.etree.cElementTree import iterparse
 
 import xml.sax
 
-from pywikibot.tools import open_archive
+from xml.sax.saxutils import unescape
+
+import pywikibot
+
+from pywikibot.tools import bz2, open_archive
+from pywikibot.tools.archive import _StreamReader
 
 
 def parseRestrictions(restrictions):
@@ -50,18 +64,27 @@ def parseRestrictions(restrictions):
 
 class XmlEntry(object):
 
-    """Represent a page."""
+    """
+    Represent a page.
+
+    Fields which were not requested from the XmlDump are None.
+    """
 
-    def __init__(self, title, ns, id, text, username, ipedit, timestamp,
-                 editRestriction, moveRestriction, revisionid, comment,
-                 redirect):
+    __slots__ = ('title', 'ns', 'id', 'text', 'username', 'ipedit',
+                 'timestamp', 'editRestriction', 'moveRestriction',
+                 'revisionid', 'comment', 'isredirect')
+
+    def __init__(self, title=None, ns=None, id=None, text=None,
+                 username=None, ipedit=None, timestamp=None,
+                 editRestriction=None, moveRestriction=None,
+                 revisionid=None, comment=None, redirect=None):
         """Initializer."""
         # TODO: there are more tags we can read.
         self.title = title
         self.ns = ns
         self.id = id
         self.text = text
-        self.username = username.strip()
+        self.username = username if username is None else username.strip()
         self.ipedit = ipedit
         self.timestamp = timestamp
         self.editRestriction = editRestriction
@@ -70,6 +93,15 @@ class XmlEntry(object):
         self.comment = comment
         self.isredirect = redirect
 
+    def __getstate__(self):
+        """Return the fields for pickling."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        """Restore the fields when unpickling."""
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
 
 class XmlParserThread(threading.Thread):
 
@@ -94,6 +126,247 @@ class XmlParserThread(threading.Thread):
         xml.sax.parse(self.filename, self.handler)
 
 
+def _decompress(data):
+    """Decompress all bz2 streams contained in data."""
+    result = []
+    while data:
+        decompressor = bz2.BZ2Decompressor()
+        result.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(result)
+
+
+def _read_stream(filename, offset, length):
+    """Read and decompress bz2 streams of a multistream dump."""
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        data = f.read() if length is None else f.read(length)
+    return _decompress(data)
+
+
+def _parse_stream(args):
+    """Parse the pages of one stream of a multistream dump."""
+    filename, offset, length, uri, allrevisions, fields = args
+    data = _read_stream(filename, offset, length)
+    # the last stream also contains the end of the root element
+    end = data.rfind(b'</mediawiki>')
+    if end >= 0:
+        data = data[:end]
+    source = BytesIO(b'<mediawiki xmlns="' + uri.encode('utf-8') + b'">'
+                     + data + b'</mediawiki>')
+    return list(XmlDump(filename, allrevisions,
+                        fields=fields)._parse_source(source))
+
+
+class XmlDumpIndex(object):
+
+    """
+    Sidecar index of the pages of an XML dump.
+
+    The index maps the title and the id of each page to the offset from
+    which the dump has to be read to reach that page. This is the offset of
+    the line starting the page in an uncompressed dump and the offset of
+    the bz2 stream containing it in a bz2 compressed dump. Only multistream
+    dumps can thus be entered in the middle, and other bz2 dumps are not
+    indexed.
+
+    The index is kept in a SQLite database next to the dump and needs to be
+    rebuilt when the dump changes.
+    """
+
+    suffix = '.pageindex.sqlite3'
+    chunk_size = 1 << 20
+
+    def __init__(self, filename, path=None):
+        """
+        Initializer.
+
+        @param filename: the dump; it must be uncompressed or bz2
+            compressed
+        @type filename: str
+        @param path: the index database; defaults to the name of the
+            dump followed by L{XmlDumpIndex.suffix}
+        @type path: str
+        """
+        self.filename = filename
+        self.path = path or filename + self.suffix
+        self.compressed = filename.endswith('.bz2')
+        self._conn = None
+
+    @classmethod
+    def supports(cls, filename):
+        """
+        Return whether a dump can be entered at a page using an index.
+
+        Uncompressed dumps and bz2 multistream dumps are supported. A bz2
+        dump is taken as multistream if its first stream, which holds the
+        header in multistream dumps, ends within the first
+        L{XmlDumpIndex.chunk_size} bytes.
+
+        @param filename: the dump
+        @type filename: str
+        @rtype: bool
+        """
+        if filename.endswith('.xml'):
+            return True
+        if not filename.endswith('.bz2') or isinstance(bz2, Exception):
+            return False
+        decompressor = bz2.BZ2Decompressor()
+        try:
+            with open(filename, 'rb') as f:
+                decompressor.decompress(f.read(cls.chunk_size))
+        except (IOError, OSError):
+            return False
+        return bool(decompressor.unused_data)
+
+    def _connection(self):
+        """Return the connection to the database."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            with self._conn:
+                self._conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                                   'key TEXT PRIMARY KEY, value TEXT)')
+                self._conn.execute('CREATE TABLE IF NOT EXISTS pages ('
+                                   'title TEXT, pageid INTEGER, '
+                                   'offset INTEGER)')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS pages_title '
+                                   'ON pages (title)')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS pages_pageid '
+                                   'ON pages (pageid)')
+        return self._conn
+
+    def close(self):
+        """Close the connection to the database."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _signature(self):
+        """Return a string identifying the current version of the dump."""
+        stat = os.stat(self.filename)
+        return '{0}:{1}'.format(stat.st_size, int(stat.st_mtime))
+
+    def is_current(self):
+        """Return whether the index was built for the current dump."""
+        row = self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'dump'").fetchone()
+        return row is not None and row[0] == self._signature()
+
+    def build(self):
+        """
+        Scan the dump and store the offsets of all its pages.
+
+        @return: number of pages
+        @rtype: int
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM pages')
+            cursor = conn.executemany('INSERT INTO pages VALUES (?, ?, ?)',
+                                      self._scan())
+            conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                         ('dump', self._signature()))
+        return cursor.rowcount
+
+    def lookup(self, title=None, pageid=None):
+        """
+        Return the offset from which to read to reach a page.
+
+        @param title: title of the page
+        @type title: str
+        @param pageid: id of the page; used if no title is given
+        @type pageid: int or str
+        @return: the offset or None if the page is unknown
+        @rtype: int or None
+        """
+        if title is not None:
+            query, arg = 'title = ?', title
+        else:
+            query, arg = 'pageid = ?', int(pageid)
+        row = self._connection().execute(
+            'SELECT MIN(offset) FROM pages WHERE ' + query, (arg, )).fetchone()
+        return row[0]
+
+    def first_offset(self):
+        """Return the offset of the first page or None."""
+        return self._connection().execute(
+            'SELECT MIN(offset) FROM pages').fetchone()[0]
+
+    def chunks(self, offset=0):
+        """
+        Read the uncompressed dump starting at an offset.
+
+        @param offset: offset of a line or of a bz2 stream
+        @type offset: int
+        @return: the offset from which the chunk was read, the chunk and
+            whether the offset is exact; in a compressed dump the offset of
+            a chunk is the offset of its bz2 stream
+        @rtype: generator of tuple
+        """
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            read = iter(lambda: f.read(self.chunk_size), b'')
+            if not self.compressed:
+                for data in read:
+                    yield offset, data, True
+                    offset += len(data)
+                return
+
+            stream = offset
+            decompressor = None
+            data = b''
+            while True:
+                if not data:
+                    data = next(read, b'')
+                    if not data:
+                        break
+                if decompressor is None:
+                    decompressor = bz2.BZ2Decompressor()
+                    stream = offset
+                try:
+                    out = decompressor.decompress(data)
+                except EOFError:
+                    # the previous stream ended with the previous chunk
+                    decompressor = None
+                    continue
+                if out:
+                    yield stream, out, False
+                unused = decompressor.unused_data
+                if unused or getattr(decompressor, 'eof', False):
+                    decompressor = None
+                offset += len(data) - len(unused)
+                data = unused
+
+    def _scan(self):
+        """Yield title, id and offset of each page of the dump."""
+        pending = b''
+        pending_offset = offset = title = None
+        for base, data, exact in self.chunks():
+            lines = (pending + data).split(b'\n')
+            pos = -len(pending)
+            pending = lines.pop()
+            for line in lines:
+                if pos < 0:
+                    line_offset = pending_offset
+                else:
+                    line_offset = base + pos if exact else base
+                pos += len(line) + 1
+                line = line.strip()
+                if line == b'<page>':
+                    offset = line_offset
+                    title = None
+                elif offset is None:
+                    continue
+                elif line.startswith(b'<title>'):
+                    title = unescape(line[7:-8].decode('utf-8'),
+                                     {'&quot;': '"', '&apos;': "'"})
+                elif title is not None and line.startswith(b'<id>'):
+                    yield title, int(line[4:-5]), offset
+                    offset = None
+            if pos >= 0:
+                pending_offset = base + pos if exact else base
+
+
 class XmlDump(object):
 
     """
@@ -102,37 +375,227 @@ class XmlDump(object):
     Reads the local file at initialization,
     parses it, and offers access to the resulting XmlEntries via a generator.
 
+    A multistream dump can be parsed by several processes when its index
+    file is given. Each process parses one bz2 stream of about 100 pages at
+    a time.
+
     @param allrevisions: boolean
         If True, parse all revisions instead of only the latest one.
         Default: False.
+    @param index: the index file of a multistream dump; it may be bz2
+        compressed
+    @type index: str
+    @param processes: number of processes parsing a multistream dump;
+        defaults to the number of CPUs
+    @type processes: int
+    @param keep_order: yield the pages of a multistream dump in the order
+        of the dump instead of as soon as they are parsed
+    @type keep_order: bool
+    @param fields: names of the XmlEntry fields to be read; the other
+        fields are left None. The page text is dropped as soon as it is
+        parsed when 'text' is not requested. Defaults to all fields.
+    @type fields: iterable of str
+    @param start: skip all pages before the page with this title. The
+        dump is entered at that page using the multistream index or an
+        XmlDumpIndex, which is built if it does not exist yet.
+    @type start: str
+    @param start_id: skip all pages before the page with this id
+    @type start_id: int or str
+    @raises ValueError: a field is not an XmlEntry field
     """
 
-    def __init__(self, filename, allrevisions=False):
+    def __init__(self, filename, allrevisions=False, index=None,
+                 processes=None, keep_order=True, fields=None, start=None,
+                 start_id=None):
         """Initializer."""
         self.filename = filename
+        self.allrevisions = allrevisions
+        if fields is None:
+            self.fields = frozenset(XmlEntry.__slots__)
+        else:
+            self.fields = frozenset(fields)
+            unknown = self.fields.difference(XmlEntry.__slots__)
+            if unknown:
+                raise ValueError('Unknown XmlEntry fields: {0}'.format(
+                    ', '.join(sorted(unknown))))
+        self.start = start
+        self.start_id = None if start_id is None else '{0}'.format(start_id)
+        if start is not None:
+            self.fields |= {'title'}
+        elif start_id is not None:
+            self.fields |= {'id'}
+        self.index = index
+        self.processes = processes or multiprocessing.cpu_count()
+        self.keep_order = keep_order
         if allrevisions:
             self._parse = self._parse_all
         else:
             self._parse = self._parse_only_latest
 
     def parse(self):
+        """
+        Return a generator over the entries of the dump.
+
+        @rtype: generator of XmlEntry
+        """
+        if self.index:
+            entries = self._parse_multistream()
+        else:
+            entries = self._parse_file()
+        if self.start is None and self.start_id is None:
+            return entries
+        return self._skip(entries)
+
+    def _skip(self, entries):
+        """Skip the entries before the start page."""
+        for entry in entries:
+            if self.start is not None:
+                if entry.title == self.start:
+                    break
+            elif entry.id == self.start_id:
+                break
+        else:
+            return
+        yield entry
+        for entry in entries:
+            yield entry
+
+    def _parse_file(self):
         """Generator using cElementTree iterparse function."""
-        with open_archive(self.filename) as source:
-            # iterparse's event must be a str but they are unicode with
-            # unicode_literals in Python 2
-            context = iterparse(source, events=(str('start'), str('end'),
-                                                str('start-ns')))
-            self.root = None
-
-            for event, elem in context:
-                if event == 'start-ns' and elem[0] == '':
-                    self.uri = elem[1]
-                    continue
-                if event == 'start' and self.root is None:
-                    self.root = elem
-                    continue
-                for rev in self._parse(event, elem):
+        source = self._seek()
+        if source is not None:
+            with source:
+                for rev in self._parse_source(source):
                     yield rev
+            return
+
+        with open_archive(self.filename) as source:
+            for rev in self._parse_source(source):
+                yield rev
+
+    def _seek(self):
+        """
+        Return the dump from the start page on using an XmlDumpIndex.
+
+        @return: a file-like object or None if the start page cannot be
+            reached by seeking
+        """
+        if ((self.start is None and self.start_id is None)
+                or not XmlDumpIndex.supports(self.filename)):
+            return None
+        page_index = XmlDumpIndex(self.filename)
+        try:
+            if not page_index.is_current():
+                pywikibot.output('Building the page index of {0}'
+                                 .format(self.filename))
+                page_index.build()
+            offset = page_index.lookup(self.start, self.start_id)
+            first = page_index.first_offset()
+        except (sqlite3.Error, IOError, OSError) as e:
+            pywikibot.warning('Cannot use the page index of {0}: {1}'
+                              .format(self.filename, e))
+            return None
+        finally:
+            page_index.close()
+        if not first or offset is None or offset <= first:
+            return None
+
+        # the header contains the root element and the siteinfo
+        with open(self.filename, 'rb') as f:
+            header = f.read(first)
+        if page_index.compressed:
+            header = _decompress(header)
+        return _StreamReader(chain(
+            [header], (data for _, data, _ in page_index.chunks(offset))))
+
+    def _parse_source(self, source):
+        """Parse XML from a file-like object."""
+        # iterparse's event must be a str but they are unicode with
+        # unicode_literals in Python 2
+        context = iterparse(source, events=(str('start'), str('end'),
+                                            str('start-ns')))
+        self.root = None
+        text_tag = None
+
+        for event, elem in context:
+            if event == 'start-ns' and elem[0] == '':
+                self.uri = elem[1]
+                if 'text' not in self.fields:
+                    text_tag = '{%s}text' % self.uri
+                continue
+            if event == 'end' and elem.tag == text_tag:
+                # drop the text before the page or revision is complete
+                elem.text = None
+                continue
+            if event == 'start' and self.root is None:
+                self.root = elem
+                continue
+            for rev in self._parse(event, elem):
+                yield rev
+
+    def _streams(self):
+        """
+        Read the offsets and lengths of the streams from the index.
+
+        The length of the last stream is None as it extends to the end of
+        the dump.
+
+        @return: the streams and the offset of the stream containing the
+            start page, if any
+        @rtype: tuple of list of tuple and int
+        """
+        offsets = []
+        start = None
+        with open_archive(self.index, use_extension=False) as index:
+            for line in index:
+                offset, pageid, title = line.rstrip(b'\r\n').split(b':', 2)
+                offset = int(offset)
+                if start is None and (
+                        title.decode('utf-8') == self.start
+                        or pageid.decode('ascii') == self.start_id):
+                    start = offset
+                if not offsets or offsets[-1] != offset:
+                    offsets.append(offset)
+        return [(offset, offsets[i + 1] - offset
+                 if i + 1 < len(offsets) else None)
+                for i, offset in enumerate(offsets)], start
+
+    def _parse_multistream(self):
+        """Parse the streams of a multistream dump in a process pool."""
+        streams, start = self._streams()
+        if not streams:
+            return
+        # the first stream contains the root element and the siteinfo
+        header = _read_stream(self.filename, 0, streams[0][0])
+        self.uri = re.search(br'xmlns="([^"]+)"',
+                             header).group(1).decode('utf-8')
+        if start is not None:
+            streams = [stream for stream in streams if stream[0] >= start]
+
+        # limit the number of parsed streams waiting to be yielded
+        window = threading.Semaphore(2 * self.processes)
+        stopped = []
+
+        def tasks():
+            for offset, length in streams:
+                window.acquire()
+                if stopped:
+                    return
+                yield (self.filename, offset, length, self.uri,
+                       self.allrevisions, self.fields)
+
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            mapper = pool.imap if self.keep_order else pool.imap_unordered
+            for entries in mapper(_parse_stream, tasks()):
+                window.release()
+                for entry in entries:
+                    yield entry
+        finally:
+            stopped.append(True)
+            window.release()
+            pool.terminate()
+            pool.join()
 
     def _parse_only_latest(self, event, elem):
         """Parser that yields only the latest revision."""
@@ -152,32 +615,50 @@ class XmlDump(object):
             elem.clear()
             self.root.clear()
 
+    def _findtext(self, elem, tag, field):
+        """Return the text of a child element if the field is requested."""
+        if field in self.fields:
+            return elem.findtext('{%s}%s' % (self.uri, tag))
+        return None
+
     def _headers(self, elem):
         """Extract headers from XML chunk."""
-        self.title = elem.findtext('{%s}title' % self.uri)
-        self.ns = elem.findtext('{%s}ns' % self.uri)
-        self.pageid = elem.findtext('{%s}id' % self.uri)
-        self.restrictions = elem.findtext('{%s}restrictions' % self.uri)
-        self.isredirect = elem.findtext('{%s}redirect' % self.uri) is not None
-        self.editRestriction, self.moveRestriction = parseRestrictions(
-            self.restrictions)
+        self.title = self._findtext(elem, 'title', 'title')
+        self.ns = self._findtext(elem, 'ns', 'ns')
+        self.pageid = self._findtext(elem, 'id', 'id')
+        self.isredirect = None
+        if 'isredirect' in self.fields:
+            self.isredirect = elem.find('{%s}redirect' % self.uri) is not None
+        self.restrictions = None
+        self.editRestriction = self.moveRestriction = None
+        if not self.fields.isdisjoint(('editRestriction', 'moveRestriction')):
+            self.restrictions = elem.findtext('{%s}restrictions' % self.uri)
+            self.editRestriction, self.moveRestriction = parseRestrictions(
+                self.restrictions)
 
     def _create_revision(self, revision):
         """Create a Single revision."""
-        revisionid = revision.findtext('{%s}id' % self.uri)
-        timestamp = revision.findtext('{%s}timestamp' % self.uri)
-        comment = revision.findtext('{%s}comment' % self.uri)
-        contributor = revision.find('{%s}contributor' % self.uri)
-        ipeditor = contributor.findtext('{%s}ip' % self.uri)
-        username = ipeditor or contributor.findtext('{%s}username' % self.uri)
+        revisionid = self._findtext(revision, 'id', 'revisionid')
+        timestamp = self._findtext(revision, 'timestamp', 'timestamp')
+        comment = self._findtext(revision, 'comment', 'comment')
+        ipedit = username = None
+        if not self.fields.isdisjoint(('username', 'ipedit')):
+            contributor = revision.find('{%s}contributor' % self.uri)
+            ipeditor = contributor.findtext('{%s}ip' % self.uri)
+            username = ipeditor or contributor.findtext(
+                '{%s}username' % self.uri)
+            ipedit = bool(ipeditor)
+            username = username or ''  # username might be deleted
         # could get comment, minor as well
-        text = revision.findtext('{%s}text' % self.uri)
+        text = None
+        if 'text' in self.fields:
+            text = revision.findtext('{%s}text' % self.uri) or ''
         return XmlEntry(title=self.title,
                         ns=self.ns,
                         id=self.pageid,
-                        text=text or '',
-                        username=username or '',  # username might be deleted
-                        ipedit=bool(ipeditor),
+                        text=text,
+                        username=username,
+                        ipedit=ipedit,
                         timestamp=timestamp,
                         editRestriction=self.editRestriction,
                         moveRestriction=self.moveRestriction,
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of pywikibot functions on real pages.
+
+Syntax:
+
+    python pwb.py benchmark templates [-repeat:n] [-file:path ...]
+        [-page:title ...] [-nested:n]
+
+    python pwb.py benchmark claims [-repeat:n] [-file:path ...]
+
+    python pwb.py benchmark diff [-repeat:n] [-file:path ...]
+
+The following benchmarks are available:
+
+templates      Time the backends of textlib.extract_templates_and_params:
+               the regex and stack based parsers and mwparserfromhell,
+               if it is installed.
+
+claims         Measure the memory used by the claims of recorded entity
+               JSON, either of a single entity or a wbgetentities result.
+               It requires Python 3.4 or later.
+
+diff           Time the JSON diff of an entity to its content after one
+               label was changed, with the recorded changes and by
+               comparing all of the content.
+
+The following parameters are supported:
+
+-repeat:n      Number of times each function is called on each page.
+               Default is 10. For claims, the number of copies of the
+               entities which are loaded.
+
+-file:path     Use the wikitext or entity JSON of a local file. Can be
+               given multiple times.
+
+-page:title    Use the wikitext of a page of the default site. Can be given
+               multiple times.
+
+-nested:n      Use a generated text with n templates, each containing
+               another template.
+
+If neither -file, -page nor -nested is given, the help page or the item
+stored with the tests is used.
+"""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import codecs
+import copy
+import json
+import os.path
+import timeit
+
+import pywikibot
+
+from pywikibot import textlib
+
+try:
+    import mwparserfromhell
+except ImportError as e:
+    mwparserfromhell = e
+
+try:
+    import tracemalloc
+except ImportError as e:
+    tracemalloc = e
+
+_pages_path = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                           'tests', 'pages')
+_default_file = os.path.join(_pages_path, 'enwiki_help_editing.page')
+_default_entity_file = os.path.join(_pages_path, 'Q60.wd')
+
+
+def _template_backends():
+    """Return the backends of extract_templates_and_params."""
+    backends = [
+        ('regex', lambda text: textlib.extract_templates_and_params_regex(
+            text, False, True)),
+        ('stack', lambda text: textlib.extract_templates_and_params_stack(
+            text, True)),
+    ]
+    if not isinstance(mwparserfromhell, Exception):
+        backends.append(
+            ('mwparserfromhell',
+             lambda text: textlib.extract_templates_and_params_mwpfh(
+                 text, True)))
+    return backends
+
+
+def benchmark_templates(texts, repeat):
+    """
+    Time the template parsers on each text.
+
+    @param texts: the name and the wikitext of the pages
+    @type texts: list of tuple
+    @param repeat: number of calls per page and parser
+    @type repeat: int
+    """
+    backends = _template_backends()
+    for name, text in texts:
+        text = textlib.removeDisabledParts(text)
+        pywikibot.output('{0} ({1} characters):'.format(name, len(text)))
+        for backend, func in backends:
+            templates = len(func(text))
+            seconds = min(timeit.repeat(lambda: func(text), number=1,
+                                        repeat=repeat))
+            pywikibot.output('    {0:<18} {1:9.2f} ms {2:6} templates'
+                             .format(backend, seconds * 1000, templates))
+
+
+def benchmark_claims(texts, repo, repeat):
+    """
+    Measure the memory used by the claims of entities.
+
+    Each copy of the entities is decoded separately like entities loaded
+    from the API. The memory still used after the JSON is released is
+    reported.
+
+    @param texts: the name and the JSON of a single entity or of the
+        result of wbgetentities
+    @type texts: list of tuple
+    @param repo: the Wikibase site of the entities
+    @type repo: pywikibot.site.DataSite
+    @param repeat: number of copies of the entities
+    @type repeat: int
+    """
+    if isinstance(tracemalloc, Exception):
+        pywikibot.error('The claims benchmark requires tracemalloc.')
+        return
+    for name, text in texts:
+        tracemalloc.start()
+        copies = [json.loads(text) for _ in range(repeat)]
+        entities = [entity for data in copies
+                    for entity in (data['entities'].values()
+                                   if 'entities' in data else [data])]
+        start = timeit.default_timer()
+        claims = [pywikibot.Claim.fromJSON(repo, claim)
+                  for entity in entities
+                  for prop_claims in entity.get('claims', {}).values()
+                  for claim in prop_claims]
+        seconds = timeit.default_timer() - start
+        del copies, entities
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        pywikibot.output(
+            '{0}: {1} claims, {2:.1f} KiB, {3:.0f} bytes per claim, '
+            '{4:.2f} ms'.format(name, len(claims), size / 1024,
+                                size / max(len(claims), 1), seconds * 1000))
+
+
+def benchmark_diff(texts, repo, repeat):
+    """
+    Time the JSON diff of entities after changing one label.
+
+    @param texts: the name and the JSON of a single entity or of the
+        result of wbgetentities
+    @type texts: list of tuple
+    @param repo: the Wikibase site of the entities
+    @type repo: pywikibot.site.DataSite
+    @param repeat: number of diffs per entity and method
+    @type repeat: int
+    """
+    for name, text in texts:
+        data = json.loads(text)
+        for content in (data['entities'].values()
+                        if 'entities' in data else [data]):
+            if content.get('type') == 'property':
+                entity = pywikibot.PropertyPage(repo, content['id'])
+            else:
+                entity = pywikibot.ItemPage(repo, content['id'])
+            entity._content = content
+            entity.get()
+            entity.labels['en'] = entity.labels.get('en', '') + ' (diff)'
+            full = copy.deepcopy(content)
+            size = sum(len(content.get(key, {})) for key in (
+                'labels', 'descriptions', 'aliases', 'sitelinks'))
+            size += sum(map(len, content.get('claims', {}).values()))
+            pywikibot.output('{0} {1} ({2} values):'.format(
+                name, content['id'], size))
+            for method, diffto in (('recorded', content), ('full', full)):
+                seconds = min(timeit.repeat(
+                    lambda: entity.toJSON(diffto=diffto), number=1,
+                    repeat=repeat))
+                pywikibot.output('    {0:<18} {1:9.3f} ms'
+                                 .format(method, seconds * 1000))
+
+
+def main(*args):
+    """
+    Process command line arguments and run a benchmark.
+
+    If args is an empty list, sys.argv is used.
+
+    @param args: command line arguments
+    @type args: str
+    """
+    benchmark = None
+    repeat = 10
+    files = []
+    titles = []
+    nested = 0
+    for arg in pywikibot.handle_args(args):
+        option, _, value = arg.partition(':')
+        if option == '-repeat':
+            repeat = int(value)
+        elif option == '-file':
+            files.append(value)
+        elif option == '-page':
+            titles.append(value)
+        elif option == '-nested':
+            nested = int(value)
+        elif not arg.startswith('-'):
+            benchmark = arg
+
+    if benchmark not in ('templates', 'claims', 'diff'):
+        pywikibot.bot.suggest_help(missing_action=True)
+        return
+
+    if benchmark in ('claims', 'diff'):
+        if not files:
+            files.append(_default_entity_file)
+        texts = []
+        for filename in files:
+            with codecs.open(filename, 'r', 'utf-8') as f:
+                texts.append((os.path.basename(filename), f.read()))
+        repo = pywikibot.Site().data_repository()
+        if benchmark == 'claims':
+            benchmark_claims(texts, repo, repeat)
+        else:
+            benchmark_diff(texts, repo, repeat)
+        return
+
+    if not files and not titles and not nested:
+        files.append(_default_file)
+    texts = []
+    if nested:
+        texts.append(('{0} nested templates'.format(nested), ''.join(
+            '{{{{a{0}|b={1}|c={{{{d{0}|e}}}}}}}}\n'.format(i, 'x' * 20)
+            for i in range(nested))))
+    for filename in files:
+        with codecs.open(filename, 'r', 'utf-8') as f:
+            texts.append((os.path.basename(filename), f.read()))
+    for title in titles:
+        page = pywikibot.Page(pywikibot.Site(), title)
+        texts.append((page.title(), page.text))
+    benchmark_templates(texts, repeat)
+
+
+if __name__ == '__main__':
+    main()
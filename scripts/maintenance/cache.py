@@ -79,6 +79,7 @@ import pickle
 import pywikibot
 
 from pywikibot.data import api
+from pywikibot.data.apicache import CacheStore
 
 # The follow attributes are used by eval()
 from pywikibot.page import User
@@ -105,10 +106,18 @@ class CacheEntry(api.CachedRequest):
 
     """A Request cache entry."""
 
-    def __init__(self, directory, filename):
-        """Initializer."""
+    def __init__(self, directory, filename, store=None):
+        """Initializer.
+
+        @param directory: directory of the cache
+        @param filename: key of the entry in the store or name of the file
+            in the former one file per entry cache
+        @param store: the store holding the entry; None for a file
+        @type store: pywikibot.data.apicache.CacheStore
+        """
         self.directory = directory
         self.filename = filename
+        self.store = store
 
     def __str__(self):
         """Return string equivalent of object."""
@@ -116,6 +125,8 @@ class CacheEntry(api.CachedRequest):
 
     def __repr__(self):
         """Representation of object."""
+        if self.store:
+            return '{0}#{1}'.format(self.store.path, self.filename)
         return self._cachefile_path()
 
     def _create_file_name(self):
@@ -133,8 +144,17 @@ class CacheEntry(api.CachedRequest):
 
     def _load_cache(self):
         """Load the cache entry."""
-        with open(self._cachefile_path(), 'rb') as f:
-            self.key, self._data, self._cachetime = pickle.load(f)
+        if self.store:
+            record = self.store.get(self.filename, touch=False)
+            if record is None:
+                raise ValueError('No entry {0} in {1}'
+                                 .format(self.filename, self.store.path))
+            self.key, self._data = record.uniquedesc, record.data
+            self._cachetime = record.cachetime
+            self.accesstime = record.accesstime
+        else:
+            with open(self._cachefile_path(), 'rb') as f:
+                self.key, self._data, self._cachetime = pickle.load(f)
         return True
 
     def parse_key(self):
@@ -218,7 +238,10 @@ class CacheEntry(api.CachedRequest):
 
     def _delete(self):
         """Delete the cache entry."""
-        os.remove(self._cachefile_path())
+        if self.store:
+            self.store.delete(self.filename)
+        else:
+            os.remove(self._cachefile_path())
 
 
 def process_entries(cache_path, func, use_accesstime=None, output_func=None,
@@ -226,7 +249,9 @@ def process_entries(cache_path, func, use_accesstime=None, output_func=None,
     """
     Check the contents of the cache.
 
-    This program tries to use file access times to determine
+    Entries of the cache store record their last access time. For
+    files of the former one file per entry cache, this program
+    tries to use file access times to determine
     whether cache files are being used.
     However file access times are not always usable.
     On many modern filesystems, they have been disabled.
@@ -248,19 +273,31 @@ def process_entries(cache_path, func, use_accesstime=None, output_func=None,
         return
 
     if os.path.isdir(cache_path):
+        cache_dir = cache_path
         filenames = [os.path.join(cache_path, filename)
-                     for filename in os.listdir(cache_path)]
+                     for filename in os.listdir(cache_path)
+                     if '.sqlite3' not in filename]
+    elif os.path.basename(cache_path) == CacheStore.filename:
+        cache_dir = os.path.dirname(cache_path)
+        filenames = []
     else:
+        cache_dir = None
         filenames = [cache_path]
 
-    for filepath in filenames:
-        filename = os.path.basename(filepath)
-        cache_dir = os.path.dirname(filepath)
-        if use_accesstime is not False:
+    entries = []
+    if cache_dir and os.path.exists(
+            os.path.join(cache_dir, CacheStore.filename)):
+        store = CacheStore(cache_dir)
+        entries += [(CacheEntry(cache_dir, key, store), None)
+                    for key in store.keys()]
+    entries += [(CacheEntry(os.path.dirname(filepath),
+                            os.path.basename(filepath)), filepath)
+                for filepath in filenames]
+
+    for entry, filepath in entries:
+        if filepath and use_accesstime is not False:
             stinfo = os.stat(filepath)
 
-        entry = CacheEntry(cache_dir, filename)
-
         # Deletion is chosen only, abbreviate this request
         if func is None and output_func is None \
            and action_func == CacheEntry._delete:
@@ -283,11 +320,11 @@ def process_entries(cache_path, func, use_accesstime=None, output_func=None,
             pywikibot.exception(e, tb=True)
             continue
 
-        if use_accesstime is None:
+        if filepath and use_accesstime is None:
             stinfo2 = os.stat(filepath)
             use_accesstime = stinfo.st_atime != stinfo2.st_atime
 
-        if use_accesstime:
+        if filepath and use_accesstime:
             # Reset access times to values before loading cache entry.
             os.utime(filepath, (stinfo.st_atime, stinfo.st_mtime))
             entry.stinfo = stinfo
@@ -357,6 +394,11 @@ def empty_response(entry):
 
 def not_accessed(entry):
     """Entry has never been accessed."""
+    if hasattr(entry, 'accesstime'):
+        if entry.accesstime <= entry._cachetime:
+            return entry
+        return
+
     if not hasattr(entry, 'stinfo'):
         return
 
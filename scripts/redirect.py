@@ -29,6 +29,8 @@ and arguments can be:
 -xml           Retrieve information from a local XML dump
                (https://dumps.wikimedia.org). Argument can also be given as
                "-xml:filename.xml". Cannot be used with -fullscan or -moves.
+               The redirects are read from the tables of the dump, which are
+               built next to the dump on first use.
 
 -fullscan      Retrieve redirect pages from live wiki, not from a special page
                Cannot be used with -xml.
@@ -83,18 +85,14 @@ import datetime
 
 import pywikibot
 
-from pywikibot import i18n, xmlreader
+from pywikibot import i18n
+from pywikibot.dumptables import DumpTables
 from pywikibot.bot import (OptionHandler, SingleSiteBot, ExistingPageBot,
                            RedirectPageBot)
 from pywikibot.exceptions import ArgumentDeprecationWarning
+from pywikibot.redirectgraph import RedirectGraph
 from pywikibot.textlib import extract_templates_and_params_regex_simple
-from pywikibot.tools import issue_deprecation_warning, UnicodeType
-
-
-def space_to_underscore(link):
-    """Convert spaces to underscore."""
-    # previous versions weren't expecting spaces but underscores
-    return link.canonical_title().replace(' ', '_')
+from pywikibot.tools import deprecated, issue_deprecation_warning, UnicodeType
 
 
 class RedirectGenerator(OptionHandler):
@@ -136,70 +134,51 @@ class RedirectGenerator(OptionHandler):
         elif action == 'both':
             cls.__iter__ = lambda slf: slf.get_redirects_via_api(maxlen=2)
 
+    @deprecated('get_redirect_graph_from_dump()', since='20191018')
     def get_redirects_from_dump(self, alsoGetPageTitles=False):
         """
-        Extract redirects from dump.
+        DEPRECATED: Extract redirects from dump.
 
-        Load a local XML dump file, look at all pages which have the
-        redirect flag set, and find out where they're pointing at. Return
-        a dictionary where the redirect names are the keys and the redirect
-        targets are the values.
+        Read the redirects and their targets from the tables of a local XML
+        dump, which are built on first use. Redirects to other sites are
+        ignored. Return a dictionary where the redirect names are the keys
+        and the redirect targets are the values.
         """
-        xmlFilename = self.xmlFilename
-        redict = {}
-        # open xml dump and read page titles out of it
-        dump = xmlreader.XmlDump(xmlFilename)
-        redirR = self.site.redirectRegex()
-        readPagesCount = 0
-        if alsoGetPageTitles:
-            pageTitles = set()
-        for entry in dump.parse():
-            readPagesCount += 1
-            # always print status message after 10000 pages
-            if readPagesCount % 10000 == 0:
-                pywikibot.output('{0} pages read...'.format(readPagesCount))
-            if len(self.namespaces) > 0:
-                if pywikibot.Page(self.site, entry.title).namespace() \
-                        not in self.namespaces:
-                    continue
-            if alsoGetPageTitles:
-                pageTitles.add(space_to_underscore(pywikibot.Link(entry.title,
-                                                                  self.site)))
-
-            m = redirR.match(entry.text)
-            if m:
-                target = m.group(1)
-                # There might be redirects to another wiki. Ignore these.
-                target_link = pywikibot.Link(target, self.site)
-                try:
-                    target_link.parse()
-                except pywikibot.SiteDefinitionError as e:
-                    pywikibot.log(e)
-                    pywikibot.output(
-                        'NOTE: Ignoring {0} which is a redirect ({1}) to an '
-                        'unknown site.'.format(entry.title, target))
-                    target_link = None
-                else:
-                    if target_link.site != self.site:
-                        pywikibot.output(
-                            'NOTE: Ignoring {0} which is a redirect to '
-                            'another site {1}.'
-                            .format(entry.title, target_link.site))
-                        target_link = None
-                # if the redirect does not link to another wiki
-                if target_link and target_link.title:
-                    source = pywikibot.Link(entry.title, self.site)
-                    if target_link.anchor:
-                        pywikibot.output(
-                            'HINT: {0} is a redirect with a pipelink.'
-                            .format(entry.title))
-                    redict[space_to_underscore(source)] = (
-                        space_to_underscore(target_link))
+        tables = self._load_tables()
+        namespaces = self.namespaces or None
+        redict = {source.replace(' ', '_'): target.replace(' ', '_')
+                  for source, target in tables.redirect_pairs(namespaces)}
         if alsoGetPageTitles:
+            pageTitles = {title.replace(' ', '_')
+                          for title in tables.pages(namespaces)}
             return redict, pageTitles
         else:
             return redict
 
+    def get_redirect_graph_from_dump(self):
+        """
+        Return the redirect graph of a local XML dump.
+
+        Only pages and redirects in the selected namespaces are included.
+
+        @rtype: pywikibot.redirectgraph.RedirectGraph
+        """
+        tables = self._load_tables()
+        return RedirectGraph.from_tables(tables, self.namespaces or None)
+
+    def _load_tables(self):
+        """Return the tables of the local XML dump and report its notes."""
+        tables = DumpTables.load(self.xmlFilename, self.site)
+        notes = tables.redirect_notes
+        sites = notes['unknown site'] + notes['other site']
+        if sites:
+            pywikibot.output('NOTE: Ignoring {0} redirects to other or '
+                             'unknown sites.'.format(sites))
+        if notes['anchor']:
+            pywikibot.output('HINT: {0} redirects have a pipelink.'
+                             .format(notes['anchor']))
+        return tables
+
     def get_redirect_pages_via_api(self):
         """Yield Pages that are redirects."""
         for ns in self.namespaces:
@@ -263,32 +242,31 @@ class RedirectGenerator(OptionHandler):
                 raise RuntimeError('API query error: {0}'.format(data))
             if data == [] or 'query' not in data:
                 raise RuntimeError('No results given.')
-            pages = {}
-            redirects = {x['from']: x['to']
-                         for x in data['query']['redirects']}
-
+            graph = RedirectGraph()
+            known = set()
             for pagetitle in data['query']['pages'].values():
-                if 'missing' in pagetitle and 'pageid' not in pagetitle:
-                    pages[pagetitle['title']] = False
-                else:
-                    pages[pagetitle['title']] = True
-            for redirect in redirects:
-                target = redirects[redirect]
-                result = 0
+                known.add(graph.intern(pagetitle['title']))
+                if 'missing' not in pagetitle or 'pageid' in pagetitle:
+                    graph.add_page(pagetitle['title'])
+            redirects = data['query']['redirects']
+            for x in redirects:
+                graph.add_redirect(x['from'], x['to'])
+            for x in redirects:
+                target = graph.id(x['to'])
                 final = None
-                try:
-                    if pages[target]:
-                        final = target
-                        try:
-                            while result <= maxlen:
-                                result += 1
-                                final = redirects[final]
-                            # result = None
-                        except KeyError:
-                            pass
-                except KeyError:
+                if target not in known:
                     result = None
-                yield (redirect, result, target, final)
+                elif not graph.exists[target]:
+                    result = 0
+                else:
+                    length, final_id = graph.chain(target)
+                    if length < 0 or length > maxlen:
+                        # a loop or a chain too long to follow
+                        result = maxlen + 1
+                    else:
+                        result = length + 1
+                        final = graph.titles[final_id]
+                yield (x['from'], result, x['to'], final)
 
     def retrieve_broken_redirects(self):
         """Retrieve broken redirects."""
@@ -306,11 +284,9 @@ class RedirectGenerator(OptionHandler):
             # retrieve information from XML dump
             pywikibot.output(
                 'Getting a list of all redirects and of all page titles...')
-            redirs, pageTitles = self.get_redirects_from_dump(
-                alsoGetPageTitles=True)
-            for (key, value) in redirs.items():
-                if value not in pageTitles:
-                    yield key
+            graph = self.get_redirect_graph_from_dump()
+            for title_id in graph.broken():
+                yield graph.titles[title_id].replace(' ', '_')
         elif self.page_title:
             yield self.page_title
         else:
@@ -334,15 +310,16 @@ class RedirectGenerator(OptionHandler):
                         if count >= self.api_number:
                             break
         elif self.xmlFilename:
-            redict = self.get_redirects_from_dump()
-            total = len(redict)
-            for num, (key, value) in enumerate(redict.items(), start=1):
-                # check if the value - that is, the redirect target - is a
-                # redirect as well
-                if num > self.offset and value in redict:
+            graph = self.get_redirect_graph_from_dump()
+            redirects = list(graph.redirects())
+            total = len(redirects)
+            for num, title_id in enumerate(redirects, start=1):
+                # check if the redirect target is a redirect as well
+                if num > self.offset and graph.is_redirect(
+                        graph.targets[title_id]):
                     pywikibot.output('\nChecking redirect {0} of {1}...'
                                      .format(num, total))
-                    yield key
+                    yield graph.titles[title_id].replace(' ', '_')
         elif self.page_title:
             yield self.page_title
         else:
@@ -33,7 +33,9 @@ Furthermore, the following command line parameters are supported:
 
 -xmlstart         (Only works with -xml) Skip all articles in the XML dump
                   before the one specified (may also be given as
-                  -xmlstart:Article).
+                  -xmlstart:Article). On first use an index of the pages is
+                  built next to an uncompressed or bz2 multistream dump, so
+                  that reading starts directly at that article.
 
 -addcat:cat_name  Adds "cat_name" category to every altered page.
 
@@ -148,6 +150,7 @@ try:
     from collections.abc import Sequence
 except ImportError:  # Python 2.7
     from collections import Sequence
+from collections import OrderedDict
 import re
 import warnings
 
@@ -195,6 +198,75 @@ def precompile_exceptions(exceptions, use_regex, flags):
             exceptions[exceptionCategory] = patterns
 
 
+_uncombinable = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?[aiLmsux]+\)')
+
+
+def _literal(pattern):
+    """Return the text matched by a pattern without metacharacters."""
+    text = re.sub(r'\\(.)', r'\1', pattern, flags=re.S)
+    return text if re.escape(text) == pattern else None
+
+
+def _trie_pattern(literals):
+    """Return a pattern matching any of the literals built from a trie."""
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def pattern(node):
+        parts = []
+        # follow the chain of characters without branches
+        while len(node) == 1 and '' not in node:
+            char, node = next(iter(node.items()))
+            parts.append(re.escape(char))
+        if node and list(node) != ['']:
+            alternatives = [re.escape(char) + pattern(child)
+                            for char, child in sorted(node.items()) if char]
+            parts.append('(?:{0}){1}'.format('|'.join(alternatives),
+                                             '?' if '' in node else ''))
+        return ''.join(parts)
+
+    return pattern(trie)
+
+
+def combine_regexes(regexes):
+    """
+    Combine regular expressions so that a text is searched in few passes.
+
+    A text matches any of the combined expressions iff it matches one of
+    the given ones. The patterns are grouped by their flags. Literal
+    patterns of a group are merged into a trie, so that alternatives with a
+    common prefix are not tried one after another, and joined with the
+    other patterns into one alternation. Patterns with back references,
+    named groups or inline flags are kept on their own.
+
+    @param regexes: compiled regular expressions
+    @type regexes: iterable of re.RegexObject
+    @rtype: list of re.RegexObject
+    """
+    combined = []
+    groups = OrderedDict()
+    for regex in regexes:
+        if _uncombinable.search(regex.pattern):
+            combined.append(regex)
+        else:
+            groups.setdefault(regex.flags, []).append(regex.pattern)
+    for flags, patterns in groups.items():
+        literals = [text for text in map(_literal, patterns)
+                    if text is not None]
+        patterns = [pattern for pattern in patterns
+                    if _literal(pattern) is None]
+        if literals:
+            patterns.append(_trie_pattern(literals))
+        combined.append(re.compile(
+            '|'.join('(?:{0})'.format(pattern) for pattern in patterns),
+            flags))
+    return combined
+
+
 def _get_text_exceptions(exceptions):
     """Get exceptions on text (inside exceptions)."""
     return exceptions.get('inside-tags', []) + exceptions.get('inside', [])
@@ -423,7 +495,6 @@ class XmlDumpReplacePageGenerator(object):
         self.replacements = replacements
         self.exceptions = exceptions
         self.xmlStart = xmlStart
-        self.skipping = bool(xmlStart)
 
         self.excsInside = []
         if 'inside-tags' in self.exceptions:
@@ -435,19 +506,22 @@ class XmlDumpReplacePageGenerator(object):
             self.site = site
         else:
             self.site = pywikibot.Site()
-        dump = xmlreader.XmlDump(self.xmlFilename)
+        dump = xmlreader.XmlDump(self.xmlFilename, start=xmlStart or None)
         self.parser = dump.parse()
+        self.prefilter = combine_regexes(
+            replacement.old_regex for replacement in self.replacements)
 
     def __iter__(self):
         """Iterator method."""
         try:
             for entry in self.parser:
-                if self.skipping:
-                    if entry.title != self.xmlStart:
-                        continue
-                    self.skipping = False
-                if self.isTitleExcepted(entry.title) \
-                        or self.isTextExcepted(entry.text):
+                if self.isTitleExcepted(entry.title):
+                    continue
+                # the replacements can only apply if one of them matches
+                if not any(regex.search(entry.text)
+                           for regex in self.prefilter):
+                    continue
+                if self.isTextExcepted(entry.text):
                     continue
                 new_text = entry.text
                 for replacement in self.replacements:
@@ -462,10 +536,9 @@ class XmlDumpReplacePageGenerator(object):
 
         except KeyboardInterrupt:
             try:
-                if not self.skipping:
-                    pywikibot.output(
-                        'To resume, use "-xmlstart:{0}" on the command line.'
-                        .format(entry.title))
+                pywikibot.output(
+                    'To resume, use "-xmlstart:{0}" on the command line.'
+                    .format(entry.title))
             except NameError:
                 pass
 
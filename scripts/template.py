@@ -33,7 +33,9 @@ Command line options:
 -xml         retrieve information from a local dump
              (https://dumps.wikimedia.org). If this argument isn't given,
              info will be loaded from the maintenance page of the live wiki.
-             argument can also be given as "-xml:filename.xml".
+             argument can also be given as "-xml:filename.xml". The pages
+             are read from the tables of the dump, which are built next to
+             the dump on first use.
 
 -onlyuser:   Only process pages edited by a given user
 
@@ -346,11 +348,8 @@ def main(*args):
         old_templates.append(old_template)
 
     if xmlfilename:
-        builder = textlib._MultiTemplateMatchBuilder(site)
-        predicate = builder.search_any_predicate(old_templates)
-
-        gen = XMLDumpPageGenerator(
-            xmlfilename, site=site, text_predicate=predicate)
+        gen = pagegenerators.XMLDumpTablesPageGenerator(
+            xmlfilename, site=site, templates=old_templates)
     else:
         gen = gen_factory.getCombinedGenerator()
 
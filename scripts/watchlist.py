@@ -24,8 +24,6 @@ Command line options:
 #
 from __future__ import absolute_import, division, unicode_literals
 
-import os
-
 import pywikibot
 
 from pywikibot import config
@@ -57,11 +55,10 @@ def refresh(site, sysop=False):
 
 def refresh_all(sysop=False):
     """Reload watchlists for all wikis where a watchlist is already present."""
-    cache_path = CachedRequest._get_cache_dir()
-    files = os.listdir(cache_path)
+    store = CachedRequest._get_cache()
     seen = set()
-    for filename in files:
-        entry = CacheEntry(cache_path, filename)
+    for key in store.keys():
+        entry = CacheEntry(store.directory, key, store)
         entry._load_cache()
         entry.parse_key()
         entry._rebuild()
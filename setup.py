@@ -54,6 +54,7 @@ extra_deps = {
     'mwoauth': ['mwoauth!=0.3.1,>=0.2.4'],
     'html': ['BeautifulSoup4'],
     'http': ['fake_useragent'],
+    'zstd': ['zstandard'],
     'flake8': [  # Due to incompatibilities between packages the order matters.
         'flake8>=3.7.5',
         'pydocstyle<=3.0.0;python_version<"3"',
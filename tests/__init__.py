@@ -78,6 +78,7 @@ library_test_modules = [
     'ui',
     'ui_options',
     'thread',
+    'throttle',
     'tests',
     'date',
     'timestamp',
@@ -86,6 +87,8 @@ library_test_modules = [
     'tools_chars',
     'tools_ip',
     'xmlreader',
+    'dumptables',
+    'redirectgraph',
     'textlib',
     'diff',
     'http',
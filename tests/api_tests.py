@@ -9,6 +9,7 @@ from __future__ import absolute_import, division, unicode_literals
 
 from collections import defaultdict
 import datetime
+import threading
 import types
 
 import pywikibot.data.api as api
@@ -21,6 +22,7 @@ from pywikibot.throttle import Throttle
 from pywikibot.tools import (
     suppress_warnings,
     PY2,
+    PYTHON_VERSION,
     UnicodeType,
 )
 
@@ -670,6 +672,25 @@ class TestDryPageGenerator(TestCase):
         self.gen.set_maximum_items(-1)
         self.assertPageTitlesEqual(self.gen, self.titles)
 
+    @unittest.skipIf(PYTHON_VERSION < (3, 5),
+                     'asynchronous iteration requires Python 3.5+')
+    def test_async_iteration(self):
+        """Test that PageGenerator is iterable within an event loop."""
+        import asyncio
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.gen.set_maximum_items(3)
+        iterator = self.gen.__aiter__()
+        pages = []
+        while True:
+            try:
+                pages.append(loop.run_until_complete(iterator.__anext__()))
+            except StopAsyncIteration:  # noqa: F821
+                break
+        self.assertPageTitlesEqual(pages, self.titles[:3])
+
     def test_namespace(self):
         """Test PageGenerator set_namespace."""
         self.assertRaises(AssertionError, self.gen.set_namespace, 0)
@@ -898,6 +919,83 @@ class TestDryListGenerator(TestCase):
         self.assertIsNone(self.gen.set_namespace(0))
 
 
+class TestDryQueryGeneratorPrefetch(TestCase):
+
+    """Test QueryGenerator retrieving continued responses in advance."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    batches = 5
+    batch_size = 10
+
+    def setUp(self):
+        """Set up test case."""
+        super(TestDryQueryGeneratorPrefetch, self).setUp()
+        mysite = self.get_site()
+        mysite._paraminfo['query+allpages'] = {
+            'prefix': 'ap',
+            'limit': {'max': 10},
+            'namespace': {'multi': True}
+        }
+        mysite._paraminfo.query_modules_with_limits = {'allpages'}
+        self.gen = api.ListGenerator(listaction='allpages', site=mysite)
+        self.submitted = []
+        self.prefetched = threading.Event()
+
+        def submit(request):
+            offset = int(request._params.get('apcontinue', ['0'])[0])
+            limit = int(request['aplimit'][0])
+            self.submitted.append((offset, limit))
+            if len(self.submitted) > 1:
+                self.prefetched.set()
+            data = {'query': {'allpages': [
+                {'pageid': i, 'ns': 0, 'title': 'Page {0}'.format(i)}
+                for i in range(offset, offset + limit)]}}
+            if offset + limit < self.batches * self.batch_size:
+                data['continue'] = {'apcontinue': str(offset + limit),
+                                    'continue': '-||'}
+            return data
+
+        self.gen.request.submit = types.MethodType(submit, self.gen.request)
+
+    def test_prefetch(self):
+        """Test that prefetching yields the same results."""
+        self.gen.set_prefetch(2)
+        results = [item['pageid'] for item in self.gen]
+        self.assertEqual(results, list(range(50)))
+        self.assertEqual(self.submitted,
+                         [(i * 10, 10) for i in range(self.batches)])
+
+    def test_prefetch_limit(self):
+        """Test that prefetching does not exceed the maximum items."""
+        self.gen.set_prefetch(3)
+        self.gen.set_maximum_items(25)
+        results = [item['pageid'] for item in self.gen]
+        self.assertEqual(results, list(range(25)))
+        self.assertEqual(self.submitted, [(0, 10), (10, 10), (20, 5)])
+
+    def test_prefetch_in_advance(self):
+        """Test that the next response is retrieved during iteration."""
+        self.gen.set_prefetch(1)
+        gen = iter(self.gen)
+        self.assertEqual(next(gen)['pageid'], 0)
+        self.assertTrue(self.prefetched.wait(5))
+        self.assertEqual(self.submitted[:2], [(0, 10), (10, 10)])
+        gen.close()
+
+    def test_prefetch_error(self):
+        """Test that errors of a prefetched request are raised."""
+        def submit(request):
+            raise api.APIError('fake', 'Fake error')
+
+        self.gen.request.submit = types.MethodType(submit, self.gen.request)
+        self.gen.set_prefetch(1)
+        self.assertRaises(api.APIError, list, self.gen)
+
+
 class TestCachedRequest(DefaultSiteTestCase):
 
     """Test API Request caching.
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
 """API Request cache tests."""
 #
-# (C) Pywikibot team, 2012-2018
+# (C) Pywikibot team, 2012-2019
 #
 # Distributed under the terms of the MIT license.
 #
 from __future__ import absolute_import, division, unicode_literals
 
+import datetime
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+
+from pywikibot.data.apicache import CacheRecord, CacheStore, MemoryCache
 from pywikibot.site import BaseSite
 
 import scripts.maintenance.cache as cache
@@ -38,5 +46,194 @@ class RequestCacheTests(TestCase):
         cache.process_entries(join_cache_path(), self._check_cache_entry)
 
 
+class CacheStoreTests(TestCase):
+
+    """Test the SQLite cache store."""
+
+    net = False
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        super(CacheStoreTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.store = CacheStore(self.directory)
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        self.store.close()
+        shutil.rmtree(self.directory)
+        super(CacheStoreTests, self).tearDown()
+
+    def test_set_get(self):
+        """Test storing and loading an entry."""
+        cachetime = datetime.datetime(2019, 1, 2, 3, 4, 5, 6000)
+        self.store.set('a', 'desc', {'query': [1, 2]}, cachetime)
+        self.assertIn('a', self.store)
+        self.assertNotIn('b', self.store)
+        self.assertIsNone(self.store.get('b'))
+        record = self.store.get('a', touch=False)
+        self.assertEqual(record.uniquedesc, 'desc')
+        self.assertEqual(record.data, {'query': [1, 2]})
+        self.assertEqual(record.cachetime, cachetime)
+        self.assertEqual(record.accesstime, cachetime)
+        self.store.get('a')
+        self.assertGreater(self.store.get('a').accesstime, cachetime)
+        self.store.delete('a')
+        self.assertLength(self.store, 0)
+
+    def test_evict(self):
+        """Test that the least recently used entries are evicted."""
+        start = datetime.datetime(2019, 1, 1)
+        for i, key in enumerate('abc'):
+            self.store.set(key, key, 'x' * 100,
+                           start + datetime.timedelta(i))
+        size = self.store.get('c', touch=False).size
+        self.assertEqual(self.store.total_size(), 3 * size)
+        self.store.get('a')
+        self.store.max_size = 3 * size
+        self.store.set('d', 'd', 'x' * 100)
+        self.assertCountEqual(self.store.keys(), ['a', 'c', 'd'])
+        self.assertEqual(self.store.keys(least_recent_first=True)[0], 'c')
+        self.assertEqual(self.store.evict(size), 2)
+        self.assertEqual(self.store.keys(), ['d'])
+
+    def test_total_size(self):
+        """Test that the total size follows inserts and deletes."""
+        self.store.set('a', 'a', 'x' * 100)
+        self.store.set('b', 'b', 'x' * 200)
+        self.store.set('a', 'a', 'x' * 300)
+        self.store.delete('b')
+        self.assertEqual(self.store.total_size(),
+                         self.store.get('a', touch=False).size)
+        self.store.close()
+        # a database written without the total size
+        conn = sqlite3.connect(self.store.path)
+        with conn:
+            conn.execute('DROP TABLE meta')
+        conn.close()
+        store = CacheStore(self.directory)
+        self.assertEqual(store.total_size(),
+                         store.get('a', touch=False).size)
+        store.close()
+
+    def test_touch(self):
+        """Test that access times are written in batches."""
+        cachetime = datetime.datetime(2019, 1, 1)
+        self.store.set('a', 'a', None, cachetime)
+        self.store.set('b', 'b', None, cachetime)
+        self.store.touch_batch = 2
+        self.store.get('a')
+        accesstime = self.store.get('a', touch=False).accesstime
+        self.assertGreater(accesstime, cachetime)
+        store = CacheStore(self.directory)
+        self.assertEqual(store.get('a', touch=False).accesstime, cachetime)
+        self.store.touch('b')
+        self.assertEqual(store.get('a', touch=False).accesstime, accesstime)
+        self.assertGreater(store.get('b', touch=False).accesstime, cachetime)
+        store.close()
+
+    def test_expire(self):
+        """Test that old entries are deleted."""
+        start = datetime.datetime(2019, 1, 1)
+        self.store.set('a', 'a', None, start)
+        self.store.set('b', 'b', None, start + datetime.timedelta(2))
+        self.assertEqual(
+            self.store.expire(start + datetime.timedelta(1)), 1)
+        self.assertEqual(self.store.keys(), ['b'])
+
+    def test_migrate(self):
+        """Test importing entries of the file based cache."""
+        key = 'f' * 64
+        cachetime = datetime.datetime(2019, 1, 1)
+        with open(os.path.join(self.directory, key), 'wb') as f:
+            pickle.dump(('desc', {'a': 1}, cachetime), f)
+        with open(os.path.join(self.directory, 'e' * 64), 'wb') as f:
+            f.write(b'invalid')
+        self.assertEqual(self.store.migrate(), 1)
+        self.assertEqual(self.store.get(key).data, {'a': 1})
+        self.assertFalse(os.path.exists(os.path.join(self.directory, key)))
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    'e' * 64)))
+
+    def test_migrate_evict(self):
+        """Test that migrated entries are evicted beyond the size limit."""
+        start = datetime.datetime(2019, 1, 1)
+        for i, key in enumerate('abc'):
+            with open(os.path.join(self.directory, key * 64), 'wb') as f:
+                pickle.dump(('desc', 'x' * 100,
+                             start + datetime.timedelta(i)), f)
+            os.utime(f.name, (0, 0))
+        self.store.max_size = 150
+        self.assertEqual(self.store.migrate(), 3)
+        self.assertEqual(self.store.keys(), ['c' * 64])
+
+    def test_process_entries(self):
+        """Test the maintenance script over the store."""
+        self.store.set('a', "Site('en', 'wikipedia')LoginStatus(NOT_LOGGED_IN)"
+                       "[('action', 'query'), ('meta', 'siteinfo')]", {})
+        entries = []
+        cache.process_entries(self.directory, entries.append)
+        self.assertLength(entries, 1)
+        self.assertEqual(entries[0]._params['meta'], ['siteinfo'])
+        self.assertIsNotNone(cache.not_accessed(entries[0]))
+        cache.process_entries(self.directory, None,
+                              action_func=cache.CacheEntry._delete)
+        self.assertLength(self.store, 0)
+
+
+class MemoryCacheTests(TestCase):
+
+    """Test the in-memory LRU memory."""
+
+    net = False
+
+    @staticmethod
+    def _record(key, data):
+        """Return a raw record."""
+        blob = pickle.dumps(data)
+        return CacheRecord(key, key, blob, datetime.datetime.utcnow(),
+                           datetime.datetime.utcnow(), len(blob))
+
+    def test_counters(self):
+        """Test hit and miss counters and fresh copies of the data."""
+        memory = MemoryCache(10, 10000)
+        self.assertIsNone(memory.get('a'))
+        memory.set(self._record('a', {'a': [1]}))
+        record = memory.get('a')
+        self.assertEqual(record.data, {'a': [1]})
+        record.data['a'].append(2)
+        self.assertEqual(memory.get('a').data, {'a': [1]})
+        self.assertEqual((memory.hits, memory.misses), (2, 1))
+        memory.clear()
+        self.assertEqual((memory.hits, memory.misses), (0, 0))
+        self.assertLength(memory, 0)
+
+    def test_max_entries(self):
+        """Test that the least recently used entry is dropped."""
+        memory = MemoryCache(2, 10000)
+        memory.set(self._record('a', 1))
+        memory.set(self._record('b', 2))
+        memory.get('a')
+        memory.set(self._record('c', 3))
+        self.assertIsNone(memory.get('b'))
+        self.assertIsNotNone(memory.get('a'))
+        self.assertIsNotNone(memory.get('c'))
+
+    def test_max_size(self):
+        """Test that entries are dropped to stay within the size."""
+        record = self._record('a', 'x' * 100)
+        memory = MemoryCache(10, 2 * record.size)
+        memory.set(record)
+        memory.set(self._record('b', 'y' * 100))
+        memory.set(self._record('c', 'z' * 100))
+        self.assertLength(memory, 2)
+        self.assertEqual(memory.size, 2 * record.size)
+        self.assertIsNone(memory.get('a'))
+        memory.set(self._record('d', 'x' * 1000))
+        self.assertIsNone(memory.get('d'))
+        memory.delete('b')
+        self.assertEqual(memory.size, record.size)
+
+
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
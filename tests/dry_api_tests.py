@@ -8,18 +8,27 @@
 from __future__ import absolute_import, division, unicode_literals
 
 import datetime
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import types
 
 import pywikibot
 from pywikibot.data.api import (
+    AsyncRequest,
     CachedRequest,
     ParamInfo,
     Request,
     QueryGenerator,
 )
+from pywikibot.data.apicache import CacheRecord, MemoryCache
 from pywikibot.family import Family
-from pywikibot.tools import suppress_warnings
+from pywikibot.tools import MediaWikiVersion
+from pywikibot.tools import PYTHON_VERSION, suppress_warnings
 
-from tests import join_images_path, patch
+from tests import join_images_path, mock, patch
 from tests.utils import DummySiteinfo
 from tests.aspects import (
     unittest, TestCase, DefaultDrySiteTestCase, SiteAttributeTestCase,
@@ -95,6 +104,24 @@ class DryCachedRequestTests(SiteAttributeTestCase):
         self.assertNotEqual(self.req._uniquedescriptionstr(),
                             self.diffsite._uniquedescriptionstr())
 
+    def test_memory_cache_touch(self):
+        """Test that a hit of the memory cache is recorded in the store."""
+        self.req._add_defaults()
+        key = self.req._create_file_name()
+        data = pickle.dumps({'query': {}})
+        now = datetime.datetime.utcnow()
+        memory = MemoryCache(10, 10000)
+        memory.set(CacheRecord(key, self.req._uniquedescriptionstr(), data,
+                               now, now, len(data)))
+        store = mock.Mock()
+        with patch.object(CachedRequest, 'memory_cache', memory):
+            with patch.object(CachedRequest, '_get_cache',
+                              return_value=store):
+                self.assertTrue(self.req._load_cache())
+        self.assertEqual(self.req._data, {'query': {}})
+        store.touch.assert_called_once_with(key)
+        self.assertFalse(store.get.called)
+
     def test_get_cache_dir(self):
         """Test that 'apicache' is in the cache dir."""
         retval = self.req._get_cache_dir()
@@ -472,6 +499,112 @@ class ParamInfoDictTests(DefaultDrySiteTestCase):
         self.assertIn('email', param['type'])
 
 
+class ParamInfoSnapshotTests(DefaultDrySiteTestCase):
+
+    """Test the paraminfo snapshot."""
+
+    def setUp(self):
+        """Use a temporary cache directory."""
+        super(ParamInfoSnapshotTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        patcher = patch.object(CachedRequest, '_get_cache_dir',
+                               classmethod(lambda cls: self.directory))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        CachedRequest._get_cache(ParamInfo.snapshot_filename).close()
+        shutil.rmtree(self.directory)
+        super(ParamInfoSnapshotTests, self).tearDown()
+
+    def test_load(self):
+        """Test loading saved modules."""
+        site = self.get_site()
+        ParamInfo(site)._save_snapshot(
+            {'query+info': ParamInfoDictTests.prop_info_param_data})
+        pi = ParamInfo(site)
+        self.assertEqual(pi._load_snapshot({'query+info', 'edit'}),
+                         {'edit'})
+        self.assertEqual(pi._paraminfo['query+info']['prefix'], 'in')
+        self.assertEqual(pi._load_snapshot({'edit'}), {'edit'})
+
+    def test_version(self):
+        """Test that modules of another version are not loaded."""
+        site = self.get_site()
+        ParamInfo(site)._save_snapshot(
+            {'query+info': ParamInfoDictTests.prop_info_param_data})
+        site._mw_version_time = (MediaWikiVersion('1.31'), time.time())
+        pi = ParamInfo(site)
+        self.assertEqual(pi._load_snapshot({'query+info'}), {'query+info'})
+        self.assertNotIn('query+info', pi._paraminfo)
+
+
+class DryAsyncRequestTests(DefaultDrySiteTestCase):
+
+    """Test AsyncRequest without accessing the network."""
+
+    result = {'query': {'userinfo': {'id': 0, 'name': '127.0.0.1'}}}
+
+    def _create_request(self, submit=None):
+        """Create an AsyncRequest with a patched submit method."""
+        req = AsyncRequest(site=self.site,
+                           parameters={'action': 'query', 'meta': 'userinfo'})
+        if submit is None:
+            def submit(request):
+                request.thread = threading.current_thread().name
+                return self.result
+        req.submit = types.MethodType(submit, req)
+        return req
+
+    def test_result(self):
+        """Test that the request is submitted in a background thread."""
+        req = self._create_request()
+        self.assertFalse(req.done())
+        self.assertEqual(req.result(), self.result)
+        self.assertTrue(req.done())
+        self.assertTrue(req.thread.startswith('API-Thread-'))
+        self.assertIs(req.start(), req)  # not submitted again
+
+    def test_exception(self):
+        """Test that exceptions of submit are raised by result."""
+        def submit(request):
+            raise pywikibot.data.api.APIError('fake', 'Fake error')
+
+        req = self._create_request(submit)
+        self.assertRaises(pywikibot.data.api.APIError, req.result)
+
+    def test_callbacks(self):
+        """Test that callbacks get the processed request."""
+        event = threading.Event()
+        results = []
+
+        def callback(request):
+            results.append(request.result())
+            event.set()
+
+        req = self._create_request()
+        req.add_done_callback(callback)
+        req.start()
+        self.assertTrue(event.wait(10))
+        req.add_done_callback(callback)  # invoked immediately
+        self.assertEqual(results, [self.result, self.result])
+
+    @unittest.skipIf(PYTHON_VERSION < (3, 5), 'asyncio await requires 3.5+')
+    def test_await(self):
+        """Test awaiting the request in an asyncio event loop."""
+        import asyncio
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        asyncio.set_event_loop(loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        # requests are mappings and therefore unhashable, wrap them for gather
+        futures = [asyncio.ensure_future(self._create_request(), loop=loop)
+                   for i in range(5)]
+        results = loop.run_until_complete(asyncio.gather(*futures))
+        self.assertEqual(results, [self.result] * 5)
+
+
 class QueryGenTests(DefaultDrySiteTestCase):
 
     """Test QueryGenerator with a real site."""
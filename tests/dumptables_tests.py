@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Tests for the dumptables module."""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import shutil
+import tempfile
+
+import pywikibot
+
+from pywikibot.dumptables import DumpTables
+
+from tests import join_xml_data_path, mock
+from tests.aspects import unittest, DefaultDrySiteTestCase
+
+
+class DumpTablesTestCase(DefaultDrySiteTestCase):
+
+    """Test building and querying the tables of a dump."""
+
+    def setUp(self):
+        """Create a temporary directory for the dumps."""
+        super(DumpTablesTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the dumps and their tables."""
+        shutil.rmtree(self.directory)
+        super(DumpTablesTestCase, self).tearDown()
+
+    def _copy(self, name):
+        """Copy a dump into the temporary directory."""
+        filename = os.path.join(self.directory, name)
+        shutil.copy(join_xml_data_path(name), filename)
+        return filename
+
+    def _check(self, tables):
+        """Check the content of the tables of pair-0.10.xml."""
+        self.assertEqual(list(tables.pages()),
+                         ['Çullu, Agdam', 'Talk:Çullu, Agdam'])
+        self.assertEqual(list(tables.pages([1])), ['Talk:Çullu, Agdam'])
+        self.assertEqual(list(tables.redirect_pairs()), [
+            ('Çullu, Agdam', 'Çullu, Quzanlı'),
+            ('Talk:Çullu, Agdam', 'Talk:Çullu, Quzanlı')])
+        self.assertEqual(list(tables.redirect_pairs([0])),
+                         [('Çullu, Agdam', 'Çullu, Quzanlı')])
+        self.assertEqual(list(tables.linking(['Talk:Çullu, Quzanlı'])),
+                         ['Talk:Çullu, Agdam'])
+        self.assertIsNone(tables.id('Foo'))
+
+    def test_build(self):
+        """Test building the tables."""
+        filename = self._copy('pair-0.10.xml')
+        self.assertIsNone(DumpTables.load(filename, self.site, build=False))
+        self._check(DumpTables.load(filename, self.site))
+        self.assertTrue(os.path.exists(os.path.join(
+            DumpTables.path(filename), 'meta.json')))
+
+    def test_load(self):
+        """Test reading the tables written before."""
+        filename = self._copy('pair-0.10.xml')
+        DumpTables.build(filename, self.site)
+        tables = DumpTables.load(filename, self.site, build=False)
+        self.assertIsNotNone(tables)
+        self._check(tables)
+
+    def test_templates(self):
+        """Test finding the pages using templates."""
+        tables = DumpTables.load(self._copy('dummy-template.xml'), self.site)
+        self.assertEqual(list(tables.transcluding(['Template:Foo'])),
+                         ['Fake page with msg'])
+        self.assertEqual(list(tables.transcluding(['Template:Bar'])),
+                         ['Fake page with unnecessary template prefix'])
+        self.assertEqual(
+            list(tables.transcluding(['Template:Baz', 'Template:Boo'], [1])),
+            ['Fake page with nested template'])
+        self.assertEqual(list(tables.transcluding(['Template:Baz'], [0])),
+                         [])
+
+    def test_lookup(self):
+        """Test finding titles and the pages referring to them."""
+        tables = DumpTables(self.site)
+        tables._begin()
+        titles = ['Foo', 'Bar', 'Äb', 'Baz', 'Ab', 'Talk:Foo']
+        ids = [tables._add(title, 0) for title in titles]
+        for page, target in [(0, 1), (3, 1), (0, 1), (5, 1), (3, 2)]:
+            tables.links[0].append(ids[page])
+            tables.links[1].append(ids[target])
+        tables._finish()
+        self.assertEqual(list(tables.titles), titles)
+        for title_id, title in enumerate(titles):
+            self.assertEqual(tables.id(title), title_id)
+        for title in ('', 'A', 'Fo', 'Foo ', 'Zzz', 'Ä'):
+            self.assertIsNone(tables.id(title))
+        self.assertEqual(list(tables.links[1]), [0, 0, 3, 4, 4, 4, 4])
+        self.assertEqual(list(tables.linking(['Bar'])),
+                         ['Foo', 'Baz', 'Talk:Foo'])
+        self.assertEqual(list(tables.linking(['Bar', 'Äb'])),
+                         ['Foo', 'Baz', 'Talk:Foo'])
+        self.assertEqual(list(tables.linking(['Äb', 'Foo', 'Qux'])),
+                         ['Baz'])
+        self.assertEqual(list(tables.transcluding(['Bar'])), [])
+
+    def test_cache_size(self):
+        """Test building the tables with a small cache of links."""
+        filename = self._copy('pair-0.10.xml')
+        with mock.patch.object(DumpTables, 'cache_size', 1):
+            self._check(DumpTables.build(filename, self.site))
+
+    def test_redirect_notes(self):
+        """Test counting the reported redirects."""
+        filename = self._copy('pair-0.10.xml')
+        tables = DumpTables.build(filename, self.site)
+        self.assertEqual(tables.redirect_notes,
+                         {'unknown site': 0, 'other site': 0, 'anchor': 0})
+        tables = DumpTables(self.site)
+        tables._begin()
+        self.assertIsNotNone(tables._redirect_target('Foo', 'Bar|baz'))
+        with mock.patch.object(pywikibot.Link, 'parse', side_effect=(
+                pywikibot.SiteDefinitionError('unknown'))):
+            self.assertIsNone(tables._redirect_target('Foo', 'xx:Bar'))
+        with mock.patch.object(pywikibot.Link, 'site', object()):
+            self.assertIsNone(tables._redirect_target('Foo', 'yy:Bar'))
+        self.assertEqual(tables.redirect_notes,
+                         {'unknown site': 1, 'other site': 1, 'anchor': 1})
+        tables._finish()
+        tables.save(filename)
+        tables = DumpTables.load(filename, self.site, build=False)
+        self.assertEqual(tables.redirect_notes,
+                         {'unknown site': 1, 'other site': 1, 'anchor': 1})
+
+    def test_read_only(self):
+        """Test storing the tables elsewhere if they cannot be written."""
+        filename = self._copy('pair-0.10.xml')
+        fallback = os.path.join(self.directory, 'fallback')
+        # a file cannot contain the tables
+        with mock.patch.object(DumpTables, 'path', return_value=filename):
+            with mock.patch('pywikibot.config.datafilepath',
+                            return_value=fallback):
+                self._check(DumpTables.load(filename, self.site))
+                self.assertTrue(os.path.exists(
+                    os.path.join(fallback, 'meta.json')))
+                self._check(DumpTables.load(filename, self.site,
+                                            build=False))
+            with mock.patch('pywikibot.config.datafilepath',
+                            return_value=filename):
+                self._check(DumpTables.build(filename, self.site))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
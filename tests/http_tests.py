@@ -9,6 +9,7 @@ from __future__ import absolute_import, division, unicode_literals
 
 import json
 import re
+import threading
 import warnings
 
 import requests
@@ -64,6 +65,57 @@ class HttpTestCase(TestCase):
         self.assertIsInstance(r.raw, bytes)
 
 
+class HttpWorkerTestCase(TestCase):
+
+    """Tests for processing queued requests in http threads."""
+
+    net = False
+
+    @staticmethod
+    def _request(method, uri, **kwargs):
+        """Return a response without accessing the network."""
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = {'content-type': 'charset=utf-8'}
+        response._content = uri.encode('utf-8')
+        return response
+
+    def test_enqueue_callbacks(self):
+        """Test that queued requests run their callbacks in http threads."""
+        threads = []
+
+        def callback(request):
+            threads.append(threading.current_thread().name)
+
+        with patch.object(http.session, 'request', side_effect=self._request):
+            requests_ = [http._enqueue('http://example.org/{0}'.format(i),
+                                       callback=callback)
+                         for i in range(20)]
+            for i, r in enumerate(requests_):
+                self.assertEqual(r.status, 200)
+                self.assertEqual(r.text, 'http://example.org/{0}'.format(i))
+            http.http_queue.join()
+
+        self.assertLength(threads, 20)
+        for name in threads:
+            self.assertTrue(name.startswith('HTTP-Thread-'))
+        self.assertLessEqual(len(http._http_threads), config.max_http_threads)
+
+    def test_enqueue_callback_error(self):
+        """Test that a failing callback does not stop the http threads."""
+        def callback(request):
+            raise ValueError('callback failed')
+
+        with patch.object(http.session, 'request', side_effect=self._request):
+            with patch('pywikibot.comms.http.error') as error:
+                r = http._enqueue('http://example.org/', callback=callback)
+                self.assertEqual(r.status, 200)
+                http.http_queue.join()
+            self.assertEqual(error.call_count, 1)
+            r = http._enqueue('http://example.org/next')
+            self.assertEqual(r.text, 'http://example.org/next')
+
+
 class HttpRequestURI(DeprecationTestCase):
 
     """Tests using http.request without a site."""
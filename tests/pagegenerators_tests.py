@@ -11,6 +11,8 @@ import calendar
 import datetime
 import logging
 import sys
+import threading
+import time
 
 import pywikibot
 from pywikibot import pagegenerators, date
@@ -594,6 +596,74 @@ class TestPreloadingGenerator(DefaultSiteTestCase):
         self.assertLength(links, count)
 
 
+class DryParallelPreloadingGenerator(TestCase):
+
+    """Test preloading the pages of several sites in parallel."""
+
+    net = False
+
+    class FakeSite(object):
+
+        """Site which records the threads preloading its pages."""
+
+        def __init__(self, name, delay):
+            """Initializer."""
+            self.name = name
+            self.delay = delay
+            self.threads = set()
+
+        def __str__(self):
+            """Return the name of the site."""
+            return self.name
+
+        def preloadpages(self, pages, groupsize):
+            """Yield the pages after a delay; skip duplicates."""
+            self.threads.add(threading.current_thread().name)
+            time.sleep(self.delay)
+            seen = set()
+            for page in pages:
+                if id(page) not in seen:
+                    seen.add(id(page))
+                    yield page
+
+    class FakePage(object):
+
+        """Page of a FakeSite."""
+
+        def __init__(self, site, number):
+            """Initializer."""
+            self.site = site
+            self.number = number
+
+    def setUp(self):
+        """Create pages on a slow and a fast site."""
+        super(DryParallelPreloadingGenerator, self).setUp()
+        self.slow = self.FakeSite('slow', 0.05)
+        self.fast = self.FakeSite('fast', 0)
+        self.pages = [self.FakePage(self.slow if i % 3 else self.fast, i)
+                      for i in range(30)]
+
+    def test_keep_order(self):
+        """Test that keep_order yields pages in the input order."""
+        gen = PreloadingGenerator(self.pages, groupsize=4, parallel=True,
+                                  keep_order=True)
+        self.assertEqual([page.number for page in gen], list(range(30)))
+        self.assertEqual(self.slow.threads, {'Preload-slow'})
+        self.assertEqual(self.fast.threads, {'Preload-fast'})
+
+    def test_arrival_order(self):
+        """Test that all pages are yielded once without keep_order."""
+        gen = PreloadingGenerator(self.pages, groupsize=4, parallel=True)
+        self.assertCountEqual([page.number for page in gen], range(30))
+
+    def test_duplicates(self):
+        """Test that duplicates in a group are skipped like preloadpages."""
+        pages = self.pages[:3] + self.pages[:3]
+        gen = PreloadingGenerator(pages, groupsize=10, parallel=True,
+                                  keep_order=True)
+        self.assertEqual([page.number for page in gen], [0, 1, 2])
+
+
 class TestDequePreloadingGenerator(DefaultSiteTestCase):
 
     """Test preloading generator on lists."""
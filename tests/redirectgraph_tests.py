@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Tests for the redirectgraph module."""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from pywikibot.dumptables import DumpTables
+from pywikibot.redirectgraph import RedirectGraph
+
+from tests import join_xml_data_path
+from tests.aspects import unittest, DefaultDrySiteTestCase, TestCase
+
+
+class RedirectGraphTestCase(TestCase):
+
+    """Test chains, loops, double and broken redirects."""
+
+    net = False
+
+    def setUp(self):
+        """Create a graph with chains and a loop."""
+        super(RedirectGraphTestCase, self).setUp()
+        self.graph = RedirectGraph()
+        self.graph.add_page('A', 'B')
+        self.graph.add_page('B', 'C')
+        self.graph.add_page('C')
+        self.graph.add_page('D', 'E')
+        self.graph.add_page('F', 'G')
+        self.graph.add_page('G', 'H')
+        self.graph.add_page('H', 'G')
+        self.graph.add_page('I', 'G')
+
+    def titles(self, ids):
+        """Return the titles of ids."""
+        return sorted(self.graph.titles[title_id] for title_id in ids)
+
+    def test_ids(self):
+        """Test interning titles."""
+        self.assertEqual(len(self.graph), 9)
+        self.assertEqual(self.graph.intern('B'), self.graph.id('B'))
+        self.assertIsNone(self.graph.id('X'))
+        self.assertFalse(self.graph.exists[self.graph.id('E')])
+
+    def test_double_and_broken(self):
+        """Test finding double and broken redirects."""
+        self.assertEqual(self.titles(self.graph.redirects()),
+                         ['A', 'B', 'D', 'F', 'G', 'H', 'I'])
+        self.assertEqual(self.titles(self.graph.double()),
+                         ['A', 'F', 'G', 'H', 'I'])
+        self.assertEqual(self.titles(self.graph.broken()), ['D'])
+
+    def test_chain(self):
+        """Test resolving chains."""
+        graph = self.graph
+        self.assertEqual(graph.chain(graph.id('A')), (2, graph.id('C')))
+        self.assertEqual(graph.chain(graph.id('B')), (1, graph.id('C')))
+        self.assertEqual(graph.chain(graph.id('C')), (0, graph.id('C')))
+        self.assertEqual(graph.chain(graph.id('D')), (1, graph.id('E')))
+        self.assertEqual(graph.chain(graph.id('F')), (-1, -1))
+        self.assertEqual(self.titles(graph.loops()), ['F', 'G', 'H', 'I'])
+
+    def test_update(self):
+        """Test that new redirects invalidate resolved chains."""
+        graph = self.graph
+        self.assertEqual(graph.chain(graph.id('C')), (0, graph.id('C')))
+        graph.add_redirect('C', 'D')
+        self.assertEqual(graph.chain(graph.id('A')), (4, graph.id('E')))
+
+    def test_long_chain(self):
+        """Test that long chains are resolved without recursion."""
+        graph = RedirectGraph()
+        for i in range(5000):
+            graph.add_page(str(i), str(i + 1))
+        self.assertEqual(graph.chain(0), (5000, graph.id('5000')))
+
+
+class RedirectGraphTablesTestCase(DefaultDrySiteTestCase):
+
+    """Test creating a graph from the tables of a dump."""
+
+    def setUp(self):
+        """Build the tables of a dump in a temporary directory."""
+        super(RedirectGraphTablesTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'pair-0.10.xml')
+        shutil.copy(join_xml_data_path('pair-0.10.xml'), filename)
+        self.tables = DumpTables.load(filename, self.site)
+
+    def tearDown(self):
+        """Remove the dump and its tables."""
+        shutil.rmtree(self.directory)
+        super(RedirectGraphTablesTestCase, self).tearDown()
+
+    def test_from_tables(self):
+        """Test that the ids of the tables are kept."""
+        graph = RedirectGraph.from_tables(self.tables)
+        self.assertIs(graph.titles, self.tables.titles)
+        self.assertEqual(
+            self.titles(graph, graph.broken()),
+            ['Talk:Çullu, Agdam', 'Çullu, Agdam'])
+        self.assertEqual(list(graph.double()), [])
+        graph = RedirectGraph.from_tables(self.tables, [1])
+        self.assertEqual(self.titles(graph, graph.redirects()),
+                         ['Talk:Çullu, Agdam'])
+        self.assertFalse(graph.exists[graph.id('Çullu, Agdam')])
+        # adding a title copies the titles of the tables
+        graph.add_redirect('Foo', 'Talk:Çullu, Agdam')
+        self.assertIsNot(graph.titles, self.tables.titles)
+        self.assertEqual(graph.chain(graph.id('Foo')),
+                         (2, graph.id('Talk:Çullu, Quzanlı')))
+
+    @staticmethod
+    def titles(graph, ids):
+        """Return the titles of ids."""
+        return sorted(graph.titles[title_id] for title_id in ids)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -7,15 +7,17 @@
 #
 from __future__ import absolute_import, division, unicode_literals
 
+import re
+
 import pywikibot
 
 from pywikibot import fixes
 
 from scripts import replace
 
-from tests import join_data_path
+from tests import join_data_path, join_xml_data_path, mock
 
-from tests.aspects import unittest
+from tests.aspects import unittest, TestCase
 from tests.bot_tests import TWNBotTestCase
 
 # Load only the custom fixes
@@ -167,6 +169,15 @@ class TestReplacementsMain(TWNBotTestCase):
         self.assertLength(bot.replacements, 1)
         self._test_replacement(bot.replacements[0])
 
+    def test_xml(self):
+        """Test that -xml reads the dump with the replace generator."""
+        filename = join_xml_data_path('article-pyrus.xml')
+        with mock.patch.object(replace, 'XmlDumpReplacePageGenerator',
+                               return_value=iter([])) as generator:
+            self._get_bot(True, '1', '2', '-xml:' + filename)
+        self.assertEqual(generator.call_count, 1)
+        self.assertEqual(generator.call_args[0][0], filename)
+
     def test_cmd_automatic(self):
         """Test command line replacements with automatic summary."""
         bot = self._get_bot(None, '1', '2', '-automaticsummary')
@@ -238,6 +249,47 @@ class TestReplacementsMain(TWNBotTestCase):
         self.assertTrue(callable(bot.replacements[0].new))
 
 
+class TestCombineRegexes(TestCase):
+
+    """Test combining the search patterns of the replacements."""
+
+    net = False
+
+    def _combine(self, *patterns, **kwargs):
+        """Combine the patterns compiled with the given flags."""
+        flags = kwargs.get('flags', re.UNICODE)
+        return replace.combine_regexes(re.compile(pattern, flags)
+                                       for pattern in patterns)
+
+    def test_literals(self):
+        """Test literal patterns are merged into one trie."""
+        regexes = self._combine(*[re.escape(text) for text in
+                                  ('foobar', 'foo', 'fob', 'a.b')])
+        self.assertLength(regexes, 1)
+        regex = regexes[0]
+        for text in ('foobar', 'xfoo', 'fob', 'a.b'):
+            self.assertIsNotNone(regex.search(text))
+        for text in ('fo', 'fbo', 'axb'):
+            self.assertIsNone(regex.search(text))
+
+    def test_mixed(self):
+        """Test literal and regular patterns are combined."""
+        regexes = self._combine('ba[rz]', 'qux', r'\d+ km')
+        self.assertLength(regexes, 1)
+        for text in ('baz', 'aquxa', '12 km'):
+            self.assertIsNotNone(regexes[0].search(text))
+        self.assertIsNone(regexes[0].search('baq km'))
+
+    def test_separate(self):
+        """Test patterns which cannot be combined are kept apart."""
+        regexes = self._combine(r'(a)\1', '(?P<x>b)', '(?i)c', 'd')
+        self.assertLength(regexes, 4)
+        self.assertIsNone(regexes[-1].search('abc'))
+        regexes += replace.combine_regexes([re.compile('e', re.I)])
+        self.assertLength(regexes, 5)
+        self.assertIsNotNone(regexes[-1].search('E'))
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
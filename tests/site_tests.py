@@ -10,7 +10,9 @@ from __future__ import absolute_import, division, unicode_literals
 import pickle
 import random
 import re
+import shutil
 import sys
+import tempfile
 import time
 
 try:
@@ -2556,6 +2558,67 @@ class TestSiteinfoDry(DefaultDrySiteTestCase):
         self.assertEqual(result, {'_prop': ('_value', '_cache_time')})
 
 
+class TestSiteinfoStoreDry(DefaultDrySiteTestCase):
+
+    """Test preloading siteinfo and the shared siteinfo store."""
+
+    def setUp(self):
+        """Use a temporary cache directory and a fake request."""
+        super(TestSiteinfoStoreDry, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        patcher = patch.object(api.CachedRequest, '_get_cache_dir',
+                               classmethod(lambda cls: self.directory))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.requests = []
+        patcher = patch.object(self.get_site(), '_request',
+                               side_effect=self._request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        api.CachedRequest._get_cache(
+            pywikibot.site.Siteinfo.store_filename).close()
+        shutil.rmtree(self.directory)
+        super(TestSiteinfoStoreDry, self).tearDown()
+
+    def _request(self, **kwargs):
+        """Return a fake request answering every property."""
+        props = kwargs['parameters']['siprop']
+        self.requests.append(props)
+        request = MagicMock()
+        request.submit.return_value = {
+            'query': {prop: {prop: {}} for prop in props}}
+        request._cachetime = datetime.utcnow()
+        return request
+
+    def test_preload(self):
+        """Test that properties are preloaded with one request."""
+        siteinfo = pywikibot.site.Siteinfo(self.get_site())
+        siteinfo.preload(['interwikimap', 'rightsinfo', 'statistics'])
+        self.assertEqual(self.requests,
+                         [['interwikimap', 'rightsinfo', 'statistics']])
+        self.assertEqual(siteinfo._cache['rightsinfo'][0], {'rightsinfo': {}})
+        siteinfo.preload(['interwikimap', 'languages'])
+        self.assertEqual(self.requests[1:], [['languages']])
+
+    def test_store(self):
+        """Test that other instances use the shared store."""
+        pywikibot.site.Siteinfo(self.get_site()).preload(
+            ['interwikimap', 'rightsinfo'])
+        siteinfo = pywikibot.site.Siteinfo(self.get_site())
+        siteinfo.preload(['interwikimap', 'rightsinfo', 'statistics'])
+        self.assertEqual(self.requests,
+                         [['interwikimap', 'rightsinfo'], ['statistics']])
+        self.assertEqual(siteinfo._cache['interwikimap'][0],
+                         {'interwikimap': {}})
+        # expired values are requested again
+        siteinfo = pywikibot.site.Siteinfo(self.get_site())
+        siteinfo.preload(['rightsinfo'], expiry=0)
+        self.assertEqual(self.requests[2:], [['rightsinfo']])
+
+
 class TestSiteinfoAsync(DefaultSiteTestCase):
 
     """Test asynchronous siteinfo fetch."""
@@ -521,6 +521,35 @@ class TestTemplateParams(TestCase):
         self._order_differs(func)
         self._stripped(func)
 
+    def test_extract_templates_params_stack(self):
+        """Test using the stack based scanner."""
+        func = textlib.extract_templates_and_params_stack
+        self._common_results(func)
+        self._order_differs(func)
+        self._unstripped(func)
+        self._etp_regex_differs(func)
+
+        self.assertEqual(func('{{a|{{c|{{d}}}}}}'),
+                         [('a', OrderedDict([('1', '{{c|{{d}}}}')])),
+                          ('c', OrderedDict((('1', '{{d}}'), ))),
+                          ('d', OrderedDict())])
+        self.assertEqual(func('{{a|[[b|c=d]]|e={{{f|g}}}}}'),
+                         [('a', OrderedDict((('1', '[[b|c=d]]'),
+                                             ('e', '{{{f|g}}}'))))])
+        self.assertEqual(func('{{{1|{{a|b}}}}}'),
+                         [('a', OrderedDict((('1', 'b'), )))])
+        self.assertEqual(func('{{a|<nowiki>|}}</nowiki>}}'),
+                         [('a', OrderedDict((('1', '<nowiki>|}}</nowiki>'),
+                                             )))])
+
+    def test_extract_templates_params_stack_stripped(self):
+        """Test using the stack based scanner with stripping."""
+        func = functools.partial(textlib.extract_templates_and_params_stack,
+                                 strip=True)
+        self._common_results(func)
+        self._order_differs(func)
+        self._stripped(func)
+
     def test_extract_templates_params_regex(self):
         """Test using many complex regexes."""
         func = functools.partial(textlib.extract_templates_and_params_regex,
@@ -781,6 +810,22 @@ class TestGenericTemplateParams(PatchingTestCase):
         self.assertEqual(self._args, (False, True))
         self.assertFalse(self._mwpfh)
 
+    @PatchingTestCase.patched(textlib, 'extract_templates_and_params_stack')
+    def extract_stack(self, text, *args, **kwargs):
+        """Patched call to extract_templates_and_params_stack."""
+        self._text = text
+        self._args = args
+        self._mwpfh = None
+
+    def test_stack(self):
+        """Test selecting the stack based scanner."""
+        self.patch(config, 'use_mwparserfromhell', False)
+        self.patch(config, 'template_params_parser', 'stack')
+        textlib.extract_templates_and_params('{{a<!-- -->| foo }}')
+        self.assertEqual(self._text, '{{a| foo }}')
+        self.assertEqual(self._args, (True, ))
+        self.assertIsNone(self._mwpfh)
+
     @require_modules('mwparserfromhell')
     def test_strip_mwpfh(self):
         """Test stripping values when using the mwpfh variant."""
@@ -1530,6 +1575,26 @@ class TestReplaceExcept(DefaultDrySiteTestCase):
             r'\g<bar>', r'^(?P<foo>.*)$', r'X\g<foo>X', [], site=self.site),
             r'X\g<bar>X')
 
+    def test_overlapping_exceptions(self):
+        """Test exceptions found after skipping an overlapping exception."""
+        self.assertEqual(textlib.replaceExcept(
+            'aXbXcX', 'X', 'Y', [re.compile('aXb'), re.compile(r'X\w')],
+            site=self.site), 'aXbXcY')
+        self.assertEqual(textlib.replaceExcept(
+            'X<!--X-->X<nowiki>X</nowiki>X', 'X', 'Y',
+            ['comment', 'nowiki'], site=self.site),
+            'Y<!--X-->Y<nowiki>X</nowiki>Y')
+
+    def test_exception_cache(self):
+        """Test that exception sets are compiled once per site."""
+        exceptions = ['comment', 'category', re.compile('foo')]
+        regexes = textlib._get_exception_regexes(exceptions, self.site)
+        self.assertIs(
+            textlib._get_exception_regexes(list(exceptions), self.site),
+            regexes)
+        self.assertEqual(len(regexes), 3)
+        self.assertIs(regexes[2], exceptions[2])
+
 
 class TestMultiTemplateMatchBuilder(DefaultDrySiteTestCase):
 
@@ -1785,6 +1850,59 @@ class TestExtractSections(DefaultDrySiteTestCase):
         )
 
 
+class TestTokens(TestCase):
+
+    """Test the tokens shared by the textlib functions."""
+
+    net = False
+
+    def test_shared(self):
+        """Test that a text is only parsed once."""
+        text = 'a<!-- b -->c<nowiki>d</nowiki>'
+        tokens = textlib._tokens(text)
+        self.assertIs(textlib._tokens(text), tokens)
+        self.assertEqual(textlib.removeDisabledParts(text), 'ac')
+        self.assertIs(textlib.removeDisabledParts(text),
+                      textlib.removeDisabledParts(text))
+        self.assertEqual(textlib.removeDisabledParts(text,
+                                                     include=['nowiki']),
+                         'ac<nowiki>d</nowiki>')
+
+    def test_is_disabled(self):
+        """Test positions within and at the delimiters of disabled parts."""
+        text = 'a<!-- b -->c<!-- d -->'
+        self.assertFalse(textlib.isDisabled(text, 0))
+        self.assertFalse(textlib.isDisabled(text, 1))
+        self.assertFalse(textlib.isDisabled(text, 2))
+        self.assertTrue(textlib.isDisabled(text, 5))
+        self.assertFalse(textlib.isDisabled(text, 11))
+        # breaking the end of a comment extends it to the next one
+        self.assertTrue(textlib.isDisabled(text, 9))
+        self.assertFalse(textlib.isDisabled(text, 20))
+        self.assertTrue(textlib.isDisabled('<pre>a</pre>', 6, ['pre']))
+        self.assertFalse(textlib.isDisabled('<pre>a</pre>', 6,
+                                            ['comment']))
+
+    def test_search(self):
+        """Test that searching gives the same result as the regex."""
+        regex = re.compile(r'\[\[.*?\]\]')
+        text = '[[a]] [[b [[c]] d]] [[e]]'
+        tokens = textlib._tokens(text)
+        for pos in range(len(text) + 1):
+            match = tokens.search(regex, pos)
+            expected = regex.search(text, pos)
+            self.assertEqual(match and match.span(),
+                             expected and expected.span())
+
+    def test_headings(self):
+        """Test that disabled headings are ignored."""
+        text = '==a==\n<!--\n==b==\n-->\n==c==\n'
+        self.assertEqual(
+            [heading.text for heading in textlib._extract_headings(text,
+                                                                   None)],
+            ['==a==', '==c=='])
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
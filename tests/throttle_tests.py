@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Tests for the token bucket throttle."""
+#
+# (C) Pywikibot team, 2019
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from pywikibot import config
+from pywikibot.throttle import (
+    LagScheduler, LocalTokenStore, Throttle, TokenStore,
+)
+
+from tests import patch
+from tests.aspects import unittest, TestCase
+
+
+class TokenStoreTestCase(TestCase):
+
+    """Test the token stores."""
+
+    net = False
+
+    def setUp(self):
+        """Create a temporary directory for the database."""
+        super(TokenStoreTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, TokenStore.filename)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.directory)
+        super(TokenStoreTestCase, self).tearDown()
+
+    def _test_reserve(self, store):
+        """Test reserving tokens with a rate of one token per 10 seconds."""
+        self.assertEqual(store.reserve('a', 1, 0.1, 2), 0)
+        self.assertEqual(store.reserve('a', 1, 0.1, 2), 0)
+        self.assertAlmostEqual(store.reserve('a', 1, 0.1, 2), 10, places=1)
+        self.assertAlmostEqual(store.reserve('a', 2, 0.1, 2), 30, places=1)
+        tokens, blocked = store.state('a', 0.1, 2)
+        self.assertAlmostEqual(tokens, -3, places=1)
+        self.assertEqual(blocked, 0)
+        # other buckets and unlimited rates are not affected
+        self.assertEqual(store.reserve('b', 1, 0.1, 2), 0)
+        self.assertEqual(store.reserve('a', 1, 0, 2), 0)
+
+    def _test_block(self, store):
+        """Test blocking a bucket."""
+        store.block('a', time.time() + 60, 1)
+        self.assertAlmostEqual(store.reserve('a', 1, 0, 1), 60, places=1)
+        self.assertAlmostEqual(store.reserve('a', 1, 1, 1), 60, places=1)
+        store.block('a', time.time() + 30, 1)
+        self.assertAlmostEqual(store.reserve('a', 1, 1, 1), 60, places=1)
+
+    def test_local_reserve(self):
+        """Test reserving tokens of a local store."""
+        self._test_reserve(LocalTokenStore())
+
+    def test_local_block(self):
+        """Test blocking a bucket of a local store."""
+        self._test_block(LocalTokenStore())
+
+    def test_shared_reserve(self):
+        """Test reserving tokens of a shared store."""
+        store = TokenStore(self.path)
+        self._test_reserve(store)
+        store.close()
+
+    def test_shared_block(self):
+        """Test blocking a bucket of a shared store."""
+        store = TokenStore(self.path)
+        self._test_block(store)
+        store.close()
+
+    def test_shared(self):
+        """Test that buckets are shared by separate store instances."""
+        first = TokenStore(self.path)
+        second = TokenStore(self.path)
+        self.assertEqual(first.reserve('a', 1, 0.1, 1), 0)
+        self.assertAlmostEqual(second.reserve('a', 1, 0.1, 1), 10, places=1)
+        first.close()
+        second.close()
+
+
+class ThrottleTestCase(TestCase):
+
+    """Test the Throttle."""
+
+    net = False
+
+    def setUp(self):
+        """Use a local store and record the waiting times."""
+        super(ThrottleTestCase, self).setUp()
+        self.waits = []
+        patcher = patch.object(Throttle, 'wait', side_effect=self.waits.append,
+                               autospec=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.throttle = Throttle('site', mindelay=0, writedelay=10,
+                                 multiplydelay=False)
+
+    def test_write(self):
+        """Test that writes are delayed but reads are not."""
+        self.throttle(write=True)
+        self.throttle(write=True)
+        self.throttle()
+        self.assertEqual(self.waits[0], 0)
+        self.assertAlmostEqual(self.waits[1], 10, places=1)
+        self.assertEqual(self.waits[2], 0)
+        self.assertAlmostEqual(self.throttle.waittime(write=True), 20,
+                               places=1)
+        self.assertEqual(self.throttle.waittime(), 0)
+
+    def test_requestsize(self):
+        """Test that large requests take more tokens."""
+        self.throttle.setDelays(delay=1)
+        self.throttle(requestsize=63)
+        self.throttle()
+        self.assertAlmostEqual(self.waits[1], 6, places=1)
+
+    def test_lag(self):
+        """Test that lag blocks reads and writes."""
+        self.throttle.lag(20)
+        self.throttle()
+        self.throttle(write=True)
+        self.assertEqual(self.waits[0], 20)
+        self.assertAlmostEqual(self.waits[1], 20, places=1)
+        self.assertAlmostEqual(self.waits[2], 20, places=1)
+
+    def test_retry_after(self):
+        """Test that a Retry-After value blocks the buckets."""
+        self.throttle.retry_after = 30
+        self.assertAlmostEqual(self.throttle.waittime(), 30, places=1)
+        self.throttle.retry_after = 0
+        self.assertAlmostEqual(self.throttle.waittime(), 30, places=1)
+
+    def test_status(self):
+        """Test the status of the buckets."""
+        self.throttle(write=True)
+        status = self.throttle.status()
+        self.assertAlmostEqual(status['write']['tokens'], 0, places=1)
+        self.assertEqual(status['write']['waiting'], 0)
+        self.assertEqual(status['read']['blocked'], 0)
+        self.throttle.lag(5)
+        self.assertAlmostEqual(self.throttle.status()['read']['blocked'], 5,
+                               places=1)
+
+
+class LagSchedulerTestCase(TestCase):
+
+    """Test the adaptive scheduler."""
+
+    net = False
+
+    def setUp(self):
+        """Use fixed limits."""
+        super(LagSchedulerTestCase, self).setUp()
+        patcher = patch.multiple(config, maxlag=5, slow_response_time=2.0,
+                                 adaptive_throttle=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = LagScheduler(concurrency=8, alpha=0.5)
+
+    def test_idle(self):
+        """Test that an idle server is not slowed down."""
+        self.scheduler.record_response(1)
+        self.assertEqual(self.scheduler.pressure, 0)
+        self.assertEqual(self.scheduler.concurrency, 8)
+        self.assertEqual(self.scheduler.delay_factor, 1)
+
+    def test_lag(self):
+        """Test that the lag estimate raises the pressure and decays."""
+        self.scheduler.record_lag(5)
+        self.assertAlmostEqual(self.scheduler.pressure, 0.5, places=2)
+        self.assertEqual(self.scheduler.concurrency, 4)
+        self.assertAlmostEqual(self.scheduler.delay_factor, 2.5, places=2)
+        self.scheduler._lag_time -= self.scheduler.halflife
+        self.assertAlmostEqual(self.scheduler.lag, 1.25, places=2)
+
+    def test_response_time(self):
+        """Test that slow responses raise the pressure."""
+        self.scheduler.record_response(6)
+        self.scheduler.record_response(6)
+        self.assertAlmostEqual(self.scheduler.response_time, 4.5)
+        self.assertEqual(self.scheduler.pressure, 1)
+        self.assertEqual(self.scheduler.concurrency, 1)
+        self.assertEqual(self.scheduler.delay_factor, 4)
+
+    def test_slot(self):
+        """Test that reads wait for a free slot."""
+        self.scheduler.max_concurrency = 1
+        entered = threading.Event()
+        release = threading.Event()
+
+        def read():
+            with self.scheduler.slot():
+                entered.set()
+                release.wait()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        entered.wait()
+        self.assertEqual(self.scheduler.active, 1)
+        # writes are not limited
+        with self.scheduler.slot(write=True):
+            pass
+        second = threading.Thread(target=read)
+        entered.clear()
+        second.start()
+        self.assertFalse(entered.wait(0.2))
+        release.set()
+        self.assertTrue(entered.wait(5))
+        thread.join()
+        second.join()
+        self.assertEqual(self.scheduler.active, 0)
+
+    def test_throttle(self):
+        """Test that the throttle uses the scheduler."""
+        throttle = Throttle('site', mindelay=0, writedelay=10,
+                            multiplydelay=False)
+        throttle.scheduler = self.scheduler
+        with patch.object(Throttle, 'wait'):
+            throttle.lag(5)
+        self.assertAlmostEqual(throttle.getDelay(write=True), 25, places=1)
+        status = throttle.status()
+        self.assertAlmostEqual(status['write']['rate'], 0.04, places=3)
+        self.assertEqual(status['read']['rate'], 0)
+        self.assertEqual(status['scheduler']['concurrency'], 4)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
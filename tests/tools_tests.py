@@ -21,7 +21,7 @@ import tempfile
 import warnings
 
 from pywikibot import tools
-from pywikibot.tools import classproperty, suppress_warnings
+from pywikibot.tools import archive, classproperty, suppress_warnings
 
 from tests import join_xml_data_path, mock
 from tests.aspects import (
@@ -124,30 +124,30 @@ class OpenArchiveTestCase(TestCase):
     @require_modules('bz2file')
     def test_open_archive_with_bz2file(self):
         """Test open_archive when bz2file library."""
-        old_bz2 = tools.bz2
+        old_bz2 = archive.bz2
         try:
-            tools.bz2 = import_module('bz2file')
+            archive.bz2 = import_module('bz2file')
             self.assertEqual(self._get_content(self.base_file + '.bz2'),
                              self.original_content)
             self.assertEqual(self._get_content(self.base_file + '.bz2',
                                                use_extension=False),
                              self.original_content)
         finally:
-            tools.bz2 = old_bz2
+            archive.bz2 = old_bz2
 
     def test_open_archive_without_bz2(self):
         """Test open_archive when bz2 and bz2file are not available."""
-        old_bz2 = tools.bz2
+        old_bz2 = archive.bz2
         bz2_import_error = ('This is a fake exception message that is '
                             'used when bz2 and bz2file are not importable')
         try:
-            tools.bz2 = ImportError(bz2_import_error)
+            archive.bz2 = ImportError(bz2_import_error)
             self.assertRaisesRegex(ImportError,
                                    bz2_import_error,
                                    self._get_content,
                                    self.base_file + '.bz2')
         finally:
-            tools.bz2 = old_bz2
+            archive.bz2 = old_bz2
 
     def test_open_archive_gz(self):
         """Test open_archive with gz compressor in the standard library."""
@@ -170,7 +170,7 @@ class OpenArchiveTestCase(TestCase):
 
     def test_open_archive_lzma(self):
         """Test open_archive with lzma compressor in the standard library."""
-        if isinstance(tools.lzma, ImportError):
+        if isinstance(archive.lzma, ImportError):
             self.skipTest('lzma not importable')
         self.assertEqual(
             self._get_content(self.base_file + '.lzma'), self.original_content)
@@ -184,11 +184,11 @@ class OpenArchiveTestCase(TestCase):
 
     def test_open_archive_without_lzma(self):
         """Test open_archive when lzma is not available."""
-        old_lzma = tools.lzma
+        old_lzma = archive.lzma
         lzma_import_error = ('This is a fake exception message that is '
                              'used when lzma is not importable')
         try:
-            tools.lzma = ImportError(lzma_import_error)
+            archive.lzma = ImportError(lzma_import_error)
             self.assertRaisesRegex(ImportError,
                                    lzma_import_error,
                                    self._get_content,
@@ -198,7 +198,7 @@ class OpenArchiveTestCase(TestCase):
                                    self._get_content,
                                    self.base_file + '.xz')
         finally:
-            tools.lzma = old_lzma
+            archive.lzma = old_lzma
 
 
 class OpenCompressedTestCase(OpenArchiveTestCase, DeprecationTestCase):
@@ -221,6 +221,107 @@ class OpenCompressedTestCase(OpenArchiveTestCase, DeprecationTestCase):
         return content
 
 
+class ArchiveBackendTestCase(TestCase):
+
+    """Test the decompressors used by open_archive for reading."""
+
+    net = False
+
+    @classmethod
+    def setUpClass(cls):
+        """Define base_file and original_content."""
+        super(ArchiveBackendTestCase, cls).setUpClass()
+        cls.base_file = join_xml_data_path('article-pyrus.xml')
+        with open(cls.base_file, 'rb') as f:
+            cls.original_content = f.read()
+
+    def setUp(self):
+        """Keep the registered backends."""
+        super(ArchiveBackendTestCase, self).setUp()
+        self._backends = {extension: list(backends) for extension, backends
+                          in archive._archive_backends.items()}
+
+    def tearDown(self):
+        """Restore the registered backends."""
+        archive._archive_backends.clear()
+        archive._archive_backends.update(self._backends)
+        super(ArchiveBackendTestCase, self).tearDown()
+
+    def _write(self, suffix, content):
+        """Write a temporary file which is removed after the test."""
+        fh, fn = tempfile.mkstemp(suffix)
+        os.close(fh)
+        self.addCleanup(os.remove, fn)
+        with open(fn, 'wb') as f:
+            f.write(content)
+        return fn
+
+    def _read(self, filename, backend):
+        """Read a file and check the backend and the counted bytes."""
+        with tools.open_archive(filename) as f:
+            self.assertIsInstance(f, archive.ArchiveReader)
+            self.assertEqual(f.backend, backend)
+            content = f.read()
+            self.assertEqual(f.bytes_read, len(content))
+        return content
+
+    def test_7z_lzma(self):
+        """Test reading a 7z archive using lzma."""
+        if isinstance(archive.lzma, ImportError):
+            self.skipTest('lzma not importable')
+        self.assertEqual(self._read(self.base_file + '.7z', 'lzma'),
+                         self.original_content)
+
+    def test_bz2_threads(self):
+        """Test reading a multistream bz2 file using threads."""
+        import bz2
+        lines = self.original_content.splitlines(True)
+        content = b''.join(bz2.compress(b''.join(lines[i:i + 10]))
+                           for i in range(0, len(lines), 10))
+        filename = self._write('.bz2', content)
+        with mock.patch.object(archive._ThreadedBZ2, 'chunk_size', 100):
+            with mock.patch.object(archive.multiprocessing, 'cpu_count',
+                                   return_value=2):
+                self.assertEqual(self._read(filename, 'bz2 threads'),
+                                 self.original_content)
+                # lines can be read across ranges
+                with tools.open_archive(filename) as f:
+                    self.assertEqual(list(f), lines)
+
+    @require_modules('zstandard')
+    def test_zstd(self):
+        """Test reading a zstd file."""
+        import zstandard
+        filename = self._write('.zst', zstandard.ZstdCompressor().compress(
+            self.original_content))
+        self.assertEqual(self._read(filename, 'zstandard'),
+                         self.original_content)
+
+    def test_stream_reader(self):
+        """Test reading pieces and lines spanning several chunks."""
+        reader = archive._StreamReader([b'ab\nc', b'', b'de', b'f\ng\n'])
+        self.assertEqual(reader.read(1), b'a')
+        self.assertEqual(reader.readline(), b'b\n')
+        self.assertEqual(reader.read(4), b'cdef')
+        self.assertEqual(reader.readline(1), b'\n')
+        self.assertEqual(reader.read(0), b'')
+        self.assertEqual(list(reader), [b'g\n'])
+        self.assertEqual(reader.read(), b'')
+        reader = archive._StreamReader([b'ab', b'cd\n', b'ef'])
+        self.assertEqual(reader.readline(3), b'abc')
+        self.assertEqual(reader.read(), b'd\nef')
+
+    def test_register(self):
+        """Test registering a backend."""
+        archive.register_archive_backend('gz', 'none', lambda filename: None)
+        self.assertEqual(self._read(self.base_file + '.gz', 'gz'),
+                         self.original_content)
+        archive.register_archive_backend(
+            'gz', 'dummy', lambda filename: archive._StreamReader([b'dummy']))
+        self.assertEqual(self._read(self.base_file + '.gz', 'dummy'),
+                         b'dummy')
+
+
 class OpenArchiveWriteTestCase(TestCase):
 
     """Test writing with open_archive."""
@@ -295,7 +396,7 @@ class OpenArchiveWriteTestCase(TestCase):
 
     def test_write_archive_lzma(self):
         """Test writing a lzma archive."""
-        if isinstance(tools.lzma, ImportError):
+        if isinstance(archive.lzma, ImportError):
             self.skipTest('lzma not importable')
 
         content = self._write_content('.lzma')
@@ -304,7 +405,7 @@ class OpenArchiveWriteTestCase(TestCase):
 
     def test_write_archive_xz(self):
         """Test writing a xz archive."""
-        if isinstance(tools.lzma, ImportError):
+        if isinstance(archive.lzma, ImportError):
             self.skipTest('lzma not importable')
 
         content = self._write_content('.xz')
@@ -325,6 +325,18 @@ class TestWbTime(WbRepresentationTestCase):
         self.assertEqual(t, pywikibot.WbTime(site=repo, year=2010, hour=12,
                                              minute=43, precision=14))
 
+    def test_WbTime_compact(self):
+        """Test that WbTime has no dict and shares its calendar model."""
+        repo = self.get_repo()
+        t1 = pywikibot.WbTime.fromWikibase(json.loads(
+            json.dumps(pywikibot.WbTime(site=repo, year=2010).toWikibase())),
+            site=repo)
+        t2 = pywikibot.WbTime(site=repo, year=2010)
+        self.assertFalse(hasattr(t1, '__dict__'))
+        self.assertIs(t1.calendarmodel, t2.calendarmodel)
+        with self.assertRaises(AttributeError):
+            t1.foo = 'bar'
+
     def test_WbTime_zero_month(self):
         """Test WbTime creation from date/time string with zero month."""
         # ensures we support formats in T123888 / T107870
@@ -654,6 +666,15 @@ class TestWbMonolingualText(WbRepresentationTestCase):
         self.assertEqual(q.toWikibase(),
                          {'text': 'Test this!', 'language': 'en'})
 
+    def test_WbMonolingualText_compact(self):
+        """Test that WbMonolingualText shares its language code."""
+        q1 = pywikibot.WbMonolingualText.fromWikibase(
+            json.loads('{"text": "Test this!", "language": "en-gb"}'))
+        q2 = pywikibot.WbMonolingualText.fromWikibase(
+            json.loads('{"text": "Test this!", "language": "en-gb"}'))
+        self.assertFalse(hasattr(q1, '__dict__'))
+        self.assertIs(q1.language, q2.language)
+
     def test_WbMonolingualText_errors(self):
         """Test WbMonolingualText error handling."""
         regex = r'^text and language cannot be empty$'
@@ -2179,6 +2200,60 @@ class TestJSON(WikidataTestCase):
 
         self.assertEqual(old, new)
 
+    def test_lazy_claims(self):
+        """Test that claims are created when their property is accessed."""
+        claims = self.wdp.claims
+        self.assertIsInstance(claims, pywikibot.page.ClaimCollection)
+        self.assertIsInstance(dict.get(claims, 'P213'), list)
+        self.assertNotIsInstance(dict.get(claims, 'P213')[0],
+                                 pywikibot.Claim)
+        self.assertIn('P213', claims)
+        claim = claims['P213'][0]
+        self.assertIsInstance(claim, pywikibot.Claim)
+        self.assertIs(claim.on_item, self.wdp)
+        self.assertIs(claims['P213'][0], claim)
+        self.assertIs(claims.get('P213')[0], claim)
+        self.assertIsNone(claims.get('P0'))
+        self.assertEqual(len(claims.values()), len(claims))
+        self.assertTrue(all(isinstance(claim, pywikibot.Claim)
+                            for prop_claims in claims.values()
+                            for claim in prop_claims))
+
+    def test_claims_compact(self):
+        """Test that claims have no dict and share their property ids."""
+        with open(join_pages_path('Q60.wd')) as f:
+            data = json.load(f)
+        claim = pywikibot.Claim.fromJSON(self.get_repo(),
+                                         data['claims']['P213'][0])
+        other = self.wdp.claims['P213'][0]
+        self.assertFalse(hasattr(claim, '__dict__'))
+        self.assertIs(claim.getID(), other.getID())
+        self.assertIs(claim.type, other.type)
+        self.assertIsNone(claim._qualifiers)
+        self.assertIsNone(claim._sources)
+        self.assertEqual(claim, other)
+        self.assertEqual(claim.qualifiers, {})
+        self.assertEqual(claim.toJSON(), other.toJSON())
+
+    def test_itempage_json_claims_created(self):
+        """Test itempage json after creating all claims."""
+        old = json.dumps(self.wdp._content, indent=2, sort_keys=True)
+        for prop in self.wdp.claims:
+            self.wdp.claims[prop]
+        new = json.dumps(self.wdp.toJSON(), indent=2, sort_keys=True)
+
+        self.assertEqual(old, new)
+
+    def test_json_diff_claims(self):
+        """Test json diff of changed claims."""
+        self.assertEqual(self.wdp.toJSON(diffto=self.wdp._content), {})
+        claim = self.wdp.claims['P213'][0]
+        claim.rank = 'preferred'
+        diff = self.wdp.toJSON(diffto=self.wdp._content)
+        self.assertEqual(list(diff), ['claims'])
+        self.assertEqual(list(diff['claims']), ['P213'])
+        self.assertEqual(diff['claims']['P213'], [claim.toJSON()])
+
     def test_json_diff(self):
         """Test json diff."""
         del self.wdp.labels['en']
@@ -2230,6 +2305,230 @@ class TestJSON(WikidataTestCase):
         }
         diff = self.wdp.toJSON(diffto=self.wdp._content)
         self.assertEqual(diff, expected)
+        self.assertEqual(
+            self.wdp.toJSON(diffto=copy.deepcopy(self.wdp._content)), diff)
+
+    def test_json_diff_tracked(self):
+        """Test that the recorded changes give the same diff."""
+        self.wdp.labels['en'] = 'NYC'
+        self.wdp.labels[self.get_repo()] = 'New York'
+        self.wdp.labels.pop('de')
+        self.wdp.descriptions.update(fr='ville', xx='')
+        self.wdp.aliases.get('de').append('NY')
+        self.wdp.aliases['xx'] = ['foo']
+        self.wdp.aliases.setdefault('yy', [])
+        self.wdp.claims['P31'][0].rank = 'deprecated'
+        self.wdp.claims.pop('P213')
+        self.wdp.sitelinks['xxwiki'] = {'site': 'xxwiki', 'title': 'NYC'}
+        self.wdp.sitelinks['enwiki']._badges = {ItemPage(self.get_repo(),
+                                                         'Q17437796')}
+        diff = self.wdp.toJSON(diffto=self.wdp._content)
+        self.assertEqual(
+            diff, self.wdp.toJSON(diffto=copy.deepcopy(self.wdp._content)))
+        self.assertEqual(set(diff), {'labels', 'descriptions', 'aliases',
+                                     'claims', 'sitelinks'})
+        self.assertEqual(set(diff['labels']), {'en', 'de', 'wikidata'})
+        self.assertEqual(set(diff['aliases']), {'de', 'xx', 'yy'})
+        self.assertEqual(set(diff['claims']), {'P31', 'P213'})
+        self.assertEqual(set(diff['sitelinks']), {'enwiki', 'xxwiki'})
+
+    def test_json_diff_single_change(self):
+        """Test that only the changed label is compared."""
+        self.wdp.labels['en'] = 'NYC'
+        with mock.patch.object(pywikibot.page.SiteLink, 'toJSON') as sitelink:
+            diff = self.wdp.toJSON(diffto=self.wdp._content)
+        self.assertEqual(
+            diff, {'labels': {'en': {'language': 'en', 'value': 'NYC'}}})
+        self.assertFalse(sitelink.called)
+        self.assertTrue(all(isinstance(claims, pywikibot.page._RawClaims)
+                            for claims in dict.values(self.wdp.claims)))
+        self.wdp._content['lastrevid'] = 1
+        self.wdp.get()
+        self.assertEqual(self.wdp.toJSON(diffto=self.wdp._content), {})
+
+
+class TestLoadEntities(WikidataTestCase):
+
+    """Test loading entities in batches without accessing the network."""
+
+    dry = True
+
+    def setUp(self):
+        """Patch the requests to return copies of Q60."""
+        super(TestLoadEntities, self).setUp()
+        with open(join_pages_path('Q60.wd')) as f:
+            self.content = json.load(f)
+        self.requests = []
+
+        def submit(request):
+            self.requests.append(request._params)
+            entities = {}
+            for entity_id in request._params['ids']:
+                if entity_id == 'Q2':
+                    entities[entity_id] = {'id': entity_id, 'missing': ''}
+                else:
+                    entities[entity_id] = dict(copy.deepcopy(self.content),
+                                               id=entity_id)
+            return {'entities': entities, 'success': 1}
+
+        patcher = mock.patch.object(pywikibot.data.api.AsyncRequest,
+                                    'submit', submit)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(type(self.get_repo()),
+                                    '_wbgetentities_limit', return_value=3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches(self):
+        """Test that entities are requested in groups of the limit."""
+        repo = self.get_repo()
+        items = [ItemPage(repo, 'Q{0}'.format(i)) for i in range(1, 9)]
+        pages = list(repo.load_entities(items, parallel=2))
+        self.assertEqual([page.getID() for page in pages],
+                         ['Q1', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7', 'Q8'])
+        self.assertEqual([params['ids'] for params in self.requests],
+                         [['Q1', 'Q2', 'Q3'], ['Q4', 'Q5', 'Q6'],
+                          ['Q7', 'Q8']])
+        self.assertNotIn('props', self.requests[0])
+        self.assertEqual(pages[0].labels['en'],
+                         self.content['labels']['en']['value'])
+        pages = list(repo.load_entities(items[2:6], groupsize=2))
+        self.assertLength(pages, 4)
+        self.assertEqual([params['ids'] for params in self.requests[3:]],
+                         [['Q3', 'Q4'], ['Q5', 'Q6']])
+
+    def test_projection(self):
+        """Test that only the requested parts are kept."""
+        repo = self.get_repo()
+        page = next(repo.load_entities(
+            [ItemPage(repo, 'Q60')], props=['labels'], languages=['en'],
+            properties=['p31', 'P17'], sitefilter=['enwiki']))
+        params = self.requests[0]
+        self.assertEqual(params['props'], ['claims', 'info', 'labels'])
+        self.assertEqual(params['languages'], ['en'])
+        self.assertEqual(params['sitefilter'], ['enwiki'])
+        self.assertEqual(sorted(page.claims), ['P17', 'P31'])
+        self.assertEqual(page.toJSON(diffto=page._content), {})
+
+    def test_order(self):
+        """Test that entities are yielded in the order of the request."""
+        repo = self.get_repo()
+        ids = ['Q{0}'.format(i) for i in (9, 1, 5, 3, 2, 7)]
+        pages = list(repo.load_entities(ItemPage(repo, entity_id)
+                                        for entity_id in ids))
+        self.assertEqual([page.getID() for page in pages],
+                         ['Q9', 'Q1', 'Q5', 'Q3', 'Q7'])
+
+
+class TestEntityEditBatch(WikidataTestCase):
+
+    """Test saving the changes of entities with one edit."""
+
+    dry = True
+
+    def setUp(self):
+        """Load Q60 and patch the requests."""
+        super(TestEntityEditBatch, self).setUp()
+        self.repo = self.get_repo()
+        with open(join_pages_path('Q60.wd')) as f:
+            self.content = json.load(f)
+        self.item = ItemPage(self.repo, 'Q60')
+        self.item._content = copy.deepcopy(self.content)
+        self.item.get()
+        self.edits = []
+        self.conflicts = 0
+
+        def edit_entity(site, entity, data, bot=True, **kwargs):
+            self.edits.append((data, kwargs))
+            if self.conflicts:
+                self.conflicts -= 1
+                raise pywikibot.data.api.APIError('editconflict', 'Conflict')
+            content = entity.toJSON()
+            content.update(id=entity.getID(), type='item',
+                           lastrevid=kwargs['baserevid'] + 1)
+            return {'entity': content}
+
+        for name, method in (('editEntity', edit_entity),
+                             ('login', lambda site, sysop=False: None)):
+            patcher = mock.patch.object(type(self.repo), name, method)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def new_claim(self, target):
+        """Return a new claim of P31."""
+        claim = pywikibot.Claim(self.repo, 'P31', datatype='wikibase-item')
+        claim.setTarget(ItemPage(self.repo, target))
+        return claim
+
+    def test_coalesce(self):
+        """Test that the changes of an entity are saved with one edit."""
+        revid = self.item.latest_revision_id
+        count = len(self.item.claims['P31'])
+        ranked = self.item.claims['P17'][0]
+        removed = self.item.claims['P213'][0]
+        with self.repo.edit_batch(summary='Test') as batch:
+            self.item.addClaim(self.new_claim('Q5'))
+            self.item.addClaim(self.new_claim('Q515'))
+            self.item.removeClaims(removed)
+            ranked.changeRank('preferred')
+            self.assertIn(self.item, batch)
+            self.assertEqual(self.edits, [])
+        self.assertIsNone(self.repo._edit_batch)
+        self.assertLength(self.edits, 1)
+        data, kwargs = self.edits[0]
+        self.assertEqual(kwargs, {'baserevid': revid, 'summary': 'Test'})
+        self.assertEqual(sorted(data), ['claims'])
+        self.assertEqual(sorted(data['claims']), ['P17', 'P213', 'P31'])
+        self.assertLength(data['claims']['P31'], 2)
+        self.assertEqual(data['claims']['P17'][0]['rank'], 'preferred')
+        self.assertIn('remove', data['claims']['P213'][0])
+        self.assertEqual(batch.revisions, {'Q60': revid + 1})
+        self.assertNotIn('P213', self.item.claims)
+        self.assertLength(self.item.claims['P31'], count + 2)
+
+    def test_conflict(self):
+        """Test that changes are reapplied on edit conflicts."""
+        current = copy.deepcopy(self.content)
+        current['labels']['xx'] = {'language': 'xx', 'value': 'Test'}
+        current['lastrevid'] += 5
+        self.conflicts = 1
+        with mock.patch.object(type(self.repo), 'loadcontent',
+                               return_value={'Q60': current}):
+            with self.repo.edit_batch() as batch:
+                self.item.addClaim(self.new_claim('Q5'))
+                self.item.labels['de'] = 'Test'
+                self.item.claims['P31'][0].changeRank('preferred')
+        self.assertLength(self.edits, 2)
+        first, second = self.edits[0][0], self.edits[1][0]
+        self.assertEqual(first, second)
+        self.assertEqual(sorted(second), ['claims', 'labels'])
+        self.assertLength(second['claims']['P31'], 2)
+        self.assertEqual(self.edits[1][1]['baserevid'], current['lastrevid'])
+        self.assertEqual(self.item.labels['xx'], 'Test')
+        self.assertEqual(self.item.labels['de'], 'Test')
+        self.assertEqual(batch.revisions, {'Q60': current['lastrevid'] + 1})
+
+    def test_edit_entity(self):
+        """Test that collected changes are saved before other edits."""
+        with self.repo.edit_batch() as batch:
+            self.item.addClaim(self.new_claim('Q5'))
+            self.item.editDescriptions({'en': 'Test'})
+            self.assertNotIn(self.item, batch)
+        self.assertLength(self.edits, 2)
+        self.assertEqual(list(self.edits[0][0]), ['claims'])
+        self.assertEqual(list(self.edits[1][0]), ['descriptions'])
+        self.assertEqual(self.item.claims['P31'][-1].getTarget(),
+                         ItemPage(self.repo, 'Q5'))
+
+    def test_discard(self):
+        """Test that nothing is saved after an exception."""
+        with self.assertRaises(ValueError):
+            with self.repo.edit_batch():
+                self.item.addClaim(self.new_claim('Q5'))
+                raise ValueError
+        self.assertEqual(self.edits, [])
+        self.assertIsNone(self.repo._edit_batch)
 
 
 class TestDeprecatedDataSiteMethods(WikidataTestCase, DeprecationTestCase):
@@ -7,9 +7,16 @@
 #
 from __future__ import absolute_import, division, unicode_literals
 
+import bz2
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+
 from pywikibot import xmlreader
 
-from tests import join_xml_data_path
+from tests import join_xml_data_path, mock
 from tests.aspects import unittest, TestCase
 
 
@@ -64,7 +71,7 @@ class ExportDotThreeTestCase(XmlReaderTestCase):
         """Compare the tested variant with the previous (if not None)."""
         entries = self._get_entries('article-pyrus' + variant,
                                     allrevisions=all_revisions)
-        result = [entry.__dict__ for entry in entries]
+        result = [entry.__getstate__() for entry in entries]
         if previous:
             self.assertEqual(previous, result)
         return result
@@ -127,6 +134,179 @@ class ExportDotTenTestCase(XmlReaderTestCase):
             'moved [[Çullu, Agdam]] to [[Çullu, Quzanlı]]:&#32;dab')
 
 
+class ProjectionTestCase(XmlReaderTestCase):
+
+    """Test reading only some fields of the entries."""
+
+    def test_fields(self):
+        """Test fields which are not requested are None."""
+        entries = self._get_entries('pair-0.10.xml', allrevisions=True,
+                                    fields=('title', 'comment'))
+        self.assertLength(entries, 4)
+        self.assertEqual(entries[0].title, 'Çullu, Agdam')
+        self.assertEqual(entries[3].comment, 'proj')
+        self.assertTrue(all(entry.text is None and entry.id is None
+                            and entry.username is None
+                            for entry in entries))
+
+    def test_text(self):
+        """Test reading the text only."""
+        entries = self._get_entries('pair-0.10.xml', fields=('text', ))
+        self.assertEqual([entry.text for entry in entries],
+                         ['#REDIRECT [[Çullu, Quzanlı]]',
+                          '#REDIRECT [[Talk:Çullu, Quzanlı]]'])
+
+    def test_unknown_field(self):
+        """Test an unknown field name raises ValueError."""
+        self.assertRaisesRegex(ValueError, 'Unknown XmlEntry fields: foo',
+                               xmlreader.XmlDump, 'dump.xml',
+                               fields=('title', 'foo'))
+
+    def test_slots(self):
+        """Test entries have no instance dictionary."""
+        entry = self._get_entries('article-pear.xml')[0]
+        self.assertFalse(hasattr(entry, '__dict__'))
+
+
+class PageIndexTestCase(XmlReaderTestCase):
+
+    """Test starting at a page of an uncompressed dump."""
+
+    def setUp(self):
+        """Copy the dump into a temporary directory."""
+        super(PageIndexTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'pair.xml')
+        shutil.copy(join_xml_data_path('pair-0.10.xml'), self.filename)
+
+    def tearDown(self):
+        """Remove the dump."""
+        shutil.rmtree(self.directory)
+        super(PageIndexTestCase, self).tearDown()
+
+    def test_lookup(self):
+        """Test the offsets point to the start of the pages."""
+        page_index = xmlreader.XmlDumpIndex(self.filename)
+        page_index.chunk_size = 100
+        self.assertEqual(page_index.build(), 2)
+        with open(self.filename, 'rb') as f:
+            for title in ('Çullu, Agdam', 'Talk:Çullu, Agdam'):
+                f.seek(page_index.lookup(title))
+                self.assertEqual(f.readline().strip(), b'<page>')
+        page_index.close()
+
+    def test_start(self):
+        """Test starting at a page."""
+        entries = list(xmlreader.XmlDump(self.filename, allrevisions=True,
+                                         start='Talk:Çullu, Agdam').parse())
+        self.assertLength(entries, 2)
+        self.assertEqual(entries[1].text, '{{DisambigProject}}')
+        entries = list(xmlreader.XmlDump(self.filename,
+                                         start='Foo').parse())
+        self.assertLength(entries, 0)
+
+    def test_start_without_index(self):
+        """Test starting at a page when the index cannot be created."""
+        error = sqlite3.OperationalError('unable to open database file')
+        with mock.patch.object(xmlreader.XmlDumpIndex, '_connection',
+                               side_effect=error):
+            entries = list(xmlreader.XmlDump(
+                self.filename, start='Talk:Çullu, Agdam').parse())
+        self.assertLength(entries, 1)
+        self.assertEqual(entries[0].title, 'Talk:Çullu, Agdam')
+
+
+class MultistreamTestCase(XmlReaderTestCase):
+
+    """Test parsing multistream dumps in parallel."""
+
+    def setUp(self):
+        """Create a multistream dump with one page per stream."""
+        super(MultistreamTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'multistream.xml.bz2')
+        self.index = os.path.join(self.directory, 'index.txt')
+        with open(join_xml_data_path('pair-0.10.xml'), 'rb') as f:
+            data = f.read()
+        pages = re.findall(br'\s*<page>.*?</page>\n', data, re.S)
+        header = data[:data.index(pages[0])]
+        footer = data[data.index(pages[-1]) + len(pages[-1]):]
+        streams = [header] + pages[:-1] + [pages[-1] + footer]
+        offset = 0
+        with open(self.filename, 'wb') as dump:
+            with open(self.index, 'wb') as index:
+                for i, stream in enumerate(streams):
+                    if i:
+                        index.write('{0}:{1}:Page {1}\n'.format(
+                            offset, i).encode('ascii'))
+                    compressed = bz2.compress(stream)
+                    dump.write(compressed)
+                    offset += len(compressed)
+
+    def tearDown(self):
+        """Remove the dump."""
+        shutil.rmtree(self.directory)
+        super(MultistreamTestCase, self).tearDown()
+
+    def test_page_index(self):
+        """Test building a page index of a multistream dump."""
+        page_index = xmlreader.XmlDumpIndex(self.filename)
+        self.assertFalse(page_index.is_current())
+        self.assertEqual(page_index.build(), 2)
+        self.assertTrue(page_index.is_current())
+        first = page_index.lookup('Çullu, Agdam')
+        self.assertGreater(first, 0)
+        self.assertGreater(page_index.lookup(pageid=19252824), first)
+        self.assertIsNone(page_index.lookup('Foo'))
+        page_index.close()
+
+    def test_supports(self):
+        """Test that only multistream bz2 dumps are indexed."""
+        self.assertTrue(xmlreader.XmlDumpIndex.supports(self.filename))
+        filename = os.path.join(self.directory, 'pyrus.xml.bz2')
+        shutil.copy(join_xml_data_path('article-pyrus.xml.bz2'), filename)
+        self.assertFalse(xmlreader.XmlDumpIndex.supports(filename))
+        entries = list(xmlreader.XmlDump(filename, start='Pyrus').parse())
+        self.assertLength(entries, 1)
+        self.assertFalse(os.path.exists(
+            filename + xmlreader.XmlDumpIndex.suffix))
+
+    def test_start(self):
+        """Test starting at a page of a multistream dump."""
+        for kwargs in ({}, {'index': self.index, 'processes': 2}):
+            entries = list(xmlreader.XmlDump(
+                self.filename, allrevisions=True,
+                start='Talk:Çullu, Agdam', **kwargs).parse())
+            self.assertLength(entries, 2)
+            self.assertEqual(entries[0].title, 'Talk:Çullu, Agdam')
+            entries = list(xmlreader.XmlDump(
+                self.filename, start_id=19252824, **kwargs).parse())
+            self.assertLength(entries, 1)
+            self.assertEqual(entries[0].id, '19252824')
+        self.assertTrue(os.path.exists(
+            self.filename + xmlreader.XmlDumpIndex.suffix))
+
+    def _compare(self, **kwargs):
+        """Compare parallel parsing with parsing the uncompressed dump."""
+        expected = [entry.__getstate__() for entry in xmlreader.XmlDump(
+            join_xml_data_path('pair-0.10.xml'), allrevisions=True).parse()]
+        entries = [entry.__getstate__() for entry in xmlreader.XmlDump(
+            self.filename, allrevisions=True, index=self.index,
+            processes=2, **kwargs).parse()]
+        self.assertLength(expected, 4)
+        return expected, entries
+
+    def test_keep_order(self):
+        """Test pages are yielded in the order of the dump."""
+        expected, entries = self._compare()
+        self.assertEqual(entries, expected)
+
+    def test_arrival_order(self):
+        """Test pages are yielded when they are parsed."""
+        expected, entries = self._compare(keep_order=False)
+        self.assertCountEqual(entries, expected)
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()